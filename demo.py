@@ -17,8 +17,10 @@
 import os
 os.environ['PYOPENGL_PLATFORM'] = 'egl'
 
-import cv2
 import time
+IMPORT_START = time.time()
+
+import cv2
 import torch
 import joblib
 import shutil
@@ -26,17 +28,17 @@ import colorsys
 import argparse
 import numpy as np
 from tqdm import tqdm
-from multi_person_tracker import MPT
-from torch.utils.data import DataLoader
 import json
-import pandas as pd
 
 from lib.models.vibe import VIBE_Demo
-from lib.utils.renderer import Renderer
+from lib.core.inference import MultiPersonInference
 from lib.dataset.inference import Inference
-from lib.utils.smooth_pose import smooth_pose
+from lib.utils.smooth_pose import smooth_poses
 from lib.data_utils.kp_utils import convert_kps
 from lib.utils.pose_tracker import run_posetracker
+from lib.utils.frame_source import get_frame_source, probe_fps, FrameBuffer, ImageFolderSource
+from lib.utils.video_writer import FFmpegVideoWriter
+from lib.utils.render_farm import render_frame, render_video_sharded
 
 from lib.utils.demo_utils import (
     download_youtube_clip,
@@ -44,10 +46,14 @@ from lib.utils.demo_utils import (
     convert_crop_coords_to_orig_img,
     convert_crop_cam_to_orig_img,
     prepare_rendering_results,
+    run_tracker_on_frames,
     video_to_images,
-    images_to_video,
     download_ckpt,
 )
+from lib.utils.utils import StageTimer
+
+# the tracker and the renderer (pyrender, trimesh) are imported only when they are used
+IMPORT_TIME = time.time() - IMPORT_START
 bboxjson = 'bbox_data.json'
 bboxjson2 = 'frame_bbox_data.json'
 new_json_file = [] 
@@ -56,6 +62,9 @@ MIN_NUM_FRAMES = 25
 
 
 def main(args):
+    timer = StageTimer(enabled=args.profile_startup, start=IMPORT_START)
+    timer.add('imports', IMPORT_TIME)
+
     device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
 
     video_file = args.vid_file
@@ -76,7 +85,16 @@ def main(args):
     output_path = os.path.join(args.output_folder, os.path.basename(video_file).replace('.mp4', ''))
     os.makedirs(output_path, exist_ok=True)
 
-    image_folder, num_frames, img_shape = video_to_images(video_file, return_info=True)
+    if args.frame_backend == 'images':
+        image_folder, num_frames, img_shape = video_to_images(video_file, return_info=True)
+        frame_source = ImageFolderSource(image_folder, fps=probe_fps(video_file))
+    else:
+        # decode frames on the fly, no intermediate image folder is written
+        image_folder = None
+        frame_source = get_frame_source(video_file, backend=args.frame_backend)
+        num_frames, img_shape = len(frame_source), frame_source.img_shape
+
+    frame_buffer = FrameBuffer(frame_source, maxlen=args.frame_buffer_size)
 
     print(f'Input video number of frames {num_frames}')
     orig_height, orig_width = img_shape[:2]
@@ -88,19 +106,27 @@ def main(args):
     if args.tracking_method == 'pose':
         if not os.path.isabs(video_file):
             video_file = os.path.join(os.getcwd(), video_file)
-        tracking_results = run_posetracker(video_file, staf_folder=args.staf_dir, display=args.display)
+        with timer('tracking'):
+            tracking_results = run_posetracker(video_file, staf_folder=args.staf_dir, display=args.display)
 
     else:
         # run multi object tracker
-        mot = MPT(
-            device=device,
-            batch_size=args.tracker_batch_size,
-            display=args.display,
-            detector_type=args.detector,
-            output_format='dict',
-            yolo_img_size=args.yolo_img_size,
-        )
-        tracking_results = mot(image_folder)
+        with timer('tracker setup'):
+            from multi_person_tracker import MPT
+
+            mot = MPT(
+                device=device,
+                batch_size=args.tracker_batch_size,
+                display=args.display,
+                detector_type=args.detector,
+                output_format='dict',
+                yolo_img_size=args.yolo_img_size,
+            )
+        with timer('tracking'):
+            if image_folder is not None:
+                tracking_results = mot(image_folder)
+            else:
+                tracking_results = run_tracker_on_frames(mot, frame_buffer, batch_size=args.tracker_batch_size)
     # print('======================================')
     # print('size of trackins results', len(tracking_results))
     # print('======================================')
@@ -161,28 +187,34 @@ def main(args):
             del tracking_results[person_id]
 
     # ========= Define VIBE model ========= #
-    model = VIBE_Demo(
-        seqlen=16,
-        n_layers=2,
-        hidden_size=1024,
-        add_linear=True,
-        use_residual=True,
-    ).to(device)
+    with timer('model construction'):
+        model = VIBE_Demo(
+            seqlen=16,
+            n_layers=2,
+            hidden_size=1024,
+            add_linear=True,
+            use_residual=True,
+            quantized_backbone=args.quantized_backbone,
+        ).to(device)
 
     # ========= Load pretrained weights ========= #
-    pretrained_file = download_ckpt(use_3dpw=False)
-    ckpt = torch.load(pretrained_file)
-    print(f'Performance of pretrained model on 3DPW: {ckpt["performance"]}')
-    ckpt = ckpt['gen_state_dict']
-    model.load_state_dict(ckpt, strict=False)
-    model.eval()
+    with timer('checkpoint loading'):
+        pretrained_file = download_ckpt(use_3dpw=False)
+        ckpt = torch.load(pretrained_file, map_location=device)
+        print(f'Performance of pretrained model on 3DPW: {ckpt["performance"]}')
+        ckpt = ckpt['gen_state_dict']
+        model.load_state_dict(ckpt, strict=False)
+        model.eval()
+        model.set_precision(args.precision, channels_last=args.channels_last)
     print(f'Loaded Fdis weights from \"{pretrained_file}\"')
+    timer.report()
 
     # ========= Run VIBE on each person ========= #
     print(f'Running VIBE on each tracklet...')
     vibe_time = time.time()
     vibe_results = {}
-    for person_id in tqdm(list(tracking_results.keys())):
+    datasets = {}
+    for person_id in list(tracking_results.keys()):
         bboxes = joints2d = None
 
         if args.tracking_method == 'bbox':
@@ -231,55 +263,52 @@ def main(args):
         
         # print(new_json_file)
 
+        datasets[person_id] = dataset
+
+    # run VIBE on all tracklets together
+    engine = MultiPersonInference(
+        model=model,
+        device=device,
+        batch_size=args.vibe_batch_size,
+        seqlen=args.vibe_batch_size,
+        num_workers=16,
+        window=args.vibe_window,
+        overlap=args.vibe_window_overlap,
+        carry_hidden=args.vibe_carry_hidden,
+        crop_device=device if args.gpu_crops else None,
+    )
+    # without an image folder, all tracklets are cropped in a single decoding pass
+    inference_results = engine(datasets, frames=frame_buffer if image_folder is None else None)
+
+    for person_id in tqdm(list(inference_results.keys())):
+        joints2d = None
+        if args.tracking_method == 'pose':
+            joints2d = tracking_results[person_id]['joints2d']
+
+        dataset = datasets[person_id]
         bboxes = dataset.bboxes
         frames = dataset.frames
-        has_keypoints = True if joints2d is not None else False
-
-        dataloader = DataLoader(dataset, batch_size=args.vibe_batch_size, num_workers=16)
-
-        with torch.no_grad():
-
-            pred_cam, pred_verts, pred_pose, pred_betas, pred_joints3d, smpl_joints2d, norm_joints2d = [], [], [], [], [], [], []
-
-            for batch in dataloader:
-                if has_keypoints:
-                    batch, nj2d = batch
-                    norm_joints2d.append(nj2d.numpy().reshape(-1, 21, 3))
-
-                batch = batch.unsqueeze(0)
-                batch = batch.to(device)
-
-                batch_size, seqlen = batch.shape[:2]
-                output = model(batch)[-1]
 
-                pred_cam.append(output['theta'][:, :, :3].reshape(batch_size * seqlen, -1))
-                pred_verts.append(output['verts'].reshape(batch_size * seqlen, -1, 3))
-                pred_pose.append(output['theta'][:,:,3:75].reshape(batch_size * seqlen, -1))
-                pred_betas.append(output['theta'][:, :,75:].reshape(batch_size * seqlen, -1))
-                pred_joints3d.append(output['kp_3d'].reshape(batch_size * seqlen, -1, 3))
-                smpl_joints2d.append(output['kp_2d'].reshape(batch_size * seqlen, -1, 2))
-
-
-            pred_cam = torch.cat(pred_cam, dim=0)
-            pred_verts = torch.cat(pred_verts, dim=0)
-            pred_pose = torch.cat(pred_pose, dim=0)
-            pred_betas = torch.cat(pred_betas, dim=0)
-            pred_joints3d = torch.cat(pred_joints3d, dim=0)
-            smpl_joints2d = torch.cat(smpl_joints2d, dim=0)
-            del batch
+        person_results = inference_results[person_id]
+        pred_cam = person_results['pred_cam']
+        pred_verts = person_results['pred_verts']
+        pred_pose = person_results['pred_pose']
+        pred_betas = person_results['pred_betas']
+        pred_joints3d = person_results['pred_joints3d']
+        smpl_joints2d = person_results['smpl_joints2d']
+        norm_joints2d = person_results.get('norm_joints2d')
 
         # ========= [Optional] run Temporal SMPLify to refine the results ========= #
         if args.run_smplify and args.tracking_method == 'pose':
-            norm_joints2d = np.concatenate(norm_joints2d, axis=0)
             norm_joints2d = convert_kps(norm_joints2d, src='staf', dst='spin')
             norm_joints2d = torch.from_numpy(norm_joints2d).float().to(device)
 
             # Run Temporal SMPLify
             update, new_opt_vertices, new_opt_cam, new_opt_pose, new_opt_betas, \
             new_opt_joints3d, new_opt_joint_loss, opt_joint_loss = smplify_runner(
-                pred_rotmat=pred_pose,
-                pred_betas=pred_betas,
-                pred_cam=pred_cam,
+                pred_rotmat=pred_pose.to(device),
+                pred_betas=pred_betas.to(device),
+                pred_cam=pred_cam.to(device),
                 j2d=norm_joints2d,
                 device=device,
                 batch_size=norm_joints2d.shape[0],
@@ -311,14 +340,6 @@ def main(args):
         pred_joints3d = pred_joints3d.cpu().numpy()
         smpl_joints2d = smpl_joints2d.cpu().numpy()
 
-        # Runs 1 Euro Filter to smooth out the results
-        if args.smooth:
-            min_cutoff = args.smooth_min_cutoff # 0.004
-            beta = args.smooth_beta # 1.5
-            print(f'Running smoothing on person {person_id}, min_cutoff: {min_cutoff}, beta: {beta}')
-            pred_verts, pred_pose, pred_joints3d = smooth_pose(pred_pose, pred_betas,
-                                                               min_cutoff=min_cutoff, beta=beta)
-
         orig_cam = convert_crop_cam_to_orig_img(
             cam=pred_cam,
             bbox=bboxes,
@@ -368,6 +389,23 @@ def main(args):
         print(vibe_results)
         
 
+    # Runs 1 Euro Filter to smooth out the results of all people at once
+    if args.smooth and len(vibe_results) > 0:
+        min_cutoff = args.smooth_min_cutoff # 0.004
+        beta = args.smooth_beta # 1.5
+        print(f'Running smoothing on {len(vibe_results)} people, min_cutoff: {min_cutoff}, beta: {beta}')
+        smoothed = smooth_poses(
+            [v['pose'] for v in vibe_results.values()],
+            [v['betas'] for v in vibe_results.values()],
+            min_cutoff=min_cutoff,
+            beta=beta,
+            device=device,
+        )
+        for output_dict, (pred_verts, pred_pose, pred_joints3d) in zip(vibe_results.values(), smoothed):
+            output_dict['verts'] = pred_verts
+            output_dict['pose'] = pred_pose
+            output_dict['joints3d'] = pred_joints3d
+
     del model
     #new_json_file2 = pd.Series(output_dict).to_json(orient='values')
     
@@ -397,85 +435,81 @@ def main(args):
 
     if not args.no_render:
         # ========= Render results as a single video ========= #
-        renderer = Renderer(resolution=(orig_width, orig_height), orig_img=True, wireframe=args.wireframe)
-
-        output_img_folder = f'{image_folder}_output'
-        os.makedirs(output_img_folder, exist_ok=True)
+        vid_name = os.path.basename(video_file)
+        save_name = f'{vid_name.replace(".mp4", "")}_vibe_result.mp4'
+        save_name = os.path.join(output_path, save_name)
 
-        print(f'Rendering output video, writing frames to {output_img_folder}')
+        print(f'Rendering output video to {save_name}')
 
         # prepare results for rendering
         frame_results = prepare_rendering_results(vibe_results, num_frames)
         # print("frame results for render",frame_results )
         # print("-----------------------------------------------------------------------------")
         mesh_color = {k: colorsys.hsv_to_rgb(np.random.rand(), 0.5, 1.0) for k in vibe_results.keys()}
+        mesh_folder = os.path.join(output_path, 'meshes') if args.save_obj else None
+
+        # keep the frame rate of the input video, 25 if it is unknown
+        output_fps = frame_source.fps if frame_source.fps > 0 else 25
+
+        render_start = time.time()
+        if args.render_workers > 1:
+            # every worker process renders and encodes a segment of the video
+            rendered_frames = render_video_sharded(
+                frame_source,
+                frame_results,
+                save_name,
+                mesh_color,
+                num_workers=args.render_workers,
+                fps=output_fps,
+                wireframe=args.wireframe,
+                sideview=args.sideview,
+                batched=args.render_batched,
+                mesh_folder=mesh_folder,
+            )
+        else:
+            from lib.utils.renderer import Renderer
 
-        image_file_names = sorted([
-            os.path.join(image_folder, x)
-            for x in os.listdir(image_folder)
-            if x.endswith('.png') or x.endswith('.jpg')
-        ])
-
-        for frame_idx in tqdm(range(len(image_file_names))):
-            img_fname = image_file_names[frame_idx]
-            img = cv2.imread(img_fname)
-
-            if args.sideview:
-                side_img = np.zeros_like(img)
-
-            for person_id, person_data in frame_results[frame_idx].items():
-                frame_verts = person_data['verts']
-                frame_cam = person_data['cam']
-
-                mc = mesh_color[person_id]
+            renderer = Renderer(resolution=(orig_width, orig_height), orig_img=True, wireframe=args.wireframe)
 
-                mesh_filename = None
+            # decoding, rendering and encoding run in parallel, rendered frames are piped to ffmpeg
+            video_writer = FFmpegVideoWriter(save_name, fps=output_fps, maxlen=args.frame_buffer_size)
 
-                if args.save_obj:
-                    mesh_folder = os.path.join(output_path, 'meshes', f'{person_id:04d}')
-                    os.makedirs(mesh_folder, exist_ok=True)
-                    mesh_filename = os.path.join(mesh_folder, f'{frame_idx:06d}.obj')
+            rendered_frames = 0
+            for frame_idx, img in enumerate(tqdm(frame_buffer, total=num_frames)):
+                if frame_idx >= num_frames:
+                    break
 
-                img = renderer.render(
+                img = render_frame(
+                    renderer,
                     img,
-                    frame_verts,
-                    cam=frame_cam,
-                    color=mc,
-                    mesh_filename=mesh_filename,
+                    frame_results[frame_idx],
+                    mesh_color,
+                    frame_idx=frame_idx,
+                    sideview=args.sideview,
+                    batched=args.render_batched,
+                    mesh_folder=mesh_folder,
                 )
+                rendered_frames += 1
 
-                if args.sideview:
-                    side_img = renderer.render(
-                        side_img,
-                        frame_verts,
-                        cam=frame_cam,
-                        color=mc,
-                        angle=270,
-                        axis=[0,1,0],
-                    )
+                video_writer.write(img)
 
-            if args.sideview:
-                img = np.concatenate([img, side_img], axis=1)
-
-            cv2.imwrite(os.path.join(output_img_folder, f'{frame_idx:06d}.png'), img)
+                if args.display:
+                    cv2.imshow('Video', img)
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
 
             if args.display:
-                cv2.imshow('Video', img)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                cv2.destroyAllWindows()
 
-        if args.display:
-            cv2.destroyAllWindows()
+            # ========= Save rendered video ========= #
+            video_writer.close()
 
-        # ========= Save rendered video ========= #
-        vid_name = os.path.basename(video_file)
-        save_name = f'{vid_name.replace(".mp4", "")}_vibe_result.mp4'
-        save_name = os.path.join(output_path, save_name)
-        print(f'Saving result video to {save_name}')
-        images_to_video(img_folder=output_img_folder, output_vid_file=save_name)
-        shutil.rmtree(output_img_folder)
+        render_time = time.time() - render_start
+        print(f'Rendered {rendered_frames} frames, rendering FPS: {rendered_frames / render_time:.2f}')
+        print(f'Saved result video to {save_name}')
 
-    shutil.rmtree(image_folder)
+    if image_folder is not None:
+        shutil.rmtree(image_folder)
     print('================= END =================')
 
 
@@ -506,6 +540,37 @@ if __name__ == '__main__':
     parser.add_argument('--vibe_batch_size', type=int, default=450,
                         help='batch size of VIBE')
 
+    parser.add_argument('--frame_backend', type=str, default='ffmpeg',
+                        choices=['ffmpeg', 'pyav', 'opencv', 'images'],
+                        help='how to decode the input video, "images" extracts all frames to an image folder first')
+
+    parser.add_argument('--frame_buffer_size', type=int, default=32,
+                        help='max number of decoded frames kept in memory ahead of the consumer')
+
+    parser.add_argument('--vibe_window', type=int, default=None,
+                        help='run the temporal encoder of VIBE in sliding windows of this many frames')
+
+    parser.add_argument('--vibe_window_overlap', type=int, default=8,
+                        help='number of frames blended between consecutive sliding windows')
+
+    parser.add_argument('--vibe_carry_hidden', action='store_true',
+                        help='carry the GRU hidden state across non overlapping windows instead of blending')
+
+    parser.add_argument('--gpu_crops', action='store_true',
+                        help='crop, resize and normalize the bboxes on the GPU instead of with cv2 on the CPU')
+
+    parser.add_argument('--precision', type=str, default='fp32', choices=['fp32', 'fp16', 'bf16'],
+                        help='precision of the backbone and the temporal encoder, SMPL always runs in fp32')
+
+    parser.add_argument('--channels_last', action='store_true',
+                        help='channels last memory format for the backbone')
+
+    parser.add_argument('--quantized_backbone', type=str, default=None,
+                        help='int8 backbone saved by quantize.py, runs the ResNet on the cpu')
+
+    parser.add_argument('--profile_startup', '--profile-startup', action='store_true',
+                        help='print the time spent in imports, tracking, model construction and checkpoint loading')
+
     parser.add_argument('--display', action='store_true',
                         help='visualize the results of each step during demo')
 
@@ -518,6 +583,12 @@ if __name__ == '__main__':
     parser.add_argument('--wireframe', action='store_true',
                         help='render all meshes as wireframes.')
 
+    parser.add_argument('--render_batched', action='store_true',
+                        help='render all people of a frame in a single draw')
+
+    parser.add_argument('--render_workers', type=int, default=1,
+                        help='number of processes rendering segments of the output video in parallel')
+
     parser.add_argument('--sideview', action='store_true',
                         help='render meshes from alternate viewpoint.')
 
@@ -537,4 +608,11 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
+    if args.vibe_window is not None and args.vibe_window < 1:
+        parser.error('--vibe_window should be at least 1')
+    # the overlap is not used when the hidden state is carried across windows
+    if args.vibe_window is not None and not args.vibe_carry_hidden and \
+            not 0 <= args.vibe_window_overlap < args.vibe_window:
+        parser.error('--vibe_window_overlap should be smaller than --vibe_window')
+
     main(args)
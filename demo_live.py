@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+import os
+os.environ['PYOPENGL_PLATFORM'] = 'egl'
+
+import cv2
+import time
+import torch
+import joblib
+import colorsys
+import argparse
+import numpy as np
+from multi_person_tracker import MPT, Sort
+from torchvision.transforms.functional import to_tensor
+
+from lib.models.vibe import VIBE_Demo
+from lib.core.inference import OnlineInference
+from lib.utils.demo_utils import download_ckpt
+from lib.utils.frame_source import get_frame_source, FrameBuffer
+
+
+class OnlineTracker():
+    """Runs the detector of the multi person tracker and Sort on one frame at a time."""
+    def __init__(self, mot, device):
+        self.mot = mot
+        self.device = device
+        self.tracker = Sort()
+        self.detection_threshold = getattr(mot, 'detection_threshold', 0.7)
+
+    @torch.no_grad()
+    def __call__(self, img):
+        batch = to_tensor(cv2.cvtColor(img, cv2.COLOR_BGR2RGB)).unsqueeze(0).to(self.device)
+        pred = self.mot.detector(batch)[0]
+
+        bb = pred['boxes'].cpu().numpy()
+        sc = pred['scores'].cpu().numpy()[..., None]
+        dets = np.hstack([bb, sc])
+        dets = dets[sc[:, 0] > self.detection_threshold]
+
+        if dets.shape[0] > 0:
+            return self.tracker.update(dets)
+        return np.empty((0, 5))
+
+
+def main(args):
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+
+    if args.vid_file.isdigit():
+        frame_source = get_frame_source(args.vid_file, backend='camera')
+    else:
+        frame_source = get_frame_source(args.vid_file, backend=args.frame_backend)
+
+    # keep the buffer short, frames waiting in it add to the latency
+    frames = FrameBuffer(frame_source, maxlen=args.frame_buffer_size)
+
+    mot = MPT(
+        device=device,
+        batch_size=1,
+        display=False,
+        detector_type=args.detector,
+        output_format='dict',
+        yolo_img_size=args.yolo_img_size,
+    )
+    tracker = OnlineTracker(mot, device)
+
+    # ========= Define VIBE model ========= #
+    model = VIBE_Demo(
+        seqlen=16,
+        n_layers=2,
+        hidden_size=1024,
+        add_linear=True,
+        use_residual=True,
+    ).to(device)
+
+    pretrained_file = download_ckpt(use_3dpw=False)
+    ckpt = torch.load(pretrained_file)
+    model.load_state_dict(ckpt['gen_state_dict'], strict=False)
+    model.eval()
+    model.set_precision(args.precision, channels_last=args.channels_last)
+    print(f'Loaded pretrained weights from \"{pretrained_file}\"')
+
+    online = OnlineInference(model=model, device=device, scale=1.1)
+
+    renderer = None
+    if args.display and args.render:
+        from lib.utils.renderer import Renderer
+        renderer = Renderer(resolution=(frame_source.width, frame_source.height), orig_img=True)
+    mesh_color = {}
+
+    results = []
+    frame_latencies = []
+    start = time.time()
+    for frame_idx, img in enumerate(frames):
+        frame_start = time.time()
+        frame_results = online(img, tracker(img))
+        frame_latencies.append(time.time() - frame_start)
+
+        if args.output_file is not None:
+            results.append(frame_results)
+
+        if args.display:
+            img = img.copy()
+            for track_id, person in frame_results.items():
+                if renderer is not None:
+                    if track_id not in mesh_color:
+                        mesh_color[track_id] = colorsys.hsv_to_rgb(np.random.rand(), 0.5, 1.0)
+                    img = renderer.render(img, person['verts'], cam=person['orig_cam'], color=mesh_color[track_id])
+                else:
+                    cx, cy, w, h = person['bbox']
+                    cv2.rectangle(img, (int(cx - w / 2), int(cy - h / 2)), (int(cx + w / 2), int(cy + h / 2)),
+                                  (0, 255, 0), 2)
+
+            cv2.imshow('VIBE', img)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+    total_time = time.time() - start
+    num_frames = len(frame_latencies)
+
+    if args.display:
+        cv2.destroyAllWindows()
+
+    vibe_p50, vibe_p99 = online.latency_percentiles((50, 99)).values()
+    frame_p50, frame_p99 = np.percentile(np.array(frame_latencies) * 1000., (50, 99)) if num_frames > 0 else (0., 0.)
+    print(f'Processed {num_frames} frames, FPS: {num_frames / total_time:.2f}')
+    print(f'VIBE latency per frame: p50 {vibe_p50:.1f} ms, p99 {vibe_p99:.1f} ms')
+    print(f'Tracking + VIBE latency per frame: p50 {frame_p50:.1f} ms, p99 {frame_p99:.1f} ms')
+
+    if args.output_file is not None:
+        print(f'Saving per frame results to \"{args.output_file}\".')
+        joblib.dump(results, args.output_file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--vid_file', type=str, default='0',
+                        help='input video path or camera index')
+
+    parser.add_argument('--frame_backend', type=str, default='ffmpeg', choices=['ffmpeg', 'pyav', 'opencv'],
+                        help='how to decode the input video file')
+
+    parser.add_argument('--frame_buffer_size', type=int, default=2,
+                        help='max number of decoded frames waiting to be processed')
+
+    parser.add_argument('--detector', type=str, default='yolo', choices=['yolo', 'maskrcnn'],
+                        help='object detector to be used for bbox tracking')
+
+    parser.add_argument('--yolo_img_size', type=int, default=416,
+                        help='input image size for yolo detector')
+
+    parser.add_argument('--output_file', type=str, default=None,
+                        help='save per frame results to this pickle file')
+
+    parser.add_argument('--precision', type=str, default='fp32', choices=['fp32', 'fp16', 'bf16'],
+                        help='precision of the backbone and the temporal encoder, SMPL always runs in fp32')
+
+    parser.add_argument('--channels_last', action='store_true',
+                        help='channels last memory format for the backbone')
+
+    parser.add_argument('--display', action='store_true',
+                        help='visualize the results while running')
+
+    parser.add_argument('--render', action='store_true',
+                        help='render meshes when --display is enabled, otherwise only bboxes are drawn')
+
+    args = parser.parse_args()
+
+    main(args)
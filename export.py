@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import torch
+import argparse
+import torch.nn as nn
+
+from lib.models.vibe import VIBE_Demo
+from lib.utils.demo_utils import download_ckpt
+from lib.utils.runtime import ExportedVIBE
+
+OUTPUT_NAMES = {
+    'theta': ['theta'],
+    'joints': ['theta', 'kp_2d', 'kp_3d'],
+    'mesh': ['theta', 'verts', 'kp_2d', 'kp_3d'],
+}
+
+
+class VIBEExport(nn.Module):
+    # flat tuple outputs, which tracing and onnx need instead of the list of dicts of VIBE_Demo
+    def __init__(self, model, output='mesh'):
+        super(VIBEExport, self).__init__()
+        self.model = model
+        self.output = output
+        self.output_names = OUTPUT_NAMES[output]
+
+    def forward(self, images):
+        output = self.model(images, output=self.output)[-1]
+        return tuple(output[k] for k in self.output_names)
+
+
+def main(args):
+    device = torch.device(args.device)
+
+    # same model and weights as demo.py
+    model = VIBE_Demo(
+        seqlen=16,
+        n_layers=2,
+        hidden_size=1024,
+        add_linear=True,
+        use_residual=True,
+    ).to(device)
+    ckpt = torch.load(download_ckpt(use_3dpw=False), map_location=device)
+    model.load_state_dict(ckpt['gen_state_dict'], strict=False)
+    model.eval()
+
+    wrapper = VIBEExport(model, output=args.output).eval()
+    example = torch.randn(args.batch_size, args.seqlen, 3, 224, 224, device=device)
+
+    os.makedirs(os.path.dirname(args.output_file) or '.', exist_ok=True)
+
+    # VIBE_Demo.forward and SMPL.forward_rotmat take every shape from tensors, so the traced
+    # graph keeps the batch and sequence dimensions dynamic
+    dynamic_axes = {name: {0: 'batch', 1: 'seqlen'} for name in ['images'] + wrapper.output_names}
+    start = time.time()
+    with torch.no_grad():
+        if args.format == 'torchscript':
+            traced = torch.jit.trace(wrapper, example)
+            metadata = {'outputs': wrapper.output_names}
+            torch.jit.save(traced, args.output_file, _extra_files={'metadata.json': json.dumps(metadata)})
+        else:
+            torch.onnx.export(wrapper, example, args.output_file, input_names=['images'],
+                              output_names=wrapper.output_names, dynamic_axes=dynamic_axes, opset_version=11)
+    print(f'Exported {args.format} model to {args.output_file} in {time.time() - start:.1f} s')
+
+    # check the exported model against the eager one on new inputs of the traced shape and of
+    # other batch sizes and sequence lengths
+    try:
+        exported = ExportedVIBE(args.output_file, device=args.device)
+    except Exception as e:
+        sys.exit(f'The exported model failed to load: {e}')
+
+    failed = False
+    for batch_size, seqlen in [(args.batch_size, args.seqlen), (1, args.seqlen + 5), (args.batch_size + 1, 3)]:
+        check = torch.randn(batch_size, seqlen, 3, 224, 224, device=device)
+        with torch.no_grad():
+            expected = wrapper(check)
+        try:
+            outputs = exported(check)
+        except Exception as e:
+            sys.exit(f'The exported model failed to run on inputs of shape {tuple(check.shape)}: {e}')
+
+        for name, value in zip(wrapper.output_names, expected):
+            if tuple(outputs[name].shape) != tuple(value.shape):
+                print(f'{name} {tuple(check.shape)}: shape {tuple(outputs[name].shape)}, expected {tuple(value.shape)}')
+                failed = True
+                continue
+            error = (outputs[name].to(device) - value).abs().max().item()
+            print(f'{name} {tuple(check.shape)}: max difference {error:.2e}')
+            failed |= not error <= args.atol
+    if failed:
+        sys.exit(f'The exported model differs from VIBE_Demo by more than {args.atol}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--output_file', type=str, default='data/vibe_data/vibe_demo.pt',
+                        help='output path, .pt for torchscript or .onnx for onnx')
+
+    parser.add_argument('--format', type=str, default='torchscript', choices=['torchscript', 'onnx'],
+                        help='export format')
+
+    parser.add_argument('--output', type=str, default='mesh', choices=['theta', 'joints', 'mesh'],
+                        help='outputs of the exported model, see Regressor.forward')
+
+    parser.add_argument('--batch_size', type=int, default=2,
+                        help='number of sequences of the example batch used for tracing')
+
+    parser.add_argument('--seqlen', type=int, default=16,
+                        help='sequence length of the example batch used for tracing')
+
+    parser.add_argument('--atol', type=float, default=1e-3,
+                        help='largest difference to VIBE_Demo accepted by the check after exporting')
+
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu',
+                        help='device the model is exported on, torchscript models keep it')
+
+    args = parser.parse_args()
+
+    main(args)
@@ -51,6 +51,8 @@ cfg.TRAIN.DATASETS_3D = ['MPII3D']
 cfg.TRAIN.DATASET_EVAL = 'ThreeDPW'
 cfg.TRAIN.BATCH_SIZE = 32
 cfg.TRAIN.DATA_2D_RATIO = 0.5
+cfg.TRAIN.BATCHED_2D_READS = False
+cfg.TRAIN.PRECOMPUTE_TARGETS = False
 cfg.TRAIN.START_EPOCH = 0
 cfg.TRAIN.END_EPOCH = 5
 cfg.TRAIN.PRETRAINED_REGRESSOR = ''
@@ -148,6 +148,7 @@ class Evaluator():
 
         log_str = ' '.join([f'{k.upper()}: {v:.4f},'for k,v in eval_dict.items()])
         print(log_str)
+        return eval_dict
 
     def run(self):
         self.validate()
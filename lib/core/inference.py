@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+import time
+import torch
+import logging
+import numpy as np
+
+from lib.dataset.inference import FrameCropper, TorchFrameCropper, InferenceDataService
+from lib.utils.demo_utils import convert_crop_cam_to_orig_img
+from lib.data_utils.img_utils import get_image_crops_demo, convert_cvimgs_to_tensor
+
+logger = logging.getLogger(__name__)
+
+
+class MultiPersonInference():
+    """
+    Runs VIBE_Demo on all tracklets of a video at once. Crops of all tracklets
+    are packed into shared ResNet batches, the temporal encoder runs over zero
+    padded batches of per-tracklet sequences and the regressor outputs are
+    scattered back per person id.
+
+    Each tracklet is split into independent sequences of at most `seqlen` frames,
+    which matches running the model on every dataloader batch of a single tracklet.
+
+    If `window` is set, every tracklet instead runs through the temporal encoder in
+    sliding windows over its full length (see `TemporalEncoder.forward_windowed`),
+    either carrying the GRU state across windows or blending overlapping windows.
+
+    `output` selects what the regressor computes, see `Regressor.forward`. With
+    'theta' or 'joints' the SMPL vertices are not returned and the mesh can be
+    computed later with `model.regressor.skin`.
+
+    If decoded frames are given, crops are produced frame-major by a `FrameCropper`
+    and fed to the ResNet as soon as enough of them are queued, instead of going
+    through a DataLoader over the datasets. With `crop_device` set, e.g. to 'cuda',
+    a `TorchFrameCropper` uploads the frames and crops them on that device instead.
+    """
+    def __init__(
+            self,
+            model,
+            device=None,
+            batch_size=450,
+            seqlen=450,
+            num_sequences=32,
+            num_workers=16,
+            chunk_size=32,
+            data_service=None,
+            window=None,
+            overlap=8,
+            carry_hidden=False,
+            output='mesh',
+            crop_device=None,
+    ):
+        self.model = model
+        self.device = device
+        self.batch_size = batch_size
+        self.seqlen = seqlen
+        self.num_sequences = num_sequences
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self.data_service = data_service
+        self.window = window
+        self.overlap = overlap
+        self.carry_hidden = carry_hidden
+        self.output = output
+        self.crop_device = crop_device
+        self.throughput = 0.
+
+        if self.device is None:
+            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+    def get_batches(self, datasets):
+        # the worker pool is created once and reused by every call
+        if self.data_service is None:
+            self.data_service = InferenceDataService(
+                batch_size=self.batch_size,
+                num_workers=self.num_workers,
+                pin_memory=str(self.device).startswith('cuda'),
+            )
+        return self.data_service(datasets)
+
+    def extract_features(self, datasets):
+        has_keypoints = datasets[0].has_keypoints
+
+        features, norm_joints2d = [], []
+        for batch in self.get_batches(datasets):
+            if has_keypoints:
+                batch, nj2d = batch
+                norm_joints2d.append(nj2d.numpy().reshape(-1, 21, 3))
+
+            batch = batch.to(self.device)
+            features.append(self.model.extract_features(batch))
+
+        features = torch.cat(features, dim=0)
+        norm_joints2d = np.concatenate(norm_joints2d, axis=0) if has_keypoints else None
+        return features, norm_joints2d
+
+    def extract_features_from_frames(self, datasets, person_ids, frames):
+        if self.crop_device is not None:
+            return self.extract_features_from_frames_torch(datasets, person_ids, frames)
+
+        lengths = [len(datasets[k]) for k in person_ids]
+        offsets = dict(zip(person_ids, np.cumsum([0] + lengths[:-1])))
+        has_keypoints = datasets[person_ids[0]].has_keypoints
+
+        features = None
+        norm_joints2d = np.zeros((sum(lengths), 21, 3)) if has_keypoints else None
+
+        def _flush(pending):
+            nonlocal features
+            crops = np.concatenate([c for _, _, c in pending], axis=0)
+            batch_features = self.model.extract_features(convert_cvimgs_to_tensor(crops, self.device))
+            if features is None:
+                features = batch_features.new_zeros(sum(lengths), batch_features.shape[-1])
+
+            i = 0
+            for person_id, start, c in pending:
+                offset = offsets[person_id] + start
+                features[offset:offset + len(c)] = batch_features[i:i + len(c)]
+                i += len(c)
+
+        cropper = FrameCropper({k: datasets[k] for k in person_ids}, chunk_size=self.chunk_size)
+
+        pending, num_pending = [], 0
+        for person_id, start, crops, kp_2d in cropper(frames):
+            if has_keypoints:
+                offset = offsets[person_id] + start
+                norm_joints2d[offset:offset + len(crops)] = kp_2d
+
+            pending.append((person_id, start, crops))
+            num_pending += len(crops)
+            if num_pending >= self.batch_size:
+                _flush(pending)
+                pending, num_pending = [], 0
+
+        if len(pending) > 0:
+            _flush(pending)
+
+        return features, norm_joints2d
+
+    def extract_features_from_frames_torch(self, datasets, person_ids, frames):
+        lengths = [len(datasets[k]) for k in person_ids]
+        offsets = dict(zip(person_ids, np.cumsum([0] + lengths[:-1])))
+        has_keypoints = datasets[person_ids[0]].has_keypoints
+
+        features = None
+        norm_joints2d = np.zeros((sum(lengths), 21, 3)) if has_keypoints else None
+
+        def _flush(pending):
+            nonlocal features
+            crops = torch.cat([c for _, c in pending], dim=0)
+            batch_features = self.model.extract_features(crops.to(self.device))
+            if features is None:
+                features = batch_features.new_zeros(sum(lengths), batch_features.shape[-1])
+
+            rows = np.concatenate([r for r, _ in pending])
+            features[torch.from_numpy(rows).to(batch_features.device)] = batch_features
+
+        cropper = TorchFrameCropper({k: datasets[k] for k in person_ids}, device=self.crop_device,
+                                    num_frames=self.chunk_size)
+
+        pending, num_pending = [], 0
+        for items, crops, kp_2d in cropper(frames):
+            rows = np.array([offsets[person_id] + idx for person_id, idx in items])
+            if has_keypoints:
+                norm_joints2d[rows] = kp_2d
+
+            pending.append((rows, crops))
+            num_pending += len(crops)
+            if num_pending >= self.batch_size:
+                _flush(pending)
+                pending, num_pending = [], 0
+
+        if len(pending) > 0:
+            _flush(pending)
+
+        return features, norm_joints2d
+
+    def run_encoder(self, features, lengths):
+        if self.window is not None:
+            return self.run_windowed_encoder(features, lengths)
+
+        # split every tracklet into sequences of at most seqlen frames
+        sequences = []
+        offset = 0
+        for length in lengths:
+            for start in range(0, length, self.seqlen):
+                sequences.append((offset + start, min(self.seqlen, length - start)))
+            offset += length
+
+        output = torch.empty_like(features)
+        for i in range(0, len(sequences), self.num_sequences):
+            group = sequences[i:i + self.num_sequences]
+            seq_lengths = [l for _, l in group]
+
+            x = features.new_zeros(len(group), max(seq_lengths), features.shape[-1])
+            for j, (start, l) in enumerate(group):
+                x[j, :l] = features[start:start + l]
+
+            with self.model.precision_context():
+                y = self.model.encoder(x, lengths=seq_lengths)
+
+            for j, (start, l) in enumerate(group):
+                output[start:start + l] = y[j, :l]
+
+        return output
+
+    def run_windowed_encoder(self, features, lengths):
+        output = torch.empty_like(features)
+        offset = 0
+        for length in lengths:
+            with self.model.precision_context():
+                output[offset:offset + length] = self.model.encoder.forward_windowed(
+                    features[offset:offset + length].unsqueeze(0),
+                    window=self.window,
+                    overlap=self.overlap,
+                    carry_hidden=self.carry_hidden,
+                    batch_windows=self.num_sequences,
+                )[0]
+            offset += length
+        return output
+
+    def run_regressor(self, features):
+        output_keys = {
+            'pred_verts': 'verts',
+            'pred_joints3d': 'kp_3d',
+            'smpl_joints2d': 'kp_2d',
+        }
+        results = {k: [] for k in ['pred_cam', 'pred_pose', 'pred_betas']}
+
+        for i in range(0, features.shape[0], self.batch_size):
+            output = self.model.regressor(features[i:i + self.batch_size], output=self.output)[-1]
+
+            results['pred_cam'].append(output['theta'][:, :3].cpu())
+            results['pred_pose'].append(output['theta'][:, 3:75].cpu())
+            results['pred_betas'].append(output['theta'][:, 75:].cpu())
+            for key, output_key in output_keys.items():
+                if output_key in output:
+                    results.setdefault(key, []).append(output[output_key].cpu())
+
+        return {k: torch.cat(v, dim=0) for k, v in results.items()}
+
+    @torch.no_grad()
+    def __call__(self, datasets, frames=None):
+        """
+        :param datasets (dict): person_id -> Inference dataset of the tracklet
+        :param frames (iterable): optional BGR frames of the video to crop the tracklets from
+        :return: person_id -> dict of predictions on cpu
+        """
+        person_ids = [k for k, v in datasets.items() if len(v) > 0]
+        if len(person_ids) == 0:
+            return {}
+
+        lengths = [len(datasets[k]) for k in person_ids]
+
+        start = time.time()
+
+        if frames is not None:
+            features, norm_joints2d = self.extract_features_from_frames(datasets, person_ids, frames)
+        else:
+            features, norm_joints2d = self.extract_features([datasets[k] for k in person_ids])
+        features = self.run_encoder(features, lengths)
+        output = self.run_regressor(features)
+
+        elapsed = time.time() - start
+        self.throughput = sum(lengths) / elapsed
+        print(f'VIBE processed {sum(lengths)} crops of {len(person_ids)} people '
+              f'in {elapsed:.2f}s, {self.throughput:.2f} crops/s')
+
+        results = {k: {} for k in person_ids}
+        for key, value in output.items():
+            for person_id, v in zip(person_ids, torch.split(value, lengths, dim=0)):
+                results[person_id][key] = v
+
+        if norm_joints2d is not None:
+            offsets = np.cumsum([0] + lengths)
+            for idx, person_id in enumerate(person_ids):
+                results[person_id]['norm_joints2d'] = norm_joints2d[offsets[idx]:offsets[idx + 1]]
+
+        return results
+
+
+class OnlineInference():
+    """
+    Online, per-frame VIBE for live inputs. Every call consumes a single frame and
+    the tracks detected in it, crops all people at once and advances one step of
+    the temporal encoder per track, keeping the GRU hidden state of every track id
+    between calls. Latency of every frame is recorded.
+
+    :param model (VIBE_Demo): model in eval mode
+    :param scale (float): bbox crop scaling factor
+    :param max_missing (int): drop the state of tracks not seen for this many frames
+    """
+    def __init__(self, model, device=None, scale=1.1, crop_size=224, max_missing=30):
+        self.model = model
+        self.device = device
+        self.scale = scale
+        self.crop_size = crop_size
+        self.max_missing = max_missing
+
+        self.hidden = {}
+        self.last_seen = {}
+        self.frame_idx = -1
+        self.latencies = []
+
+        if self.device is None:
+            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+    def reset(self):
+        self.hidden = {}
+        self.last_seen = {}
+        self.frame_idx = -1
+        self.latencies = []
+
+    def get_hidden(self, track_ids):
+        gru = self.model.encoder.gru
+        num_directions = 2 if gru.bidirectional else 1
+        zeros = torch.zeros(gru.num_layers * num_directions, gru.hidden_size, device=self.device)
+        return torch.stack([self.hidden.get(k, zeros) for k in track_ids], dim=1)
+
+    @torch.no_grad()
+    def __call__(self, img, tracks):
+        """
+        :param img (ndarray, HxWx3): BGR frame
+        :param tracks (ndarray, Nx5): tracks of the frame (x1, y1, x2, y2, track_id) as returned by Sort
+        :return: track_id -> dict of SMPL parameters of this frame
+        """
+        start = time.time()
+        self.frame_idx += 1
+
+        results = {}
+        if len(tracks) > 0:
+            track_ids = [int(t[4]) for t in tracks]
+
+            w, h = tracks[:, 2] - tracks[:, 0], tracks[:, 3] - tracks[:, 1]
+            c_x, c_y = tracks[:, 0] + w / 2, tracks[:, 1] + h / 2
+            w = h = np.where(w / h > 1, w, h)
+            bboxes = np.stack([c_x, c_y, w, h], axis=1)
+
+            crops, _ = get_image_crops_demo(img, bboxes, scale=self.scale, crop_size=self.crop_size)
+            crops = crops[..., ::-1]
+
+            feature = self.model.extract_features(convert_cvimgs_to_tensor(crops, self.device))
+            with self.model.precision_context():
+                feature, hidden = self.model.encoder(
+                    feature.unsqueeze(1), hidden=self.get_hidden(track_ids), return_hidden=True
+                )
+            feature, hidden = feature.float(), hidden.float()
+            output = self.model.regressor(feature[:, 0])[-1]
+
+            orig_cam = convert_crop_cam_to_orig_img(
+                cam=output['theta'][:, :3].cpu().numpy(),
+                bbox=bboxes,
+                img_width=img.shape[1],
+                img_height=img.shape[0],
+            )
+
+            for idx, track_id in enumerate(track_ids):
+                self.hidden[track_id] = hidden[:, idx]
+                self.last_seen[track_id] = self.frame_idx
+                results[track_id] = {
+                    'pred_cam': output['theta'][idx, :3].cpu().numpy(),
+                    'orig_cam': orig_cam[idx],
+                    'verts': output['verts'][idx].cpu().numpy(),
+                    'pose': output['theta'][idx, 3:75].cpu().numpy(),
+                    'betas': output['theta'][idx, 75:].cpu().numpy(),
+                    'joints3d': output['kp_3d'][idx].cpu().numpy(),
+                    'bbox': bboxes[idx],
+                }
+
+        for track_id in list(self.hidden.keys()):
+            if self.frame_idx - self.last_seen[track_id] > self.max_missing:
+                del self.hidden[track_id]
+                del self.last_seen[track_id]
+
+        self.latencies.append(time.time() - start)
+        return results
+
+    def run(self, frames, tracker):
+        """
+        Yield (frame index, frame, results) for every frame of a frame source.
+
+        :param tracker (callable): maps a BGR frame to its Nx5 tracks
+        """
+        for frame_idx, img in enumerate(frames):
+            yield frame_idx, img, self(img, tracker(img))
+
+    def latency_percentiles(self, percentiles=(50, 99)):
+        """Per frame latency percentiles in milliseconds."""
+        if len(self.latencies) == 0:
+            return {p: 0. for p in percentiles}
+        values = np.percentile(np.array(self.latencies) * 1000., percentiles)
+        return dict(zip(percentiles, values))
@@ -178,7 +178,8 @@ class Trainer():
             timer['data'] = time.time() - start
             start = time.time()
 
-            preds = self.generator(inp)
+            # the losses only need joints, skip skinning the full mesh
+            preds = self.generator(inp, output='joints')
 
             timer['forward'] = time.time() - start
             start = time.time()
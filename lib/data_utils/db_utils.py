@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+
+import sys
+sys.path.append('.')
+
+import os
+import h5py
+import json
+import joblib
+import argparse
+import numpy as np
+import os.path as osp
+
+from lib.core.config import VIBE_DB_DIR
+
+
+def get_columnar_dir(db_file):
+    # data/vibe_db/3dpw_val_db.pt -> data/vibe_db/3dpw_val_db/
+    return osp.splitext(db_file)[0]
+
+
+def convert_db(db_file, out_dir=None):
+    """
+    Converts a joblib `*_db.pt` file into a folder with one `.npy` file per field,
+    which `load_db` memory maps instead of unpickling.
+
+    :param db_file (str): path of the joblib database
+    :param out_dir (str): output folder, defaults to the database path without extension
+    :return: output folder
+    """
+    if out_dir is None:
+        out_dir = get_columnar_dir(db_file)
+    os.makedirs(out_dir, exist_ok=True)
+
+    db = joblib.load(db_file)
+    fields = {}
+    for key, value in db.items():
+        value = np.asarray(value)
+        # object arrays can not be memory mapped, they are pickled and loaded in full
+        fields[key] = value.dtype == object
+        np.save(osp.join(out_dir, f'{key}.npy'), value, allow_pickle=fields[key])
+        print(f'{key}: {value.dtype} {value.shape}')
+
+    # written last, so an interrupted conversion is not picked up by load_db
+    with open(osp.join(out_dir, 'fields.json'), 'w') as f:
+        json.dump(fields, f)
+
+    return out_dir
+
+
+def load_db(db_file, mmap=True):
+    """
+    Loads a training database. If `convert_db` was run for `db_file`, every field
+    is opened with `np.load(mmap_mode='r')`, so all DataLoader workers share the
+    same read-only pages of the page cache instead of holding a private copy of
+    the whole database. Otherwise falls back to `joblib.load`.
+
+    Memory mapped fields are read-only, copy slices before modifying them.
+
+    :param db_file (str): path of the joblib database
+    :param mmap (bool): memory map the columnar folder if it exists
+    :return: dict of field name -> array
+    """
+    columnar_dir = get_columnar_dir(db_file)
+    fields_file = osp.join(columnar_dir, 'fields.json')
+
+    if mmap and osp.isfile(fields_file):
+        with open(fields_file) as f:
+            fields = json.load(f)
+
+        db = {}
+        for key, is_object in fields.items():
+            file = osp.join(columnar_dir, f'{key}.npy')
+            if is_object:
+                db[key] = np.load(file, allow_pickle=True)
+            else:
+                db[key] = np.load(file, mmap_mode='r')
+        return db
+
+    if osp.isfile(db_file):
+        return joblib.load(db_file)
+
+    raise ValueError(f'{db_file} do not exists')
+
+
+def rechunk_hdf5(h5_file, out_file=None, seqlen=16):
+    """
+    Rewrites an hdf5 database, e.g. `insta_train_db.h5`, with chunks of `seqlen`
+    rows and no compression, so reading a window of `seqlen` frames touches at
+    most two chunks instead of scanning contiguous datasets. The rows are kept
+    in place, windows start at video boundaries and are not aligned to chunks.
+
+    :param h5_file (str): input file
+    :param out_file (str): output file, replaces the input file if None
+    """
+    tmp_file = (out_file or h5_file) + '.tmp'
+
+    with h5py.File(h5_file, 'r') as src, h5py.File(tmp_file, 'w') as dst:
+        for key, dataset in src.items():
+            chunks = (min(seqlen, len(dataset)),) + dataset.shape[1:] if len(dataset) > 0 else None
+            out = dst.create_dataset(key, shape=dataset.shape, dtype=dataset.dtype, chunks=chunks)
+            # copy in blocks of whole chunks
+            step = seqlen * 4096
+            for start in range(0, len(dataset), step):
+                out[start:start + step] = dataset[start:start + step]
+            print(f'{key}: {dataset.dtype} {dataset.shape}, chunks {chunks}')
+
+    os.replace(tmp_file, out_file or h5_file)
+    return out_file or h5_file
+
+
+def read_hdf5_rows(dataset, rows):
+    """
+    Reads sorted, unique `rows` of an h5py dataset with one contiguous slice per run of
+    consecutive rows. h5py point selections of long index lists are slow, overlapping
+    training windows give few, long runs.
+
+    :param dataset (h5py.Dataset): dataset to read
+    :param rows (np.ndarray): increasing row indices
+    :return: array of the rows, in the given order
+    """
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    run_starts = np.concatenate([[0], breaks])
+    run_ends = np.concatenate([breaks, [len(rows)]])
+
+    out = np.empty((len(rows),) + dataset.shape[1:], dtype=dataset.dtype)
+    for start, end in zip(run_starts, run_ends):
+        dataset.read_direct(out, np.s_[rows[start]:rows[end - 1] + 1], np.s_[start:end])
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db_dir', type=str, help='folder of the *_db.pt files', default=VIBE_DB_DIR)
+    parser.add_argument('--db_files', type=str, nargs='*', default=None,
+                        help='databases to convert, all *_db.pt files in db_dir by default')
+    parser.add_argument('--h5_files', type=str, nargs='*', default=[],
+                        help='hdf5 databases to rechunk in place, e.g. data/vibe_db/insta_train_db.h5')
+    parser.add_argument('--seqlen', type=int, default=16, help='rows per chunk of the rechunked hdf5 files')
+    args = parser.parse_args()
+
+    for h5_file in args.h5_files:
+        print(f'Rechunking {h5_file}')
+        rechunk_hdf5(h5_file, seqlen=args.seqlen)
+
+    db_files = args.db_files
+    if db_files is None and len(args.h5_files) == 0:
+        db_files = sorted(osp.join(args.db_dir, x) for x in os.listdir(args.db_dir) if x.endswith('_db.pt'))
+
+    for db_file in db_files or []:
+        print(f'Converting {db_file}')
+        out_dir = convert_db(db_file)
+        print(f'Saved {db_file} to {out_dir}')
@@ -51,46 +51,56 @@ def rotate_2d(pt_2d, rot_rad):
     return np.array([xx, yy], dtype=np.float32)
 
 def gen_trans_from_patch_cv(c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot, inv=False):
-    # augment size with scale
-    src_w = src_width * scale
-    src_h = src_height * scale
-    src_center = np.zeros(2)
-    src_center[0] = c_x
-    src_center[1] = c_y # np.array([c_x, c_y], dtype=np.float32)
-    # augment rotation
+    return gen_trans_from_patch_batch(c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot, inv=inv)[0]
+
+def gen_trans_from_patch_batch(c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot, inv=False):
+    """
+    Closed form of the affine transforms of `gen_trans_from_patch_cv` for N patches at once.
+    The patch maps the (rotated) box of size src * scale around (c_x, c_y) to the dst box.
+    All arguments are scalars or arrays of length N.
+
+    :return: Nx2x3 affine matrices
+    """
+    c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(x, dtype=np.float64)) for x in
+          (c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot)]
+    )
     rot_rad = np.pi * rot / 180
-    src_downdir = rotate_2d(np.array([0, src_h * 0.5], dtype=np.float32), rot_rad)
-    src_rightdir = rotate_2d(np.array([src_w * 0.5, 0], dtype=np.float32), rot_rad)
-
-    dst_w = dst_width
-    dst_h = dst_height
-    dst_center = np.array([dst_w * 0.5, dst_h * 0.5], dtype=np.float32)
-    dst_downdir = np.array([0, dst_h * 0.5], dtype=np.float32)
-    dst_rightdir = np.array([dst_w * 0.5, 0], dtype=np.float32)
-
-    src = np.zeros((3, 2), dtype=np.float32)
-    src[0, :] = src_center
-    src[1, :] = src_center + src_downdir
-    src[2, :] = src_center + src_rightdir
-
-    dst = np.zeros((3, 2), dtype=np.float32)
-    dst[0, :] = dst_center
-    dst[1, :] = dst_center + dst_downdir
-    dst[2, :] = dst_center + dst_rightdir
+    sn, cs = np.sin(rot_rad), np.cos(rot_rad)
+    src_center = np.stack([c_x, c_y], axis=-1)
+    dst_center = np.stack([dst_width * 0.5, dst_height * 0.5], axis=-1)
 
+    trans = np.zeros((len(c_x), 2, 3))
     if inv:
-        trans = cv2.getAffineTransform(np.float32(dst), np.float32(src))
+        # dst -> src: rotate and scale back to the source box
+        kx, ky = src_width * scale / dst_width, src_height * scale / dst_height
+        trans[:, 0, 0], trans[:, 0, 1] = kx * cs, -ky * sn
+        trans[:, 1, 0], trans[:, 1, 1] = kx * sn, ky * cs
+        center_from, center_to = dst_center, src_center
     else:
-        trans = cv2.getAffineTransform(np.float32(src), np.float32(dst))
+        kx, ky = dst_width / (src_width * scale), dst_height / (src_height * scale)
+        trans[:, 0, 0], trans[:, 0, 1] = kx * cs, kx * sn
+        trans[:, 1, 0], trans[:, 1, 1] = -ky * sn, ky * cs
+        center_from, center_to = src_center, dst_center
 
+    trans[:, :, 2] = center_to - np.einsum('nij,nj->ni', trans[:, :, :2], center_from)
     return trans
 
+def transform_keypoints_batch(kp_2d, trans):
+    """
+    :param kp_2d (ndarray, NxJx2): keypoints
+    :param trans (ndarray, Nx2x3): affine matrix of every frame
+    :return: NxJx2 transformed keypoints
+    """
+    return np.einsum('nij,nkj->nki', trans[:, :, :2], kp_2d[..., :2]) + trans[:, None, :, 2]
+
 def generate_patch_image_cv(cvimg, c_x, c_y, bb_width, bb_height, patch_width, patch_height, do_flip, scale, rot):
-    img = cvimg.copy()
+    # warpAffine does not modify its input, the image is only copied if it needs to be flipped
+    img = cvimg
     img_height, img_width, img_channels = img.shape
 
     if do_flip:
-        img = img[:, ::-1, :]
+        img = img[:, ::-1, :].copy()
         c_x = img_width - c_x - 1
 
     trans = gen_trans_from_patch_cv(c_x, c_y, bb_width, bb_height, patch_width, patch_height, scale, rot, inv=False)
@@ -122,8 +132,7 @@ def crop_image(image, kp_2d, center_x, center_y, width, height, patch_width, pat
         rot
     )
 
-    for n_jt in range(kp_2d.shape[0]):
-        kp_2d[n_jt] = trans_point2d(kp_2d[n_jt], trans)
+    kp_2d[:, :2] = kp_2d[:, :2] @ trans[:, :2].T + trans[:, 2]
 
     return image, kp_2d, trans
 
@@ -147,11 +156,37 @@ def transfrom_keypoints(kp_2d, center_x, center_y, width, height, patch_width, p
         inv=False,
     )
 
-    for n_jt in range(kp_2d.shape[0]):
-        kp_2d[n_jt] = trans_point2d(kp_2d[n_jt], trans)
+    kp_2d[:, :2] = kp_2d[:, :2] @ trans[:, :2].T + trans[:, 2]
 
     return kp_2d, trans
 
+def transfrom_keypoints_batch(kp_2d, center_x, center_y, width, height, patch_width, patch_height, do_augment):
+    """
+    Batched `transfrom_keypoints` over the N frames of a sequence, kp_2d is NxJx2.
+    With do_augment, augmentation parameters are drawn for every frame.
+    """
+    num_frames = kp_2d.shape[0]
+
+    if do_augment:
+        scale, rot = np.array([do_augmentation()[:2] for _ in range(num_frames)]).T
+    else:
+        scale, rot = 1.2, 0
+
+    trans = gen_trans_from_patch_batch(
+        center_x,
+        center_y,
+        width,
+        height,
+        patch_width,
+        patch_height,
+        scale,
+        rot,
+        inv=False,
+    )
+    trans = np.broadcast_to(trans, (num_frames, 2, 3))
+
+    return transform_keypoints_batch(kp_2d, trans), trans
+
 def get_image_crops(image_file, bboxes):
     image = cv2.cvtColor(cv2.imread(image_file), cv2.COLOR_BGR2RGB)
     crop_images = []
@@ -160,7 +195,7 @@ def get_image_crops(image_file, bboxes):
         h, w = bb[2]-bb[0], bb[3]-bb[1]
         w = h = np.where(w / h > 1, w, h)
         crop_image, _ = generate_patch_image_cv(
-            cvimg=image.copy(),
+            cvimg=image,
             c_x=c_x,
             c_y=c_y,
             bb_width=w,
@@ -190,7 +225,7 @@ def get_single_image_crop(image, bbox, scale=1.3):
         raise('Unknown type for object', type(image))
 
     crop_image, _ = generate_patch_image_cv(
-        cvimg=image.copy(),
+        cvimg=image,
         c_x=bbox[0],
         c_y=bbox[1],
         bb_width=bbox[2],
@@ -219,7 +254,7 @@ def get_single_image_crop_demo(image, bbox, kp_2d, scale=1.2, crop_size=224):
         raise('Unknown type for object', type(image))
 
     crop_image, trans = generate_patch_image_cv(
-        cvimg=image.copy(),
+        cvimg=image,
         c_x=bbox[0],
         c_y=bbox[1],
         bb_width=bbox[2],
@@ -232,8 +267,7 @@ def get_single_image_crop_demo(image, bbox, kp_2d, scale=1.2, crop_size=224):
     )
 
     if kp_2d is not None:
-        for n_jt in range(kp_2d.shape[0]):
-            kp_2d[n_jt, :2] = trans_point2d(kp_2d[n_jt], trans)
+        kp_2d[:, :2] = kp_2d[:, :2] @ trans[:, :2].T + trans[:, 2]
 
     raw_image = crop_image.copy()
 
@@ -241,16 +275,119 @@ def get_single_image_crop_demo(image, bbox, kp_2d, scale=1.2, crop_size=224):
 
     return crop_image, raw_image, kp_2d
 
+def get_image_crops_demo(image, bboxes, kp_2d=None, scale=1.2, crop_size=224, out=None):
+    """
+    Crop all bboxes of a single frame in one pass, the batched version of
+    `get_single_image_crop_demo`. The frame is neither copied nor converted,
+    the crops keep the channel order of the input image.
+
+    :param image (ndarray, HxWx3): uint8 frame
+    :param bboxes (ndarray, Nx4): bboxes (c_x, c_y, w, h)
+    :param kp_2d (ndarray, NxJx3): optional keypoints, transformed in place to crop coordinates
+    :param out (ndarray, Nxcrop_sizexcrop_sizex3): optional uint8 output buffer
+    :return: crops, kp_2d
+    """
+    if out is None:
+        out = np.empty((len(bboxes), crop_size, crop_size, image.shape[-1]), dtype=np.uint8)
+
+    if len(bboxes) == 0:
+        return out, kp_2d
+
+    bboxes = np.asarray(bboxes)
+    trans = gen_trans_from_patch_batch(
+        bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 3], crop_size, crop_size, scale, 0, inv=False
+    )
+    for idx in range(len(bboxes)):
+        cv2.warpAffine(image, trans[idx], (crop_size, crop_size), dst=out[idx],
+                       flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT)
+
+    if kp_2d is not None:
+        kp_2d[:, :, :2] = transform_keypoints_batch(kp_2d, trans)
+
+    return out, kp_2d
+
 def read_image(filename):
     image = cv2.cvtColor(cv2.imread(filename), cv2.COLOR_BGR2RGB)
     image = cv2.resize(image, (224,224))
     return convert_cvimg_to_tensor(image)
 
+# the transform is stateless, build it once instead of for every image
+_default_transform = None
+
 def convert_cvimg_to_tensor(image):
-    transform = get_default_transform()
-    image = transform(image)
+    global _default_transform
+    if _default_transform is None:
+        _default_transform = get_default_transform()
+    image = _default_transform(image)
     return image
 
+def normalize_images_tensor(images):
+    """
+    `get_default_transform` normalization of Nx3xHxW float images in [0, 1], on their device.
+    """
+    mean = torch.tensor([0.485, 0.456, 0.406], device=images.device).view(1, 3, 1, 1)
+    std = torch.tensor([0.229, 0.224, 0.225], device=images.device).view(1, 3, 1, 1)
+    return (images - mean) / std
+
+def convert_cvimgs_to_tensor(images, device=None):
+    """
+    Batched version of `convert_cvimg_to_tensor` for uint8 RGB crops of shape
+    NxHxWx3, the normalization runs on `device`.
+    """
+    images = torch.from_numpy(np.ascontiguousarray(images)).to(device)
+    images = images.permute(0, 3, 1, 2).float().div_(255.)
+    return normalize_images_tensor(images)
+
+def get_image_crops_torch(images, frame_idx, bboxes, scale=1.2, crop_size=224, bgr=True):
+    """
+    Crops, resizes and normalizes all bboxes of a batch of frames on the device
+    of the frames, the torch counterpart of `get_image_crops_demo` followed by
+    `convert_cvimgs_to_tensor`. Every crop is sampled bilinearly with the inverse
+    affine transform of its bbox, with the pixel center convention and the zero
+    border of `cv2.warpAffine`.
+
+    :param images (Tensor, FxHxWx3): uint8 frames, e.g. already uploaded to the GPU
+    :param frame_idx (ndarray, N): index into `images` of the frame of each bbox
+    :param bboxes (ndarray, Nx4): bboxes (c_x, c_y, w, h)
+    :param bgr (bool): frames are BGR as decoded by cv2 / ffmpeg, the crops are always RGB
+    :return: normalized crops Nx3xcrop_sizexcrop_size
+    """
+    device = images.device
+    height, width = images.shape[1:3]
+    frame_idx = np.asarray(frame_idx)
+    bboxes = np.asarray(bboxes)
+
+    crops = torch.zeros(len(bboxes), 3, crop_size, crop_size, device=device)
+    if len(bboxes) == 0:
+        return crops
+
+    trans = gen_trans_from_patch_batch(
+        bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 3], crop_size, crop_size, scale, 0, inv=True
+    )
+    trans = torch.from_numpy(trans).float().to(device)
+
+    # crop pixel centers -> source pixel coordinates -> [-1, 1] of grid_sample
+    coords = torch.arange(crop_size, dtype=torch.float32, device=device)
+    ys, xs = torch.meshgrid(coords, coords)
+    grid = torch.stack([xs, ys, torch.ones_like(xs)], dim=-1)
+    grid = torch.einsum('nij,hwj->nhwi', trans, grid)
+    grid = (2 * grid + 1) / torch.tensor([width, height], dtype=torch.float32, device=device) - 1
+
+    for f in np.unique(frame_idx):
+        idx = np.nonzero(frame_idx == f)[0]
+        frame = images[int(f)].permute(2, 0, 1).unsqueeze(0).float()
+        # all crops of a frame are stacked vertically into one sampling grid, so
+        # the frame is sampled once and never copied per bbox
+        frame_grid = grid[idx].reshape(1, len(idx) * crop_size, crop_size, 2)
+        out = torch.nn.functional.grid_sample(frame, frame_grid, mode='bilinear', padding_mode='zeros',
+                                              align_corners=False)
+        crops[torch.from_numpy(idx).to(device)] = out.reshape(3, len(idx), crop_size, crop_size).transpose(0, 1)
+
+    if bgr:
+        crops = crops.flip(1)
+
+    return normalize_images_tensor(crops.div_(255.))
+
 def torch2numpy(image):
     image = image.detach().cpu()
     inv_normalize = transforms.Normalize(
@@ -25,23 +25,43 @@ def keypoint_hflip(kp, img_width):
         kp[:, :, 0] = (img_width - 1.) - kp[:, :, 0]
     return kp
 
-def convert_kps(joints2d, src, dst):
-    src_names = eval(f'get_{src}_joint_names')()
-    dst_names = eval(f'get_{dst}_joint_names')()
-
-    out_joints2d = np.zeros((joints2d.shape[0], len(dst_names), 3))
-
-    for idx, jn in enumerate(dst_names):
-        if jn in src_names:
-            out_joints2d[:, idx] = joints2d[:, src_names.index(jn)]
-
-    return out_joints2d
+# (src, dst) -> number of dst joints, dst indices and the src index each of them is read from
+_kp_maps = {}
+
+def get_kp_map(src, dst):
+    key = (src, dst)
+    if key not in _kp_maps:
+        src_names = eval(f'get_{src}_joint_names')()
+        dst_names = eval(f'get_{dst}_joint_names')()
+        src_index = {jn: idx for idx, jn in reversed(list(enumerate(src_names)))}
+
+        dst_idxs = np.array([idx for idx, jn in enumerate(dst_names) if jn in src_index], dtype=np.int64)
+        src_idxs = np.array([src_index[dst_names[idx]] for idx in dst_idxs], dtype=np.int64)
+        _kp_maps[key] = (len(dst_names), dst_idxs, src_idxs)
+    return _kp_maps[key]
+
+def convert_kps(joints2d, src, dst, dtype=np.float64, out=None):
+    """
+    Reorders joints from the `src` to the `dst` format with a single gather,
+    dst joints missing in src are zero.
+
+    :param joints2d (ndarray, NxJxC): joints in src format
+    :param dtype: dtype of the output
+    :param out (ndarray): optional output buffer of shape NxJ_dstxC, reused across calls
+    """
+    num_joints, dst_idxs, src_idxs = get_kp_map(src, dst)
+
+    if out is None:
+        out = np.zeros((joints2d.shape[0], num_joints) + joints2d.shape[2:], dtype=dtype)
+    elif len(dst_idxs) < num_joints:
+        out.fill(0)
+
+    out[:, dst_idxs] = joints2d[:, src_idxs]
+    return out
 
 def get_perm_idxs(src, dst):
-    src_names = eval(f'get_{src}_joint_names')()
-    dst_names = eval(f'get_{dst}_joint_names')()
-    idxs = [src_names.index(h) for h in dst_names if h in src_names]
-    return idxs
+    _, _, src_idxs = get_kp_map(src, dst)
+    return src_idxs.tolist()
 
 def get_mpii3d_test_joint_names():
     return [
@@ -31,7 +31,7 @@ from lib.models import spin
 from lib.data_utils.kp_utils import *
 from lib.core.config import VIBE_DB_DIR, VIBE_DATA_DIR
 from lib.utils.smooth_bbox import get_smooth_bbox_params
-from lib.models.smpl import SMPL, SMPL_MODEL_DIR, H36M_TO_J14
+from lib.models.smpl import H36M_TO_J14, get_smpl
 from lib.data_utils.feature_extractor import extract_features
 from lib.utils.geometry import batch_rodrigues, rotation_matrix_to_angle_axis
 
@@ -60,7 +60,7 @@ def read_data(folder, set, debug=False):
 
     J_regressor = None
 
-    smpl = SMPL(SMPL_MODEL_DIR, batch_size=1, create_transl=False)
+    smpl = get_smpl()
     if set == 'test' or set == 'validation':
         J_regressor = torch.from_numpy(np.load(osp.join(VIBE_DATA_DIR, 'J_regressor_h36m.npy'))).float()
 
@@ -15,12 +15,12 @@
 # Contact: ps-license@tuebingen.mpg.de
 
 import torch
-import joblib
 import numpy as np
 import os.path as osp
 from torch.utils.data import Dataset
 
 from lib.core.config import VIBE_DB_DIR
+from lib.data_utils.db_utils import load_db
 from lib.data_utils.img_utils import split_into_chunks
 
 class AMASS(Dataset):
@@ -42,7 +42,7 @@ class AMASS(Dataset):
 
     def load_db(self):
         db_file = osp.join(VIBE_DB_DIR, 'amass_db.pt')
-        db = joblib.load(db_file)
+        db = load_db(db_file)
         return db
 
     def get_single_item(self, index):
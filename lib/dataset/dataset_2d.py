@@ -20,13 +20,13 @@ import random
 import logging
 import numpy as np
 import os.path as osp
-import joblib
 
 from torch.utils.data import Dataset
 
 from lib.core.config import VIBE_DB_DIR
 from lib.data_utils.kp_utils import convert_kps
-from lib.data_utils.img_utils import normalize_2d_kp, transfrom_keypoints, split_into_chunks
+from lib.data_utils.db_utils import load_db
+from lib.data_utils.img_utils import normalize_2d_kp, transfrom_keypoints_batch, split_into_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +40,7 @@ class Dataset2D(Dataset):
         self.stride = int(seqlen * (1-overlap))
         self.debug = debug
         self.db = self.load_db()
+        self.targets = None
         self.vid_indices = split_into_chunks(self.db['vid_name'], self.seqlen, self.stride)
 
 
@@ -54,56 +55,78 @@ class Dataset2D(Dataset):
 
         db_file = osp.join(VIBE_DB_DIR, f'{self.dataset_name}_{set}_db.pt')
 
-        if osp.isfile(db_file):
-            db = joblib.load(db_file)
-        else:
-            raise ValueError(f'{db_file} do not exists')
+        db = load_db(db_file)
 
         print(f'Loaded {self.dataset_name} dataset from {db_file}')
         return db
 
-    def get_single_item(self, index):
-        start_index, end_index = self.vid_indices[index]
+    def get_frame_targets(self, start_index, end_index):
+        """
+        2D keypoint targets of the frames start_index to end_index, built with a handful of array ops.
 
-        kp_2d = self.db['joints2D'][start_index:end_index+1]
-        if self.dataset_name != 'posetrack':
-            kp_2d = convert_kps(kp_2d, src=self.dataset_name, dst='spin')
-        kp_2d_tensor = np.ones((self.seqlen, 49, 3), dtype=np.float16)
-
-        bbox  = self.db['bbox'][start_index:end_index+1]
-
-        input = torch.from_numpy(self.db['features'][start_index:end_index+1]).float()
+        :return: dict with the kp_2d array, one row per frame
+        """
+        frames = slice(start_index, end_index + 1)
 
+        if self.dataset_name != 'posetrack':
+            kp_2d = convert_kps(self.db['joints2D'][frames], src=self.dataset_name, dst='spin', dtype=np.float32)
+        else:
+            # copy, the keypoints are transformed in place and the db may be memory mapped
+            kp_2d = np.array(self.db['joints2D'][frames], dtype=np.float32)
+
+        # crop and normalize the 2d keypoints of all frames at once
+        bbox = self.db['bbox'][frames]
+        kp_2d[:,:,:2], _ = transfrom_keypoints_batch(
+            kp_2d=kp_2d[:,:,:2],
+            center_x=bbox[:,0],
+            center_y=bbox[:,1],
+            width=bbox[:,2],
+            height=bbox[:,3],
+            patch_width=224,
+            patch_height=224,
+            do_augment=False,
+        )
+        kp_2d[:,:,:2] = normalize_2d_kp(kp_2d[:,:,:2], 224)
+
+        return {'kp_2d': kp_2d}
+
+    def precompute_targets(self, chunk_size=65536):
+        """
+        Builds the targets of every frame once, windows are then sliced out of them.
+        Overlapping windows share the work, at the cost of keeping all targets in memory.
+        """
+        num_frames = len(self.db['bbox'])
+        targets = None
+        for start in range(0, num_frames, chunk_size):
+            end = min(start + chunk_size, num_frames)
+            chunk = self.get_frame_targets(start, end - 1)
+            if targets is None:
+                targets = {k: np.empty((num_frames,) + v.shape[1:], dtype=v.dtype) for k, v in chunk.items()}
+            for k, v in chunk.items():
+                targets[k][start:end] = v
+        self.targets = targets
 
-        for idx in range(self.seqlen):
-            # crop image and transform 2d keypoints
-            kp_2d[idx,:,:2], trans = transfrom_keypoints(
-                kp_2d=kp_2d[idx,:,:2],
-                center_x=bbox[idx,0],
-                center_y=bbox[idx,1],
-                width=bbox[idx,2],
-                height=bbox[idx,3],
-                patch_width=224,
-                patch_height=224,
-                do_augment=False,
-            )
+    def get_single_item(self, index):
+        start_index, end_index = self.vid_indices[index]
 
-            kp_2d[idx,:,:2] = normalize_2d_kp(kp_2d[idx,:,:2], 224)
-            kp_2d_tensor[idx] = kp_2d[idx]
+        if self.targets is not None:
+            frame_targets = {k: v[start_index:end_index + 1] for k, v in self.targets.items()}
+        else:
+            frame_targets = self.get_frame_targets(start_index, end_index)
 
-        vid_name = self.db['vid_name'][start_index:end_index+1]
-        frame_id = self.db['img_name'][start_index:end_index+1].astype(str)
-        instance_id = np.array([v+f for v,f in zip(vid_name, frame_id)])
+        input = torch.from_numpy(np.array(self.db['features'][start_index:end_index+1], dtype=np.float32))
 
         target = {
             'features': input,
-            'kp_2d': torch.from_numpy(kp_2d_tensor).float(), # 2D keypoints transformed according to bbox cropping
+            'kp_2d': torch.from_numpy(frame_targets['kp_2d'][:self.seqlen]), # 2D keypoints transformed according to bbox cropping
             # 'instance_id': instance_id,
         }
 
         if self.debug:
             from lib.data_utils.img_utils import get_single_image_crop
 
+            bbox = self.db['bbox'][start_index:end_index + 1]
+
             vid_name = self.db['vid_name'][start_index]
 
             if self.dataset_name == 'pennaction':
@@ -20,12 +20,12 @@ import random
 import logging
 import numpy as np
 import os.path as osp
-import joblib
 
 from torch.utils.data import Dataset
 from lib.core.config import VIBE_DB_DIR
 from lib.data_utils.kp_utils import convert_kps
-from lib.data_utils.img_utils import normalize_2d_kp, transfrom_keypoints, split_into_chunks
+from lib.data_utils.db_utils import load_db
+from lib.data_utils.img_utils import normalize_2d_kp, transfrom_keypoints_batch, split_into_chunks
 
 logger = logging.getLogger(__name__)
 
@@ -39,6 +39,7 @@ class Dataset3D(Dataset):
         self.stride = int(seqlen * (1-overlap))
         self.debug = debug
         self.db = self.load_db()
+        self.targets = None
         self.vid_indices = split_into_chunks(self.db['vid_name'], self.seqlen, self.stride)
 
     def __len__(self):
@@ -50,96 +51,97 @@ class Dataset3D(Dataset):
     def load_db(self):
         db_file = osp.join(VIBE_DB_DIR, f'{self.dataset_name}_{self.set}_db.pt')
 
-        if osp.isfile(db_file):
-            db = joblib.load(db_file)
-        else:
-            raise ValueError(f'{db_file} do not exists')
+        db = load_db(db_file)
 
         print(f'Loaded {self.dataset_name} dataset from {db_file}')
         return db
 
-    def get_single_item(self, index):
-        start_index, end_index = self.vid_indices[index]
+    def get_frame_targets(self, start_index, end_index):
+        """
+        Targets of the frames start_index to end_index, built with a handful of array ops.
 
+        :return: dict of kp_2d, kp_3d, theta, w_smpl and w_3d arrays, one row per frame
+        """
         is_train = self.set == 'train'
+        frames = slice(start_index, end_index + 1)
+        num_frames = end_index + 1 - start_index
 
         if self.dataset_name == '3dpw':
-            kp_2d = convert_kps(self.db['joints2D'][start_index:end_index + 1], src='common', dst='spin')
-            kp_3d = self.db['joints3D'][start_index:end_index + 1]
-        elif self.dataset_name == 'mpii3d':
-            kp_2d = self.db['joints2D'][start_index:end_index + 1]
-            if is_train:
-                kp_3d = self.db['joints3D'][start_index:end_index + 1]
-            else:
-                kp_3d = convert_kps(self.db['joints3D'][start_index:end_index + 1], src='spin', dst='common')
-        elif self.dataset_name == 'h36m':
-            kp_2d = self.db['joints2D'][start_index:end_index + 1]
-            if is_train:
-                kp_3d = self.db['joints3D'][start_index:end_index + 1]
-            else:
-                kp_3d = convert_kps(self.db['joints3D'][start_index:end_index + 1], src='spin', dst='common')
+            kp_2d = convert_kps(self.db['joints2D'][frames], src='common', dst='spin', dtype=np.float32)
+        else:
+            # copy, the keypoints are transformed in place and the db may be memory mapped
+            kp_2d = np.array(self.db['joints2D'][frames], dtype=np.float32)
 
-        kp_2d_tensor = np.ones((self.seqlen, 49, 3), dtype=np.float16)
-        nj = 14 if not is_train else 49
-        kp_3d_tensor = np.zeros((self.seqlen, nj, 3), dtype=np.float16)
+        if self.dataset_name == '3dpw' or is_train:
+            kp_3d = np.array(self.db['joints3D'][frames], dtype=np.float32)
+        else:
+            kp_3d = convert_kps(self.db['joints3D'][frames], src='spin', dst='common', dtype=np.float32)
+
+        # crop and normalize the 2d keypoints of all frames at once
+        bbox = self.db['bbox'][frames]
+        kp_2d[:,:,:2], _ = transfrom_keypoints_batch(
+            kp_2d=kp_2d[:,:,:2],
+            center_x=bbox[:,0],
+            center_y=bbox[:,1],
+            width=bbox[:,2],
+            height=bbox[:,3],
+            patch_width=224,
+            patch_height=224,
+            do_augment=False,
+        )
+        kp_2d[:,:,:2] = normalize_2d_kp(kp_2d[:,:,:2], 224)
+
+        # theta shape (85,), camera, pose and shape, only 3dpw and h36m train have smpl parameters
+        has_smpl = self.dataset_name == '3dpw' or (self.dataset_name == 'h36m' and is_train)
+        theta = np.zeros((num_frames, 85), dtype=np.float32)
+        theta[:, 0] = 1.
+        if has_smpl:
+            theta[:, 3:75] = self.db['pose'][frames]
+            theta[:, 75:] = self.db['shape'][frames]
+
+        return {
+            'kp_2d': kp_2d,
+            'kp_3d': kp_3d,
+            'theta': theta,
+            'w_smpl': np.full(num_frames, float(has_smpl), dtype=np.float32),
+            'w_3d': np.ones(num_frames, dtype=np.float32),
+        }
 
+    def precompute_targets(self, chunk_size=65536):
+        """
+        Builds the targets of every frame once, windows are then sliced out of them.
+        Overlapping windows share the work, at the cost of keeping all targets in memory.
+        """
+        num_frames = len(self.db['bbox'])
+        targets = None
+        for start in range(0, num_frames, chunk_size):
+            end = min(start + chunk_size, num_frames)
+            chunk = self.get_frame_targets(start, end - 1)
+            if targets is None:
+                targets = {k: np.empty((num_frames,) + v.shape[1:], dtype=v.dtype) for k, v in chunk.items()}
+            for k, v in chunk.items():
+                targets[k][start:end] = v
+        self.targets = targets
 
-        if self.dataset_name == '3dpw':
-            pose  = self.db['pose'][start_index:end_index+1]
-            shape = self.db['shape'][start_index:end_index+1]
-            w_smpl = torch.ones(self.seqlen).float()
-            w_3d = torch.ones(self.seqlen).float()
-        elif self.dataset_name == 'h36m':
-            if not is_train:
-                pose = np.zeros((kp_2d.shape[0], 72))
-                shape = np.zeros((kp_2d.shape[0], 10))
-                w_smpl = torch.zeros(self.seqlen).float()
-                w_3d = torch.ones(self.seqlen).float()
-            else:
-                pose = self.db['pose'][start_index:end_index + 1]
-                shape = self.db['shape'][start_index:end_index + 1]
-                w_smpl = torch.ones(self.seqlen).float()
-                w_3d = torch.ones(self.seqlen).float()
-        elif self.dataset_name == 'mpii3d':
-            pose = np.zeros((kp_2d.shape[0], 72))
-            shape = np.zeros((kp_2d.shape[0], 10))
-            w_smpl = torch.zeros(self.seqlen).float()
-            w_3d = torch.ones(self.seqlen).float()
-
-        bbox = self.db['bbox'][start_index:end_index + 1]
-        input = torch.from_numpy(self.db['features'][start_index:end_index+1]).float()
-
-        theta_tensor = np.zeros((self.seqlen, 85), dtype=np.float16)
-
-        for idx in range(self.seqlen):
-            # crop image and transform 2d keypoints
-            kp_2d[idx,:,:2], trans = transfrom_keypoints(
-                kp_2d=kp_2d[idx,:,:2],
-                center_x=bbox[idx,0],
-                center_y=bbox[idx,1],
-                width=bbox[idx,2],
-                height=bbox[idx,3],
-                patch_width=224,
-                patch_height=224,
-                do_augment=False,
-            )
+    def get_single_item(self, index):
+        start_index, end_index = self.vid_indices[index]
 
-            kp_2d[idx,:,:2] = normalize_2d_kp(kp_2d[idx,:,:2], 224)
+        is_train = self.set == 'train'
 
-            # theta shape (85,)
-            theta = np.concatenate((np.array([1., 0., 0.]), pose[idx], shape[idx]), axis=0)
+        if self.targets is not None:
+            frame_targets = {k: v[start_index:end_index + 1] for k, v in self.targets.items()}
+        else:
+            frame_targets = self.get_frame_targets(start_index, end_index)
 
-            kp_2d_tensor[idx] = kp_2d[idx]
-            theta_tensor[idx] = theta
-            kp_3d_tensor[idx] = kp_3d[idx]
+        input = torch.from_numpy(np.array(self.db['features'][start_index:end_index+1], dtype=np.float32))
 
         target = {
             'features': input,
-            'theta': torch.from_numpy(theta_tensor).float(), # camera, pose and shape
-            'kp_2d': torch.from_numpy(kp_2d_tensor).float(), # 2D keypoints transformed according to bbox cropping
-            'kp_3d': torch.from_numpy(kp_3d_tensor).float(), # 3D keypoints
-            'w_smpl': w_smpl,
-            'w_3d': w_3d,
+            'theta': torch.from_numpy(frame_targets['theta'][:self.seqlen]), # camera, pose and shape
+            'kp_2d': torch.from_numpy(frame_targets['kp_2d'][:self.seqlen]), # 2D keypoints transformed according to bbox cropping
+            'kp_3d': torch.from_numpy(frame_targets['kp_3d'][:self.seqlen]), # 3D keypoints
+            'w_smpl': torch.from_numpy(frame_targets['w_smpl'][:self.seqlen]),
+            'w_3d': torch.from_numpy(frame_targets['w_3d'][:self.seqlen]),
         }
 
         if self.dataset_name == 'mpii3d' and not is_train:
@@ -162,6 +164,8 @@ class Dataset3D(Dataset):
         if self.debug:
             from lib.data_utils.img_utils import get_single_image_crop
 
+            bbox = self.db['bbox'][start_index:end_index + 1]
+
             if self.dataset_name == 'mpii3d':
                 video = self.db['img_name'][start_index:end_index+1]
                 # print(video)
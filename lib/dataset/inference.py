@@ -16,24 +16,39 @@
 
 import os
 import cv2
+import torch
+import inspect
 import numpy as np
 import os.path as osp
-from torch.utils.data import Dataset
+from collections import defaultdict
+from torch.utils.data import Dataset, IterableDataset, DataLoader, Sampler
 from torchvision.transforms.functional import to_tensor
 
 from lib.utils.smooth_bbox import get_all_bbox_params
-from lib.data_utils.img_utils import get_single_image_crop_demo
+from lib.data_utils.img_utils import (
+    get_single_image_crop_demo, get_image_crops_demo, get_image_crops_torch, convert_cvimg_to_tensor,
+    gen_trans_from_patch_batch, transform_keypoints_batch,
+)
 
 
 class Inference(Dataset):
+    """
+    Crops of a single tracklet. If `image_folder` is None, frames are not read
+    from disk; the dataset describes the tracklet for `FrameCropper`, which
+    crops all tracklets while decoding the video, and `fill_crops` can store
+    those crops in memory.
+    """
     def __init__(self, image_folder, frames, bboxes=None, joints2d=None, scale=1.0, crop_size=224):
-        self.image_file_names = [
-            osp.join(image_folder, x)
-            for x in os.listdir(image_folder)
-            if x.endswith('.png') or x.endswith('.jpg')
-        ]
-        self.image_file_names = sorted(self.image_file_names)
-        self.image_file_names = np.array(self.image_file_names)[frames]
+        if image_folder is not None:
+            self.image_file_names = [
+                osp.join(image_folder, x)
+                for x in os.listdir(image_folder)
+                if x.endswith('.png') or x.endswith('.jpg')
+            ]
+            self.image_file_names = sorted(self.image_file_names)
+            self.image_file_names = np.array(self.image_file_names)[frames]
+        else:
+            self.image_file_names = None
         self.bboxes = bboxes
         self.joints2d = joints2d
         self.scale = scale
@@ -48,30 +63,273 @@ class Inference(Dataset):
             bboxes[:, 2:] = 150. / bboxes[:, 2:]
             self.bboxes = np.stack([bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 2]]).T
 
-            self.image_file_names = self.image_file_names[time_pt1:time_pt2]
+            if self.image_file_names is not None:
+                self.image_file_names = self.image_file_names[time_pt1:time_pt2]
             self.joints2d = joints2d[time_pt1:time_pt2]
             self.frames = frames[time_pt1:time_pt2]
+            self.norm_joints2d = np.zeros_like(self.joints2d)
+
+        self.crops = None
 
     def __len__(self):
-        return len(self.image_file_names)
+        return len(self.frames)
+
+    def set_crops(self, start, crops, kp_2d=None):
+        """Store RGB crops (and transformed keypoints) of frames [start, start + len(crops))."""
+        if self.crops is None:
+            self.crops = np.zeros((len(self.frames), self.crop_size, self.crop_size, 3), dtype=np.uint8)
+
+        self.crops[start:start + len(crops)] = crops
+        if self.has_keypoints:
+            self.norm_joints2d[start:start + len(crops)] = kp_2d
+
+    def get_job(self, idx):
+        """Everything needed to load the idx-th item without access to the dataset, see `load_crop_job`."""
+        if self.image_file_names is None:
+            j2d = self.norm_joints2d[idx] if self.has_keypoints else None
+            return self.crops[idx], None, j2d, self.scale, self.crop_size
+        else:
+            j2d = self.joints2d[idx].copy() if self.has_keypoints else None
+            return self.image_file_names[idx], self.bboxes[idx], j2d, self.scale, self.crop_size
 
     def __getitem__(self, idx):
-        img = cv2.cvtColor(cv2.imread(self.image_file_names[idx]), cv2.COLOR_BGR2RGB)
+        return load_crop_job(self.get_job(idx))
 
-        bbox = self.bboxes[idx]
 
-        j2d = self.joints2d[idx] if self.has_keypoints else None
+def load_crop_job(job):
+    """
+    Load a single crop described by `Inference.get_job`. The image is either an
+    image file which is read and cropped, or an RGB crop which is only normalized.
+    """
+    image, bbox, j2d, scale, crop_size = job
+
+    if bbox is None:
+        norm_img, kp_2d = convert_cvimg_to_tensor(image), j2d
+    else:
+        img = cv2.cvtColor(cv2.imread(image), cv2.COLOR_BGR2RGB)
 
         norm_img, raw_img, kp_2d = get_single_image_crop_demo(
             img,
             bbox,
             kp_2d=j2d,
-            scale=self.scale,
-            crop_size=self.crop_size)
-        if self.has_keypoints:
-            return norm_img, kp_2d
-        else:
-            return norm_img
+            scale=scale,
+            crop_size=crop_size)
+
+    if j2d is not None:
+        return norm_img, kp_2d
+    else:
+        return norm_img
+
+
+class CropJobs(Dataset):
+    """Stateless dataset of the data service workers, the indices are the jobs themselves."""
+    def __getitem__(self, job):
+        return load_crop_job(job)
+
+
+class CropJobSampler(Sampler):
+    """Yields the jobs of the current request, lives in the main process only."""
+    def __init__(self):
+        self.jobs = []
+
+    def __iter__(self):
+        return iter(self.jobs)
+
+    def __len__(self):
+        return len(self.jobs)
+
+
+class InferenceDataService():
+    """
+    Long-lived DataLoader worker pool producing crops for successive tracklets.
+    Instead of creating a DataLoader, and forking its workers, for every tracklet,
+    jobs of new `Inference` datasets are handed to the same persistent workers
+    through the sampler and the crops come back through shared memory.
+
+    Persistent workers need torch>=1.7, older versions start the workers once per call.
+    """
+    def __init__(self, batch_size=450, num_workers=16, pin_memory=False):
+        self.sampler = CropJobSampler()
+
+        kwargs = {}
+        if num_workers > 0 and 'persistent_workers' in inspect.signature(DataLoader.__init__).parameters:
+            kwargs['persistent_workers'] = True
+
+        self.dataloader = DataLoader(
+            CropJobs(),
+            batch_size=batch_size,
+            sampler=self.sampler,
+            num_workers=num_workers,
+            pin_memory=pin_memory,
+            **kwargs,
+        )
+
+    def __call__(self, datasets):
+        """
+        Yield batches for a sequence of `Inference` datasets, batches may span several datasets.
+
+        :param datasets (list or Inference): datasets with the same keypoint setting
+        """
+        if isinstance(datasets, Inference):
+            datasets = [datasets]
+
+        self.sampler.jobs = [d.get_job(idx) for d in datasets for idx in range(len(d))]
+        for batch in self.dataloader:
+            yield batch
+        self.sampler.jobs = []
+
+
+class FrameCropper():
+    """
+    Frame-major crop pipeline. Every decoded frame is cropped once for all
+    tracklets visible in it and the crops are appended to per-tracklet queues.
+    A queue is flushed as a chunk of consecutive crops once it holds `chunk_size`
+    crops or its tracklet ends, so memory is bounded by the number of people
+    times `chunk_size` crops and decoding cost scales with the number of frames.
+
+    :param datasets (dict): person_id -> Inference, describing bboxes and frames of each tracklet
+    :param chunk_size (int): max number of crops per flushed chunk
+    """
+    def __init__(self, datasets, chunk_size=32):
+        self.datasets = datasets
+        self.chunk_size = chunk_size
+
+        scales = set(d.scale for d in datasets.values())
+        crop_sizes = set(d.crop_size for d in datasets.values())
+        assert len(scales) <= 1 and len(crop_sizes) <= 1, 'All tracklets need the same scale and crop size'
+        self.scale = scales.pop() if len(scales) > 0 else 1.0
+        self.crop_size = crop_sizes.pop() if len(crop_sizes) > 0 else 224
+
+        # frame id -> list of (person_id, index into the tracklet)
+        self.frame_to_items = defaultdict(list)
+        for person_id, dataset in datasets.items():
+            for idx, frame_id in enumerate(dataset.frames):
+                self.frame_to_items[int(frame_id)].append((person_id, idx))
+
+        self.last_frame = max(self.frame_to_items.keys()) if len(self.frame_to_items) > 0 else -1
+
+    def __call__(self, frames):
+        """
+        :param frames (iterable): BGR frames of the video, e.g. a `FrameBuffer`
+        :return: generator of (person_id, start index, RGB crops NxHxWx3, keypoints or None)
+        """
+        queues = {person_id: [] for person_id in self.datasets.keys()}
+        starts = {person_id: 0 for person_id in self.datasets.keys()}
+
+        for frame_id, img in enumerate(frames):
+            if frame_id > self.last_frame:
+                break
+
+            items = self.frame_to_items.get(frame_id)
+            if not items:
+                continue
+
+            bboxes = np.stack([self.datasets[p].bboxes[idx] for p, idx in items])
+            kp_2d = None
+            if self.datasets[items[0][0]].has_keypoints:
+                kp_2d = np.stack([self.datasets[p].joints2d[idx] for p, idx in items]).astype(np.float64)
+
+            crops, kp_2d = get_image_crops_demo(
+                img, bboxes, kp_2d=kp_2d, scale=self.scale, crop_size=self.crop_size
+            )
+            # convert the crops instead of the full frame
+            crops = crops[..., ::-1]
+
+            for j, (person_id, idx) in enumerate(items):
+                queue = queues[person_id]
+                queue.append((crops[j], kp_2d[j] if kp_2d is not None else None))
+
+                if len(queue) == self.chunk_size or idx == len(self.datasets[person_id]) - 1:
+                    chunk_crops = np.stack([c for c, _ in queue])
+                    chunk_kp_2d = np.stack([k for _, k in queue]) if kp_2d is not None else None
+                    yield person_id, starts[person_id], chunk_crops, chunk_kp_2d
+                    starts[person_id] += len(queue)
+                    queues[person_id] = []
+
+
+class TorchFrameCropper(FrameCropper):
+    """
+    Crops on the device instead of with cv2. Up to `num_frames` decoded frames
+    are uploaded at once and all bboxes in them are cropped, resized and
+    normalized with `get_image_crops_torch`, so the CPU only decodes and the
+    crops never leave device memory.
+
+    :param datasets (dict): person_id -> Inference, describing bboxes and frames of each tracklet
+    :param device (str): device the frames are uploaded to
+    :param num_frames (int): max number of frames uploaded at once
+    """
+    def __init__(self, datasets, device='cuda', num_frames=32):
+        super(TorchFrameCropper, self).__init__(datasets, chunk_size=num_frames)
+        self.device = device
+        self.num_frames = num_frames
+
+    def _crop(self, frames, items):
+        frame_idx = np.array([i for i, frame_items in enumerate(items) for _ in frame_items])
+        items = [item for frame_items in items for item in frame_items]
+
+        bboxes = np.stack([self.datasets[p].bboxes[idx] for p, idx in items])
+        kp_2d = None
+        if self.datasets[items[0][0]].has_keypoints:
+            kp_2d = np.stack([self.datasets[p].joints2d[idx] for p, idx in items]).astype(np.float64)
+            trans = gen_trans_from_patch_batch(bboxes[:, 0], bboxes[:, 1], bboxes[:, 2], bboxes[:, 3],
+                                               self.crop_size, self.crop_size, self.scale, 0)
+            kp_2d[:, :, :2] = transform_keypoints_batch(kp_2d, trans)
+
+        images = torch.from_numpy(np.stack(frames))
+        if str(self.device).startswith('cuda'):
+            images = images.pin_memory()
+        images = images.to(self.device, non_blocking=True)
+
+        crops = get_image_crops_torch(images, frame_idx, bboxes, scale=self.scale, crop_size=self.crop_size)
+        return items, crops, kp_2d
+
+    def __call__(self, frames):
+        """
+        :param frames (iterable): BGR frames of the video, e.g. a `FrameBuffer`
+        :return: generator of ((person_id, index into the tracklet) list, normalized crops Nx3xHxW, keypoints or None)
+        """
+        batch_frames, batch_items = [], []
+        for frame_id, img in enumerate(frames):
+            if frame_id > self.last_frame:
+                break
+
+            items = self.frame_to_items.get(frame_id)
+            if not items:
+                continue
+
+            batch_frames.append(img)
+            batch_items.append(items)
+            if len(batch_frames) == self.num_frames:
+                yield self._crop(batch_frames, batch_items)
+                batch_frames, batch_items = [], []
+
+        if len(batch_frames) > 0:
+            yield self._crop(batch_frames, batch_items)
+
+
+def fill_crops(frames, datasets, chunk_size=32):
+    """
+    Single decoding pass over a video that stores the crops of all `Inference`
+    datasets created without an image folder.
+
+    :param frames (iterable): BGR frames of the video, e.g. a `FrameBuffer`
+    :param datasets (dict): person_id -> Inference
+    """
+    for person_id, start, crops, kp_2d in FrameCropper(datasets, chunk_size=chunk_size)(frames):
+        datasets[person_id].set_crops(start, crops, kp_2d)
+
+
+class FrameStream(IterableDataset):
+    """Wraps a frame source as a dataset of RGB tensors, e.g. for the multi person tracker."""
+    def __init__(self, frames):
+        self.frames = frames
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for img in self.frames:
+            yield to_tensor(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
 
 
 class ImageFolder(Dataset):
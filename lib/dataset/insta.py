@@ -14,6 +14,8 @@
 #
 # Contact: ps-license@tuebingen.mpg.de
 
+
+import os
 import h5py
 import torch
 import logging
@@ -23,54 +25,95 @@ import os.path as osp
 from torch.utils.data import Dataset
 from lib.core.config import VIBE_DB_DIR
 from lib.data_utils.kp_utils import convert_kps
+from lib.data_utils.db_utils import read_hdf5_rows
 from lib.data_utils.img_utils import normalize_2d_kp, split_into_chunks
 
 logger = logging.getLogger(__name__)
 
 class Insta(Dataset):
-    def __init__(self, seqlen, overlap=0., debug=False):
+    """
+    InstaVariety features and 2D keypoints, read from `insta_train_db.h5`.
+
+    The file is opened lazily once per process and kept open, so every
+    DataLoader worker holds its own handle instead of opening the file for
+    every sample. `get_batch` reads a whole batch of windows with one sorted
+    selection per field, see `get_data_loaders` and `cfg.TRAIN.BATCHED_2D_READS`.
+    """
+    def __init__(self, seqlen, overlap=0., debug=False, rdcc_nbytes=64 * 1024 ** 2):
         self.seqlen = seqlen
         self.stride = int(seqlen * (1-overlap))
+        self.rdcc_nbytes = rdcc_nbytes
 
         self.h5_file = osp.join(VIBE_DB_DIR, 'insta_train_db.h5')
 
+        self._db = None
+        self._db_pid = None
+
+        # read with a temporary handle, so no open hdf5 file is inherited by forked workers
         with h5py.File(self.h5_file, 'r') as db:
-            self.db = db
-            self.vid_indices = split_into_chunks(self.db['vid_name'], self.seqlen, self.stride)
+            self.vid_indices = split_into_chunks(db['vid_name'][()], self.seqlen, self.stride)
 
         print(f'InstaVariety number of dataset objects {self.__len__()}')
 
+    @property
+    def db(self):
+        # h5py handles can not be shared across processes, a forked worker opens its own
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = h5py.File(self.h5_file, 'r', rdcc_nbytes=self.rdcc_nbytes)
+            self._db_pid = os.getpid()
+        return self._db
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_db'] = state['_db_pid'] = None
+        return state
+
     def __len__(self):
         return len(self.vid_indices)
 
     def __getitem__(self, index):
+        if isinstance(index, (list, tuple, np.ndarray)):
+            return self.get_batch(index)
         return self.get_single_item(index)
 
+    def get_target(self, kp_2d, input):
+        # windows are always seqlen frames long, kp_2d and input may have a leading batch dimension
+        shape = kp_2d.shape[:-2]
+        kp_2d = convert_kps(kp_2d.reshape(-1, *kp_2d.shape[-2:]), src='insta', dst='spin', dtype=np.float32)
+        kp_2d[:, :, :2] = normalize_2d_kp(kp_2d[:, :, :2], 224)
+        kp_2d_tensor = kp_2d.reshape(shape + kp_2d.shape[1:]).astype(np.float16)
+
+        target = {
+            'features': torch.from_numpy(input).float(),
+            'kp_2d': torch.from_numpy(kp_2d_tensor).float(), # 2D keypoints transformed according to bbox cropping
+        }
+
+        return target
+
     def get_single_item(self, index):
         start_index, end_index = self.vid_indices[index]
 
-        with h5py.File(self.h5_file, 'r') as db:
-            self.db = db
-
-            kp_2d = self.db['joints2D'][start_index:end_index + 1]
-            kp_2d = convert_kps(kp_2d, src='insta', dst='spin')
-            kp_2d_tensor = np.ones((self.seqlen, 49, 3), dtype=np.float16)
+        kp_2d = self.db['joints2D'][start_index:end_index + 1]
+        input = self.db['features'][start_index:end_index + 1]
 
+        return self.get_target(kp_2d, input)
 
-            input = torch.from_numpy(self.db['features'][start_index:end_index+1]).float()
+    def get_batch(self, indices):
+        """
+        Reads the windows of `indices` with one slice per run of consecutive rows, in file order.
 
-            vid_name = self.db['vid_name'][start_index:end_index + 1]
-            frame_id = self.db['frame_id'][start_index:end_index + 1].astype(str)
-            instance_id = np.array([v.decode('ascii') + f for v, f in zip(vid_name, frame_id)])
+        :param indices (list): dataset indices
+        :return: target dict with a leading batch dimension, as collated by a DataLoader
+        """
+        starts = np.array([self.vid_indices[i][0] for i in indices])
+        rows = starts[:, None] + np.arange(self.seqlen)
 
-        for idx in range(self.seqlen):
-            kp_2d[idx,:,:2] = normalize_2d_kp(kp_2d[idx,:,:2], 224)
-            kp_2d_tensor[idx] = kp_2d[idx]
+        # h5py selections need increasing, unique indices
+        sorted_rows, inverse = np.unique(rows, return_inverse=True)
+        inverse = inverse.reshape(rows.shape)
 
-        target = {
-            'features': input,
-            'kp_2d': torch.from_numpy(kp_2d_tensor).float(), # 2D keypoints transformed according to bbox cropping
-            # 'instance_id': instance_id
-        }
+        # contiguous slices per run of rows, scattered back to the windows
+        kp_2d = read_hdf5_rows(self.db['joints2D'], sorted_rows)[inverse]
+        input = read_hdf5_rows(self.db['features'], sorted_rows)[inverse]
 
-        return target
\ No newline at end of file
+        return self.get_target(kp_2d, input)
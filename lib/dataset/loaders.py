@@ -14,7 +14,7 @@
 #
 # Contact: ps-license@tuebingen.mpg.de
 
-from torch.utils.data import ConcatDataset, DataLoader
+from torch.utils.data import ConcatDataset, DataLoader, BatchSampler, RandomSampler
 
 from lib.dataset import *
 
@@ -24,6 +24,8 @@ def get_data_loaders(cfg):
         datasets = []
         for dataset_name in dataset_names:
             db = eval(dataset_name)(seqlen=cfg.DATASET.SEQLEN, debug=cfg.DEBUG)
+            if cfg.TRAIN.PRECOMPUTE_TARGETS and hasattr(db, 'precompute_targets'):
+                db.precompute_targets()
             datasets.append(db)
         return ConcatDataset(datasets)
 
@@ -31,6 +33,8 @@ def get_data_loaders(cfg):
         datasets = []
         for dataset_name in dataset_names:
             db = eval(dataset_name)(set='train', seqlen=cfg.DATASET.SEQLEN, debug=cfg.DEBUG)
+            if cfg.TRAIN.PRECOMPUTE_TARGETS and hasattr(db, 'precompute_targets'):
+                db.precompute_targets()
             datasets.append(db)
         return ConcatDataset(datasets)
 
@@ -41,12 +45,22 @@ def get_data_loaders(cfg):
     data_2d_batch_size = int(cfg.TRAIN.BATCH_SIZE * cfg.TRAIN.DATA_2D_RATIO)
     data_3d_batch_size = cfg.TRAIN.BATCH_SIZE - data_2d_batch_size
 
-    train_2d_loader = DataLoader(
-        dataset=train_2d_db,
-        batch_size=data_2d_batch_size,
-        shuffle=True,
-        num_workers=cfg.NUM_WORKERS,
-    )
+    if cfg.TRAIN.BATCHED_2D_READS and len(train_2d_db.datasets) == 1 and \
+            hasattr(train_2d_db.datasets[0], 'get_batch'):
+        # the sampler yields lists of indices and the dataset reads and collates a whole batch at once
+        train_2d_loader = DataLoader(
+            dataset=train_2d_db.datasets[0],
+            batch_size=None,
+            sampler=BatchSampler(RandomSampler(train_2d_db), data_2d_batch_size, drop_last=False),
+            num_workers=cfg.NUM_WORKERS,
+        )
+    else:
+        train_2d_loader = DataLoader(
+            dataset=train_2d_db,
+            batch_size=data_2d_batch_size,
+            shuffle=True,
+            num_workers=cfg.NUM_WORKERS,
+        )
 
     # ===== 3D keypoint datasets =====
     train_3d_dataset_names = cfg.TRAIN.DATASETS_3D
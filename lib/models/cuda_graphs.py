@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+
+import torch
+
+
+def has_cuda_graphs():
+    # torch.cuda.graph was added in torch 1.10
+    return hasattr(torch.cuda, 'CUDAGraph') and hasattr(torch.cuda, 'graph') and torch.cuda.is_available()
+
+
+def _map_tensors(fn, x):
+    if torch.is_tensor(x):
+        return fn(x)
+    if isinstance(x, dict):
+        return {k: _map_tensors(fn, v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return type(x)(_map_tensors(fn, v) for v in x)
+    return x
+
+
+class CUDAGraphRunner(object):
+    """
+    Runs `VIBE_Demo` or `VIBE` by replaying CUDA graphs captured once per (batch, seqlen) input
+    shape, which removes the python and kernel launch overhead of the backbone, the GRU, the
+    regressor iterations and SMPL. The input is copied into a static buffer before each replay.
+    Shapes that were not requested, e.g. a smaller last batch, run eagerly, as does everything
+    when cuda graphs are not supported by this torch version, the model is in training mode
+    or uses the cpu only int8 backbone.
+
+    :param model (nn.Module): model on a cuda device, `VIBE_Demo` takes NxTx3x224x224 crops
+        and `VIBE` NxTx2048 features
+    :param shapes (list): (batch, seqlen) shapes that are captured at their first call
+    :param num_warmup (int): eager iterations on a side stream before capturing
+    :param clone_outputs (bool): copy the outputs out of the static buffers, otherwise
+        they are overwritten by the next replay of the same shape
+    :param kwargs: fixed keyword arguments of the model, e.g. output='joints'
+    """
+    def __init__(self, model, shapes, num_warmup=3, clone_outputs=True, **kwargs):
+        self.model = model
+        self.shapes = set(tuple(s) for s in shapes)
+        self.num_warmup = num_warmup
+        self.clone_outputs = clone_outputs
+        self.kwargs = kwargs
+        self.enabled = has_cuda_graphs()
+        self.graphs = {}
+        self.pool = None
+
+        if not self.enabled:
+            print(f'cuda graphs are not supported by torch {torch.__version__}, running eagerly')
+
+    def capture(self, input):
+        static_input = input.clone()
+
+        # warm up on a side stream, e.g. cudnn autotuning and lazily cached buffers must not be captured
+        stream = torch.cuda.Stream(device=input.device)
+        stream.wait_stream(torch.cuda.current_stream(input.device))
+        with torch.cuda.stream(stream), torch.no_grad():
+            for _ in range(self.num_warmup):
+                self.model(static_input, **self.kwargs)
+        torch.cuda.current_stream(input.device).wait_stream(stream)
+
+        if self.pool is None:
+            self.pool = torch.cuda.graph_pool_handle()
+
+        # all shapes share one memory pool
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph, pool=self.pool), torch.no_grad():
+            static_output = self.model(static_input, **self.kwargs)
+
+        return graph, static_input, static_output
+
+    def is_graphed(self, input):
+        return (
+            self.enabled and input.is_cuda and not self.model.training
+            and getattr(self.model, 'quantized_backbone', None) is None
+            and tuple(input.shape[:2]) in self.shapes
+        )
+
+    def __call__(self, input):
+        if not self.is_graphed(input):
+            with torch.no_grad():
+                return self.model(input, **self.kwargs)
+
+        key = tuple(input.shape)
+        if key not in self.graphs:
+            self.graphs[key] = self.capture(input)
+
+        graph, static_input, static_output = self.graphs[key]
+        static_input.copy_(input)
+        graph.replay()
+
+        if self.clone_outputs:
+            return _map_tensors(lambda x: x.clone(), static_output)
+        return static_output
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+
+import torch
+from contextlib import contextmanager
+
+PRECISIONS = ('fp32', 'fp16', 'bf16')
+
+
+def get_dtype(precision):
+    return {'fp32': torch.float32, 'fp16': torch.float16, 'bf16': getattr(torch, 'bfloat16', None)}[precision]
+
+
+def has_autocast(device_type, precision):
+    # torch.autocast (>= 1.10) covers fp16 / bf16 on cuda and bf16 on cpu,
+    # torch.cuda.amp.autocast (>= 1.6) only fp16 on cuda
+    if hasattr(torch, 'autocast'):
+        return device_type == 'cuda' or precision == 'bf16'
+    return device_type == 'cuda' and precision == 'fp16' and hasattr(getattr(torch.cuda, 'amp', None), 'autocast')
+
+
+def resolve_precision(device_type, precision, allow_cast=False):
+    """
+    Precision `precision` falls back to on this torch version and device.
+
+    :param allow_cast (bool): without autocast, fp16 on cuda can still run by casting modules to half
+    :return: (precision, whether autocast is used)
+    """
+    assert precision in PRECISIONS, f'precision should be one of {PRECISIONS}'
+    if precision == 'fp32':
+        return precision, False
+    if has_autocast(device_type, precision):
+        return precision, True
+    if allow_cast and device_type == 'cuda' and precision == 'fp16':
+        return precision, False
+    print(f'{precision} is not supported on {device_type} by torch {torch.__version__}, running in fp32')
+    return 'fp32', False
+
+
+@contextmanager
+def autocast(device_type, precision, enabled=True):
+    """Runs the enclosed ops in `precision` with torch's autocast, or as they are if disabled."""
+    if not enabled or precision == 'fp32':
+        yield
+    elif hasattr(torch, 'autocast'):
+        kwargs = {}
+        if device_type == 'cuda' and getattr(torch.cuda, 'is_current_stream_capturing', lambda: False)():
+            # casted weights can not be cached across a cuda graph capture
+            kwargs['cache_enabled'] = False
+        with torch.autocast(device_type=device_type, dtype=get_dtype(precision), **kwargs):
+            yield
+    else:
+        with torch.cuda.amp.autocast():
+            yield
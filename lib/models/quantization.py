@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+
+import torch
+import torch.nn as nn
+from torch.quantization import QuantStub, DeQuantStub, fuse_modules, get_default_qconfig, prepare, convert
+
+from lib.models.spin import Bottleneck, make_resnet_layer
+
+
+class QuantizableBottleneck(Bottleneck):
+    """
+    `Bottleneck` with one ReLU per conv and a quantizable residual add, so that
+    conv-bn-relu triplets can be fused before static quantization.
+    """
+    def __init__(self, inplanes, planes, stride=1, downsample=None):
+        super(QuantizableBottleneck, self).__init__(inplanes, planes, stride, downsample)
+        self.relu1 = nn.ReLU(inplace=True)
+        self.relu2 = nn.ReLU(inplace=True)
+        self.skip_add_relu = nn.quantized.FloatFunctional()
+
+    def forward(self, x):
+        residual = x
+
+        out = self.relu1(self.bn1(self.conv1(x)))
+        out = self.relu2(self.bn2(self.conv2(out)))
+        out = self.bn3(self.conv3(out))
+
+        if self.downsample is not None:
+            residual = self.downsample(x)
+
+        return self.skip_add_relu.add_relu(out, residual)
+
+    def fuse_model(self):
+        fuse_modules(self, [['conv1', 'bn1', 'relu1'], ['conv2', 'bn2', 'relu2'], ['conv3', 'bn3']], inplace=True)
+        if self.downsample is not None:
+            fuse_modules(self.downsample, ['0', '1'], inplace=True)
+
+
+class QuantizableBackbone(nn.Module):
+    """
+    The ResNet-50 of `HMR.feature_extractor` between quant / dequant stubs. It has
+    the same parameter names as `HMR`, so its weights load from an HMR state dict.
+    """
+    def __init__(self, layers=(3, 4, 6, 3)):
+        super(QuantizableBackbone, self).__init__()
+        self.inplanes = 64
+        self.quant = QuantStub()
+        self.conv1 = nn.Conv2d(3, 64, kernel_size=7, stride=2, padding=3, bias=False)
+        self.bn1 = nn.BatchNorm2d(64)
+        self.relu = nn.ReLU(inplace=True)
+        self.maxpool = nn.MaxPool2d(kernel_size=3, stride=2, padding=1)
+        self.layer1 = make_resnet_layer(self, QuantizableBottleneck, 64, layers[0])
+        self.layer2 = make_resnet_layer(self, QuantizableBottleneck, 128, layers[1], stride=2)
+        self.layer3 = make_resnet_layer(self, QuantizableBottleneck, 256, layers[2], stride=2)
+        self.layer4 = make_resnet_layer(self, QuantizableBottleneck, 512, layers[3], stride=2)
+        self.avgpool = nn.AvgPool2d(7, stride=1)
+        self.dequant = DeQuantStub()
+
+    def forward(self, x):
+        x = self.quant(x)
+        x = self.maxpool(self.relu(self.bn1(self.conv1(x))))
+
+        x = self.layer1(x)
+        x = self.layer2(x)
+        x = self.layer3(x)
+        x = self.layer4(x)
+
+        x = self.dequant(self.avgpool(x))
+        return x.view(x.size(0), -1)
+
+    def fuse_model(self):
+        fuse_modules(self, ['conv1', 'bn1', 'relu'], inplace=True)
+        for m in self.modules():
+            if isinstance(m, QuantizableBottleneck):
+                m.fuse_model()
+
+
+def prepare_backbone(model, backend='fbgemm'):
+    # fuse and insert observers, the model has to be in eval mode to fold the batch norms
+    torch.backends.quantized.engine = backend
+    model.eval()
+    model.fuse_model()
+    model.qconfig = get_default_qconfig(backend)
+    return prepare(model, inplace=True)
+
+
+def quantize_backbone(hmr_model, calibration_batches, backend='fbgemm'):
+    """
+    Static int8 quantization of the backbone of `hmr_model`. Activation ranges are
+    calibrated on normalized crops, e.g. crops of `Inference` datasets of the
+    videos the model will run on.
+
+    :param hmr_model (HMR): model with trained weights
+    :param calibration_batches (iterable): Nx3x224x224 normalized crops
+    :param backend (str): 'fbgemm' for x86 or 'qnnpack' for arm
+    :return: quantized QuantizableBackbone, runs on cpu only
+    """
+    model = QuantizableBackbone()
+    keys = model.state_dict().keys()
+    model.load_state_dict({k: v for k, v in hmr_model.state_dict().items() if k in keys})
+    model = prepare_backbone(model, backend)
+
+    with torch.no_grad():
+        for batch in calibration_batches:
+            model(batch.float().cpu())
+
+    return convert(model, inplace=True)
+
+
+def load_quantized_backbone(path, backend='fbgemm'):
+    """Loads the state dict of a backbone quantized with `quantize_backbone`."""
+    model = convert(prepare_backbone(QuantizableBackbone(), backend), inplace=True)
+    model.load_state_dict(torch.load(path, map_location='cpu'))
+    return model.eval()
@@ -2,11 +2,12 @@
 # Adhere to their licence to use this script
 
 import torch
+import pickle
 import numpy as np
 import os.path as osp
 from smplx import SMPL as _SMPL
-from smplx.utils import ModelOutput, SMPLOutput
-from smplx.lbs import vertices2joints
+from smplx.utils import ModelOutput, SMPLOutput, Struct
+from smplx.lbs import vertices2joints, blend_shapes, batch_rodrigues, batch_rigid_transform
 
 from lib.core.config import VIBE_DATA_DIR
 
@@ -58,22 +59,66 @@ H36M_TO_J17 = [6, 5, 4, 1, 2, 3, 16, 15, 14, 11, 12, 13, 8, 10, 0, 7, 9]
 H36M_TO_J14 = H36M_TO_J17[:14]
 
 
+# parsed model files and shared SMPL models, loaded once per process
+_smpl_data = {}
+_smpl_models = {}
+
+
+def load_smpl_data(model_path=SMPL_MODEL_DIR, gender='neutral'):
+    """
+    Parsed SMPL model file and extra joint regressor, cached so that every SMPL
+    constructed afterwards skips reading the pickle.
+    """
+    if osp.isdir(model_path):
+        model_path = osp.join(model_path, f'SMPL_{gender.upper()}.pkl')
+    model_path = osp.abspath(model_path)
+
+    if model_path not in _smpl_data:
+        with open(model_path, 'rb') as smpl_file:
+            data_struct = Struct(**pickle.load(smpl_file, encoding='latin1'))
+        _smpl_data[model_path] = (data_struct, np.load(JOINT_REGRESSOR_TRAIN_EXTRA))
+    return _smpl_data[model_path]
+
+
+def get_smpl(model_path=SMPL_MODEL_DIR, gender='neutral', device='cpu', dtype=torch.float32):
+    """
+    Shared SMPL model for the given model file, gender, device and dtype. It is batch
+    size agnostic as long as betas, body_pose and global_orient are always passed to
+    forward. Do not move it to another device, ask for a model on that device instead.
+    """
+    key = (osp.abspath(model_path), gender, str(torch.device(device)), dtype)
+    if key not in _smpl_models:
+        _smpl_models[key] = SMPL(model_path, gender=gender, dtype=dtype, create_transl=False).to(device).eval()
+    return _smpl_models[key]
+
+
 class SMPL(_SMPL):
     """ Extension of the official SMPL implementation to support more joints """
 
     def __init__(self, *args, **kwargs):
+        model_path = kwargs.get('model_path', args[0] if len(args) > 0 else SMPL_MODEL_DIR)
+        data_struct, J_regressor_extra = load_smpl_data(model_path, kwargs.get('gender', 'neutral'))
+        if kwargs.get('data_struct') is None:
+            kwargs['data_struct'] = data_struct
+
         super(SMPL, self).__init__(*args, **kwargs)
         joints = [JOINT_MAP[i] for i in JOINT_NAMES]
-        J_regressor_extra = np.load(JOINT_REGRESSOR_TRAIN_EXTRA)
         self.register_buffer('J_regressor_extra', torch.tensor(J_regressor_extra, dtype=torch.float32))
         self.joint_map = torch.tensor(joints, dtype=torch.long)
+        self._joint_support = {}
+
+    def get_joint_map(self, device):
+        # kept on the device of the joints, indexing with a cpu tensor copies it on every call
+        if self.joint_map.device != device:
+            self.joint_map = self.joint_map.to(device)
+        return self.joint_map
 
     def forward(self, *args, **kwargs):
         kwargs['get_skin'] = True
         smpl_output = super(SMPL, self).forward(*args, **kwargs)
         extra_joints = vertices2joints(self.J_regressor_extra, smpl_output.vertices)
         joints = torch.cat([smpl_output.joints, extra_joints], dim=1)
-        joints = joints[:, self.joint_map, :]
+        joints = joints[:, self.get_joint_map(joints.device), :]
         output = SMPLOutput(vertices=smpl_output.vertices,
                             global_orient=smpl_output.global_orient,
                             body_pose=smpl_output.body_pose,
@@ -82,7 +127,144 @@ class SMPL(_SMPL):
                             full_pose=smpl_output.full_pose)
         return output
 
+    def get_joint_support(self, J_regressor=None):
+        """
+        Everything the joints depend on, restricted to the vertices with non zero weights
+        in the joint regressors, plus the skeleton joint regressor pre-multiplied with the
+        template and the shape blend shapes. Cached per regressor and device.
+
+        :param J_regressor (torch.Tensor): optional regressor, e.g. J_regressor_h36m, used
+            instead of the default joints
+        """
+        device = self.v_template.device
+        key = (id(J_regressor), str(device))
+        if key in self._joint_support:
+            return self._joint_support[key][1]
+
+        if J_regressor is None:
+            regressor = self.J_regressor_extra
+            selected = self.vertex_joint_selector.extra_joints_idxs
+        else:
+            regressor = J_regressor.to(device=device, dtype=self.v_template.dtype)
+            selected = torch.zeros(0, dtype=torch.long, device=device)
+
+        num_verts = self.v_template.shape[0]
+        vertex_ids = torch.cat([selected, torch.nonzero(regressor.abs().sum(0) > 0).view(-1)]).unique()
+        position = torch.full((num_verts,), -1, dtype=torch.long, device=device)
+        position[vertex_ids] = torch.arange(vertex_ids.shape[0], device=device)
+
+        support = {
+            'vertex_ids': vertex_ids,
+            'selected': position[selected],
+            'regressor': regressor[:, vertex_ids],
+            'v_template': self.v_template[vertex_ids],
+            'shapedirs': self.shapedirs[vertex_ids],
+            'posedirs': self.posedirs.view(-1, num_verts, 3)[:, vertex_ids].reshape(self.posedirs.shape[0], -1),
+            'lbs_weights': self.lbs_weights[vertex_ids],
+            'J_template': vertices2joints(self.J_regressor, self.v_template[None])[0],
+            'J_shapedirs': torch.einsum('jv,vcl->jcl', self.J_regressor, self.shapedirs),
+        }
+
+        if len(self._joint_support) > 8:
+            self._joint_support.clear()
+        # keep a reference to the regressor, so its id is not reused while cached
+        self._joint_support[key] = (J_regressor, support)
+        return support
+
+    def get_mesh_support(self, J_regressor=None):
+        """
+        Same as `get_joint_support`, for skinning all vertices. The buffers are read on every
+        call, so that traced graphs refer to them instead of keeping copies as constants.
+        """
+        regressor = self.J_regressor_extra if J_regressor is None else \
+            J_regressor.to(device=self.v_template.device, dtype=self.v_template.dtype)
+        return {
+            'vertex_ids': None,
+            'selected': self.vertex_joint_selector.extra_joints_idxs,
+            'regressor': regressor,
+            'v_template': self.v_template,
+            'shapedirs': self.shapedirs,
+            'posedirs': self.posedirs,
+            'lbs_weights': self.lbs_weights,
+            'J_template': vertices2joints(self.J_regressor, self.v_template[None])[0],
+            'J_shapedirs': torch.einsum('jv,vcl->jcl', self.J_regressor, self.shapedirs),
+        }
+
+    def forward_rotmat(self, betas, rot_mats, J_regressor=None, return_verts=True):
+        """
+        Joints, and vertices if `return_verts`, of rotation matrix poses. Unlike the forward of
+        smplx no batch size is computed in python, every shape follows from tensor ops, so traced
+        and exported graphs accept any batch size. Without vertices only the vertices the joint
+        regressors depend on are skinned. If `J_regressor` is given the joints regressed with it
+        are returned instead.
+
+        :param betas (torch.Tensor): Bx10 shape parameters
+        :param rot_mats (torch.Tensor): Bx24x3x3 global orientation and body pose
+        """
+        support = self.get_mesh_support(J_regressor) if return_verts else self.get_joint_support(J_regressor)
+
+        ident = torch.eye(3, dtype=rot_mats.dtype, device=rot_mats.device)
+        pose_feature = (rot_mats[:, 1:] - ident).flatten(1)
+
+        J = support['J_template'] + torch.einsum('bl,jcl->bjc', betas, support['J_shapedirs'])
+        J_transformed, A = batch_rigid_transform(rot_mats, J, self.parents, dtype=self.dtype)
+
+        v_shaped = support['v_template'] + blend_shapes(betas, support['shapedirs'])
+        v_posed = v_shaped + torch.matmul(pose_feature, support['posedirs']).view_as(v_shaped)
+        T = torch.matmul(support['lbs_weights'], A.flatten(2))
+        T = T.view(-1, T.shape[1], 4, 4)
+        vertices = torch.matmul(T[..., :3, :3], v_posed.unsqueeze(-1)).squeeze(-1) + T[..., :3, 3]
+
+        if J_regressor is not None:
+            joints = vertices2joints(support['regressor'], vertices)
+        else:
+            extra_joints = vertices2joints(support['regressor'], vertices)
+            joints = torch.cat([J_transformed, vertices[:, support['selected']], extra_joints], dim=1)
+            joints = joints[:, self.get_joint_map(joints.device), :]
+
+        output = SMPLOutput(vertices=vertices if return_verts else None,
+                            global_orient=rot_mats[:, :1],
+                            body_pose=rot_mats[:, 1:],
+                            joints=joints,
+                            betas=betas,
+                            full_pose=rot_mats)
+        return output
+
+    def forward_joints(self, betas=None, body_pose=None, global_orient=None, transl=None, pose2rot=True,
+                       J_regressor=None):
+        """
+        Same joints as `forward` without skinning the full mesh, only the vertices the joint
+        regressors depend on are skinned. If `J_regressor` is given the joints regressed with
+        it are returned instead. The returned output has no vertices.
+        """
+        global_orient = global_orient if global_orient is not None else self.global_orient
+        body_pose = body_pose if body_pose is not None else self.body_pose
+        betas = betas if betas is not None else self.betas
+        if transl is None and hasattr(self, 'transl'):
+            transl = self.transl
+
+        batch_size = max(betas.shape[0], global_orient.shape[0], body_pose.shape[0])
+        if betas.shape[0] != batch_size:
+            betas = betas.expand(batch_size, -1)
+        full_pose = torch.cat([global_orient.reshape(batch_size, -1), body_pose.reshape(batch_size, -1)], dim=1)
+
+        if pose2rot:
+            rot_mats = batch_rodrigues(full_pose.view(-1, 3), dtype=self.dtype).view(batch_size, -1, 3, 3)
+        else:
+            rot_mats = full_pose.view(batch_size, -1, 3, 3)
+
+        joints = self.forward_rotmat(betas, rot_mats, J_regressor=J_regressor, return_verts=False).joints
+        if transl is not None:
+            joints = joints + transl.unsqueeze(dim=1)
+
+        output = SMPLOutput(vertices=None,
+                            global_orient=global_orient,
+                            body_pose=body_pose,
+                            joints=joints,
+                            betas=betas,
+                            full_pose=full_pose)
+        return output
+
 
 def get_smpl_faces():
-    smpl = SMPL(SMPL_MODEL_DIR, batch_size=1, create_transl=False)
-    return smpl.faces
\ No newline at end of file
+    return get_smpl().faces
\ No newline at end of file
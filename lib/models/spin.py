@@ -9,9 +9,12 @@ import torch.nn as nn
 import torchvision.models.resnet as resnet
 
 from lib.core.config import VIBE_DATA_DIR
-from lib.utils.geometry import rotation_matrix_to_angle_axis, rot6d_to_rotmat
+from lib.utils.geometry import rotation_matrix_to_angle_axis, rot6d_to_rotmat, batch_rodrigues
 from lib.models.smpl import SMPL, SMPL_MODEL_DIR, H36M_TO_J14, SMPL_MEAN_PARAMS
 
+# outputs of Regressor, each one includes the previous ones
+SMPL_OUTPUTS = ('theta', 'joints', 'mesh')
+
 
 class Bottleneck(nn.Module):
     """
@@ -56,11 +59,34 @@ class Bottleneck(nn.Module):
         return out
 
 
+def make_resnet_layer(model, block, planes, blocks, stride=1):
+    """
+    ResNet stage of `blocks` blocks, shared by HMR and its quantizable backbone.
+    Updates `model.inplanes` to the number of output channels of the stage.
+    """
+    downsample = None
+    if stride != 1 or model.inplanes != planes * block.expansion:
+        downsample = nn.Sequential(
+            nn.Conv2d(model.inplanes, planes * block.expansion,
+                      kernel_size=1, stride=stride, bias=False),
+            nn.BatchNorm2d(planes * block.expansion),
+        )
+
+    layers = []
+    layers.append(block(model.inplanes, planes, stride, downsample))
+    model.inplanes = planes * block.expansion
+    for i in range(1, blocks):
+        layers.append(block(model.inplanes, planes))
+
+    return nn.Sequential(*layers)
+
+
 class HMR(nn.Module):
     """
     SMPL Iterative Regressor with ResNet50 backbone
     """
-    def __init__(self, block, layers, smpl_mean_params):
+    def __init__(self, block, layers, smpl_mean_params, use_smpl=True):
+        # use_smpl: False skips building SMPL when only the backbone is used, forward then fails
         self.inplanes = 64
         super(HMR, self).__init__()
         npose = 24 * 6
@@ -89,7 +115,7 @@ class HMR(nn.Module):
             SMPL_MODEL_DIR,
             batch_size=64,
             create_transl=False
-        ).to('cpu')
+        ).to('cpu') if use_smpl else None
 
         for m in self.modules():
             if isinstance(m, nn.Conv2d):
@@ -108,21 +134,7 @@ class HMR(nn.Module):
         self.register_buffer('init_cam', init_cam)
 
     def _make_layer(self, block, planes, blocks, stride=1):
-        downsample = None
-        if stride != 1 or self.inplanes != planes * block.expansion:
-            downsample = nn.Sequential(
-                nn.Conv2d(self.inplanes, planes * block.expansion,
-                          kernel_size=1, stride=stride, bias=False),
-                nn.BatchNorm2d(planes * block.expansion),
-            )
-
-        layers = []
-        layers.append(block(self.inplanes, planes, stride, downsample))
-        self.inplanes = planes * block.expansion
-        for i in range(1, blocks):
-            layers.append(block(self.inplanes, planes))
-
-        return nn.Sequential(*layers)
+        return make_resnet_layer(self, block, planes, blocks, stride)
 
     def feature_extractor(self, x):
 
@@ -239,7 +251,14 @@ class Regressor(nn.Module):
 
 
 
-    def forward(self, x, init_pose=None, init_shape=None, init_cam=None, n_iter=3, J_regressor=None):
+    def forward(self, x, init_pose=None, init_shape=None, init_cam=None, n_iter=3, J_regressor=None, output='mesh'):
+        """
+        :param output (str): 'theta' returns only theta and rotmat, 'joints' adds kp_2d and kp_3d,
+            skinning only the vertices the joint regressors need, and 'mesh' additionally
+            returns the SMPL vertices. SMPL is not run at all for 'theta',
+            the mesh can be computed later in batches with `Regressor.skin`.
+        """
+        assert output in SMPL_OUTPUTS, f'output should be one of {SMPL_OUTPUTS}'
         batch_size = x.shape[0]
 
         if init_pose is None:
@@ -262,35 +281,51 @@ class Regressor(nn.Module):
             pred_shape = self.decshape(xc) + pred_shape
             pred_cam = self.deccam(xc) + pred_cam
 
-        pred_rotmat = rot6d_to_rotmat(pred_pose).view(batch_size, 24, 3, 3)
+        pred_rotmat = rot6d_to_rotmat(pred_pose).view(-1, 24, 3, 3)
 
-        pred_output = self.smpl(
-            betas=pred_shape,
-            body_pose=pred_rotmat[:, 1:],
-            global_orient=pred_rotmat[:, 0].unsqueeze(1),
-            pose2rot=False
-        )
+        pose = rotation_matrix_to_angle_axis(pred_rotmat.reshape(-1, 3, 3)).reshape(-1, 72)
 
-        pred_vertices = pred_output.vertices
-        pred_joints = pred_output.joints
+        output_dict = {
+            'theta'  : torch.cat([pred_cam, pose, pred_shape], dim=1),
+            'rotmat' : pred_rotmat
+        }
+        if output != 'theta':
+            output_dict.update(self.get_smpl_output(pred_rotmat, pred_shape, pred_cam, J_regressor, output))
 
-        if J_regressor is not None:
-            J_regressor_batch = J_regressor[None, :].expand(pred_vertices.shape[0], -1, -1).to(pred_vertices.device)
-            pred_joints = torch.matmul(J_regressor_batch, pred_vertices)
-            pred_joints = pred_joints[:, H36M_TO_J14, :]
+        return [output_dict]
 
-        pred_keypoints_2d = projection(pred_joints, pred_cam)
+    def get_smpl_output(self, pred_rotmat, pred_shape, pred_cam, J_regressor=None, output='mesh'):
+        # forward_rotmat has no python batch size, so traced models accept any number of frames.
+        # For output='joints' it only skins the vertices the joint regressors need.
+        smpl_output = self.smpl.forward_rotmat(
+            pred_shape, pred_rotmat, J_regressor=J_regressor, return_verts=output == 'mesh'
+        )
 
-        pose = rotation_matrix_to_angle_axis(pred_rotmat.reshape(-1, 3, 3)).reshape(-1, 72)
+        pred_joints = smpl_output.joints
+        if J_regressor is not None:
+            pred_joints = pred_joints[:, H36M_TO_J14, :]
 
-        output = [{
-            'theta'  : torch.cat([pred_cam, pose, pred_shape], dim=1),
-            'verts'  : pred_vertices,
-            'kp_2d'  : pred_keypoints_2d,
+        output_dict = {
+            'kp_2d'  : projection(pred_joints, pred_cam),
             'kp_3d'  : pred_joints,
-            'rotmat' : pred_rotmat
-        }]
-        return output
+        }
+        if output == 'mesh':
+            output_dict['verts'] = smpl_output.vertices
+        return output_dict
+
+    def skin(self, theta, J_regressor=None, output='mesh', batch_size=1024):
+        """
+        Runs SMPL on thetas predicted earlier, e.g. with output='theta'.
+
+        :param theta (torch.Tensor): Nx85 cam, pose and shape parameters
+        :return: dict with kp_2d, kp_3d and, for output='mesh', verts of all N thetas
+        """
+        smpl_output = []
+        for i in range(0, theta.shape[0], batch_size):
+            t = theta[i:i + batch_size]
+            pred_rotmat = batch_rodrigues(t[:, 3:75].reshape(-1, 3)).reshape(-1, 24, 3, 3)
+            smpl_output.append(self.get_smpl_output(pred_rotmat, t[:, 75:], t[:, :3], J_regressor, output))
+        return {k: torch.cat([s[k] for s in smpl_output], dim=0) for k in smpl_output[0].keys()}
 
 
 def hmr(smpl_mean_params=SMPL_MEAN_PARAMS, pretrained=True, **kwargs):
@@ -311,9 +346,9 @@ def projection(pred_joints, pred_camera):
                               pred_camera[:, 2],
                               2 * 5000. / (224. * pred_camera[:, 0] + 1e-9)], dim=-1)
     batch_size = pred_joints.shape[0]
-    camera_center = torch.zeros(batch_size, 2)
+    camera_center = torch.zeros(batch_size, 2, device=pred_joints.device)
     pred_keypoints_2d = perspective_projection(pred_joints,
-                                               rotation=torch.eye(3).unsqueeze(0).expand(batch_size, -1, -1).to(pred_joints.device),
+                                               rotation=torch.eye(3, device=pred_joints.device).unsqueeze(0).expand(batch_size, -1, -1),
                                                translation=pred_cam_t,
                                                focal_length=5000.,
                                                camera_center=camera_center)
@@ -22,6 +22,8 @@ import torch.nn.functional as F
 
 from lib.core.config import VIBE_DATA_DIR
 from lib.models.spin import Regressor, hmr
+from lib.models.precision import resolve_precision, autocast
+from lib.models.quantization import load_quantized_backbone
 
 
 class TemporalEncoder(nn.Module):
@@ -49,10 +51,18 @@ class TemporalEncoder(nn.Module):
             self.linear = nn.Linear(hidden_size, 2048)
         self.use_residual = use_residual
 
-    def forward(self, x):
+    def forward(self, x, lengths=None, hidden=None, return_hidden=False):
+        # lengths: valid length of each sequence of a zero padded batch
+        # hidden: initial GRU hidden state, e.g. carried over from the previous window
         n,t,f = x.shape
         x = x.permute(1,0,2) # NTF -> TNF
-        y, _ = self.gru(x)
+        if lengths is not None:
+            lengths = torch.as_tensor(lengths, dtype=torch.int64).cpu()
+            y = nn.utils.rnn.pack_padded_sequence(x, lengths, enforce_sorted=False)
+            y, hidden = self.gru(y, hidden)
+            y, _ = nn.utils.rnn.pad_packed_sequence(y, total_length=t)
+        else:
+            y, hidden = self.gru(x, hidden)
         if self.linear:
             y = F.relu(y)
             y = self.linear(y.view(-1, y.size(-1)))
@@ -60,8 +70,61 @@ class TemporalEncoder(nn.Module):
         if self.use_residual and y.shape[-1] == 2048:
             y = y + x
         y = y.permute(1,0,2) # TNF -> NTF
+        if return_hidden:
+            return y, hidden
         return y
 
+    def forward_windowed(self, x, window=16, overlap=8, carry_hidden=False, batch_windows=32):
+        """
+        Run the encoder over arbitrarily long NTF inputs in windows of `window` frames,
+        so activation memory is bounded by the window size instead of the sequence length.
+
+        If `carry_hidden` is True, consecutive windows do not overlap and the GRU hidden
+        state is carried from one window to the next, which gives the same output as
+        running the whole sequence at once. Otherwise windows overlap by `overlap` frames
+        and start from a zero state as in training; up to `batch_windows` windows run in
+        one batch and the overlapping outputs are cross-faded with linear weights.
+        """
+        n, t, f = x.shape
+
+        if carry_hidden:
+            y, hidden = [], None
+            for start in range(0, t, window):
+                y_w, hidden = self.forward(x[:, start:start + window], hidden=hidden, return_hidden=True)
+                y.append(y_w)
+            return torch.cat(y, dim=1)
+
+        if t <= window:
+            return self.forward(x)
+
+        overlap = min(overlap, window - 1)
+        stride = window - overlap
+
+        starts = list(range(0, t - window + 1, stride))
+        if starts[-1] + window < t:
+            starts.append(t - window)
+
+        blend = x.new_ones(window)
+        if overlap > 0 and len(starts) > 1:
+            ramp = torch.linspace(0, 1, overlap + 2, device=x.device, dtype=x.dtype)[1:-1]
+            blend[:overlap] = ramp
+            blend[-overlap:] = ramp.flip(0)
+
+        y, weights = None, x.new_zeros(t)
+        for i in range(0, len(starts), batch_windows):
+            group = starts[i:i + batch_windows]
+            y_w = self.forward(torch.cat([x[:, s:s + window] for s in group], dim=0))
+            y_w = y_w.reshape(len(group), n, window, -1)
+
+            if y is None:
+                y = x.new_zeros(n, t, y_w.shape[-1])
+
+            for j, start in enumerate(group):
+                y[:, start:start + window] += y_w[j] * blend[None, :, None]
+                weights[start:start + window] += blend
+
+        return y / weights[None, :, None]
+
 
 class VIBE(nn.Module):
     def __init__(
@@ -92,6 +155,10 @@ class VIBE(nn.Module):
         # regressor can predict cam, pose and shape params in an iterative way
         self.regressor = Regressor()
 
+        self.precision_device = 'cpu'
+        self.precision = 'fp32'
+        self.use_autocast = False
+
         if pretrained and os.path.isfile(pretrained):
             pretrained_dict = torch.load(pretrained)['model']
 
@@ -99,20 +166,44 @@ class VIBE(nn.Module):
             print(f'=> loaded pretrained model from \'{pretrained}\'')
 
 
-    def forward(self, input, J_regressor=None):
+    def set_precision(self, precision='fp32'):
+        """
+        Runs the temporal encoder in `precision` with autocast, the regressor, the
+        rotation conversions and SMPL always run in fp32. Call it after moving the
+        model to its device, unsupported precisions fall back to fp32.
+
+        :param precision (str): 'fp32', 'fp16' or 'bf16'
+        """
+        self.precision_device = next(self.parameters()).device.type
+        self.precision, self.use_autocast = resolve_precision(self.precision_device, precision)
+        return self
+
+    def precision_context(self):
+        return autocast(self.precision_device, self.precision, enabled=self.use_autocast)
+
+    def encode(self, feature, window=None, overlap=8, carry_hidden=False):
+        # window: run the temporal encoder in sliding windows, see TemporalEncoder.forward_windowed
+        with self.precision_context():
+            if window is None:
+                feature = self.encoder(feature)
+            else:
+                feature = self.encoder.forward_windowed(feature, window=window, overlap=overlap,
+                                                        carry_hidden=carry_hidden)
+        return feature.float()
+
+    def forward(self, input, J_regressor=None, window=None, overlap=8, carry_hidden=False, output='mesh'):
+        # output: 'theta', 'joints' or 'mesh', see Regressor.forward
         # input size NTF
         batch_size, seqlen = input.shape[:2]
 
-        feature = self.encoder(input)
+        feature = self.encode(input, window=window, overlap=overlap, carry_hidden=carry_hidden)
         feature = feature.reshape(-1, feature.size(-1))
 
-        smpl_output = self.regressor(feature, J_regressor=J_regressor)
+        smpl_output = self.regressor(feature, J_regressor=J_regressor, output=output)
+
         for s in smpl_output:
-            s['theta'] = s['theta'].reshape(batch_size, seqlen, -1)
-            s['verts'] = s['verts'].reshape(batch_size, seqlen, -1, 3)
-            s['kp_2d'] = s['kp_2d'].reshape(batch_size, seqlen, -1, 2)
-            s['kp_3d'] = s['kp_3d'].reshape(batch_size, seqlen, -1, 3)
-            s['rotmat'] = s['rotmat'].reshape(batch_size, seqlen, -1, 3, 3)
+            for k, v in s.items():
+                s[k] = v.reshape(batch_size, seqlen, *v.shape[1:])
 
         return smpl_output
 
@@ -128,7 +219,9 @@ class VIBE_Demo(nn.Module):
             bidirectional=False,
             use_residual=True,
             pretrained=osp.join(VIBE_DATA_DIR, 'spin_model_checkpoint.pth.tar'),
+            quantized_backbone=None,
     ):
+        # quantized_backbone: int8 backbone saved by quantize.py, replaces the fp32 ResNet on cpu
 
         super(VIBE_Demo, self).__init__()
 
@@ -143,37 +236,99 @@ class VIBE_Demo(nn.Module):
             use_residual=use_residual,
         )
 
-        self.hmr = hmr()
-        checkpoint = torch.load(pretrained)
-        self.hmr.load_state_dict(checkpoint['model'], strict=False)
+        # the spin checkpoint is loaded once for the backbone and the regressor, it replaces
+        # the imagenet weights, and the smpl of hmr is never used as only its backbone runs
+        checkpoint = torch.load(pretrained, map_location='cpu') if pretrained and os.path.isfile(pretrained) else None
+        self.hmr = hmr(pretrained=checkpoint is None, use_smpl=False)
+        if checkpoint is not None:
+            self.hmr.load_state_dict(checkpoint['model'], strict=False)
 
         # regressor can predict cam, pose and shape params in an iterative way
         self.regressor = Regressor()
 
-        if pretrained and os.path.isfile(pretrained):
-            pretrained_dict = torch.load(pretrained)['model']
-
-            self.regressor.load_state_dict(pretrained_dict, strict=False)
-            print(f'=> loaded pretrained model from \'{pretrained}\'')
+        self.precision_device = 'cpu'
+        self.precision = 'fp32'
+        self.use_autocast = False
+        self.channels_last = False
 
+        # kept out of the submodules, so that .to(device) and state_dict() leave the cpu only int8 model alone
+        object.__setattr__(
+            self, 'quantized_backbone',
+            load_quantized_backbone(quantized_backbone) if quantized_backbone is not None else None
+        )
 
-    def forward(self, input, J_regressor=None):
-        # input size NTF
-        batch_size, seqlen, nc, h, w = input.shape
+        if checkpoint is not None:
+            self.regressor.load_state_dict(checkpoint['model'], strict=False)
+            print(f'=> loaded pretrained model from \'{pretrained}\'')
 
-        feature = self.hmr.feature_extractor(input.reshape(-1, nc, h, w))
 
-        feature = feature.reshape(batch_size, seqlen, -1)
-        feature = self.encoder(feature)
+    def set_precision(self, precision='fp32', channels_last=False):
+        """
+        Runs the backbone and the temporal encoder in `precision` with autocast, the
+        regressor, the rotation conversions and SMPL always run in fp32. Without
+        autocast, fp16 on cuda casts the backbone to half instead. Call it after
+        moving the model to its device, unsupported precisions fall back to fp32.
+
+        :param precision (str): 'fp32', 'fp16' or 'bf16'
+        :param channels_last (bool): channels last memory format for the backbone
+        """
+        self.precision_device = next(self.parameters()).device.type
+        self.precision, self.use_autocast = resolve_precision(self.precision_device, precision, allow_cast=True)
+
+        if self.precision != 'fp32' and not self.use_autocast:
+            self.hmr.half()
+        else:
+            self.hmr.float()
+
+        self.channels_last = channels_last and hasattr(torch, 'channels_last')
+        if channels_last and not self.channels_last:
+            print(f'channels last is not supported by torch {torch.__version__}')
+        memory_format = torch.channels_last if self.channels_last else getattr(torch, 'contiguous_format', None)
+        if memory_format is not None:
+            self.hmr.to(memory_format=memory_format)
+        return self
+
+    def precision_context(self):
+        return autocast(self.precision_device, self.precision, enabled=self.use_autocast)
+
+    def extract_features(self, images):
+        # images: normalized crops Nx3xHxW, returns fp32 features
+        if self.quantized_backbone is not None:
+            return self.quantized_backbone(images.float().cpu()).to(images.device)
+
+        if self.channels_last:
+            images = images.contiguous(memory_format=torch.channels_last)
+        if self.precision != 'fp32' and not self.use_autocast:
+            images = images.half()
+
+        with self.precision_context():
+            feature = self.hmr.feature_extractor(images)
+        return feature.float()
+
+    def encode(self, feature, window=None, overlap=8, carry_hidden=False):
+        # window: run the temporal encoder in sliding windows, see TemporalEncoder.forward_windowed
+        with self.precision_context():
+            if window is None:
+                feature = self.encoder(feature)
+            else:
+                feature = self.encoder.forward_windowed(feature, window=window, overlap=overlap,
+                                                        carry_hidden=carry_hidden)
+        return feature.float()
+
+    def forward(self, input, J_regressor=None, window=None, overlap=8, carry_hidden=False, output='mesh'):
+        # output: 'theta', 'joints' or 'mesh', see Regressor.forward
+        # input size NTF. Shapes are taken from tensors or inferred with -1, so that traced
+        # models keep the batch and sequence dimensions dynamic
+        feature = self.extract_features(input.flatten(0, 1))
+
+        feature = feature.reshape(input.shape[0], -1, feature.size(-1))
+        feature = self.encode(feature, window=window, overlap=overlap, carry_hidden=carry_hidden)
         feature = feature.reshape(-1, feature.size(-1))
 
-        smpl_output = self.regressor(feature, J_regressor=J_regressor)
+        smpl_output = self.regressor(feature, J_regressor=J_regressor, output=output)
 
         for s in smpl_output:
-            s['theta'] = s['theta'].reshape(batch_size, seqlen, -1)
-            s['verts'] = s['verts'].reshape(batch_size, seqlen, -1, 3)
-            s['kp_2d'] = s['kp_2d'].reshape(batch_size, seqlen, -1, 2)
-            s['kp_3d'] = s['kp_3d'].reshape(batch_size, seqlen, -1, 3)
-            s['rotmat'] = s['rotmat'].reshape(batch_size, seqlen, -1, 3, 3)
+            for k, v in s.items():
+                s[k] = v.reshape(input.shape[0], -1, *v.shape[1:])
 
         return smpl_output
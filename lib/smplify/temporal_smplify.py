@@ -5,7 +5,7 @@ import os
 import torch
 
 from lib.core.config import VIBE_DATA_DIR
-from lib.models.smpl import SMPL, JOINT_IDS, SMPL_MODEL_DIR
+from lib.models.smpl import JOINT_IDS, get_smpl
 from lib.smplify.losses import temporal_camera_fitting_loss, temporal_body_fitting_loss
 
 # For the GMM prior, we use the GMM implementation of SMPLify-X
@@ -51,9 +51,7 @@ class TemporalSMPLify():
                                           dtype=torch.float32).to(device)
         self.use_lbfgs = use_lbfgs
         # Load SMPL model
-        self.smpl = SMPL(SMPL_MODEL_DIR,
-                         batch_size=batch_size,
-                         create_transl=False).to(self.device)
+        self.smpl = get_smpl(device=self.device)
 
     def __call__(self, init_pose, init_betas, init_cam_t, camera_center, keypoints_2d):
         """Perform body fitting.
@@ -100,9 +98,9 @@ class TemporalSMPLify():
                 def closure():
                     camera_optimizer.zero_grad()
                     betas_ext = arrange_betas(body_pose, betas)
-                    smpl_output = self.smpl(global_orient=global_orient,
-                                            body_pose=body_pose,
-                                            betas=betas_ext)
+                    smpl_output = self.smpl.forward_joints(global_orient=global_orient,
+                                                           body_pose=body_pose,
+                                                           betas=betas_ext)
                     model_joints = smpl_output.joints
 
 
@@ -118,9 +116,9 @@ class TemporalSMPLify():
 
             for i in range(self.num_iters):
                 betas_ext = arrange_betas(body_pose, betas)
-                smpl_output = self.smpl(global_orient=global_orient,
-                                        body_pose=body_pose,
-                                        betas=betas_ext)
+                smpl_output = self.smpl.forward_joints(global_orient=global_orient,
+                                                       body_pose=body_pose,
+                                                       betas=betas_ext)
                 model_joints = smpl_output.joints
                 loss = temporal_camera_fitting_loss(model_joints, camera_translation,
                                            init_cam_t, camera_center,
@@ -150,9 +148,9 @@ class TemporalSMPLify():
                 def closure():
                     body_optimizer.zero_grad()
                     betas_ext = arrange_betas(body_pose, betas)
-                    smpl_output = self.smpl(global_orient=global_orient,
-                                            body_pose=body_pose,
-                                            betas=betas_ext)
+                    smpl_output = self.smpl.forward_joints(global_orient=global_orient,
+                                                           body_pose=body_pose,
+                                                           betas=betas_ext)
                     model_joints = smpl_output.joints
 
                     loss = temporal_body_fitting_loss(body_pose, betas, model_joints, camera_translation, camera_center,
@@ -167,9 +165,9 @@ class TemporalSMPLify():
 
             for i in range(self.num_iters):
                 betas_ext = arrange_betas(body_pose, betas)
-                smpl_output = self.smpl(global_orient=global_orient,
-                                        body_pose=body_pose,
-                                        betas=betas_ext)
+                smpl_output = self.smpl.forward_joints(global_orient=global_orient,
+                                                       body_pose=body_pose,
+                                                       betas=betas_ext)
                 model_joints = smpl_output.joints
                 loss = temporal_body_fitting_loss(body_pose, betas, model_joints, camera_translation, camera_center,
                                          joints_2d, joints_conf, self.pose_prior,
@@ -239,9 +237,9 @@ class TemporalSMPLify():
         global_orient = pose[:, :3]
 
         with torch.no_grad():
-            smpl_output = self.smpl(global_orient=global_orient,
-                                    body_pose=body_pose,
-                                    betas=betas, return_full_pose=True)
+            smpl_output = self.smpl.forward_joints(global_orient=global_orient,
+                                                   body_pose=body_pose,
+                                                   betas=betas)
             model_joints = smpl_output.joints
             reprojection_loss = temporal_body_fitting_loss(body_pose, betas, model_joints, cam_t, camera_center,
                                                   joints_2d, joints_conf, self.pose_prior,
@@ -22,13 +22,14 @@ import torch
 import subprocess
 import numpy as np
 import os.path as osp
-from pytube import YouTube
 from collections import OrderedDict
+from torch.utils.data import DataLoader
 
 from lib.utils.smooth_bbox import get_smooth_bbox_params, get_all_bbox_params
 from lib.data_utils.img_utils import get_single_image_crop_demo
 from lib.utils.geometry import rotation_matrix_to_angle_axis
 from lib.smplify.temporal_smplify import TemporalSMPLify
+from lib.dataset.inference import FrameStream
 
 
 def preprocess_video(video, joints2d, bboxes, frames, scale=1.0, crop_size=224):
@@ -84,7 +85,22 @@ def preprocess_video(video, joints2d, bboxes, frames, scale=1.0, crop_size=224):
     return temp_video, norm_video, bboxes, joints2d, frames
 
 
+def run_tracker_on_frames(mot, frames, batch_size=12):
+    """
+    Run the multi person tracker on decoded frames instead of an image folder.
+
+    :param mot (MPT): multi person tracker with `output_format='dict'`
+    :param frames (iterable): BGR frames of the video, e.g. a `FrameBuffer`
+    :param batch_size (int): batch size of the object detector
+    :return: tracking results as returned by `MPT.__call__`
+    """
+    dataloader = DataLoader(FrameStream(frames), batch_size=batch_size)
+    trackers = mot.run_tracker(dataloader)
+    return mot.prepare_output_tracks(trackers)
+
+
 def download_youtube_clip(url, download_folder):
+    from pytube import YouTube
     return YouTube(url).streams.first().download(output_path=download_folder)
 
 
@@ -275,21 +291,60 @@ def convert_crop_coords_to_orig_img(bbox, keypoints, crop_size):
     return keypoints
 
           
-def prepare_rendering_results(vibe_results, nframes):
-    frame_results = [{} for _ in range(nframes)]
-    for person_id, person_data in vibe_results.items():
-        for idx, frame_id in enumerate(person_data['frame_ids']):
-            frame_results[frame_id][person_id] = {
-                'verts': person_data['verts'][idx],
-                'cam': person_data['orig_cam'][idx],
-            }
-
-    # naive depth ordering based on the scale of the weak perspective camera
-    for frame_id, frame_data in enumerate(frame_results):
+class FrameResultsTable(object):
+    """
+    Columnar, frame indexed VIBE results for rendering. Person ids, frame ids, vertices
+    and cameras of all people are stored in contiguous arrays; rows are sorted once by
+    frame and, within a frame, by the y-scale of the camera (naive depth ordering), and
+    `offsets[i]:offsets[i + 1]` index the sorted rows of frame i.
+
+    `table[frame_id]` returns an OrderedDict person_id -> {'verts', 'cam'} in drawing
+    order and `table[start:end]` a table of that frame range.
+    """
+    def __init__(self, person_ids, frame_ids, verts, cams, nframes):
+        self.person_ids = person_ids
+        self.frame_ids = frame_ids
+        self.verts = verts
+        self.cams = cams
+        self.nframes = nframes
+
         # sort based on y-scale of the cam in original image coords
-        sort_idx = np.argsort([v['cam'][1] for k,v in frame_data.items()])
-        frame_results[frame_id] = OrderedDict(
-            {list(frame_data.keys())[i]:frame_data[list(frame_data.keys())[i]] for i in sort_idx}
+        self.rows = np.lexsort((cams[:, 1], frame_ids)) if len(frame_ids) > 0 else np.zeros(0, dtype=np.int64)
+        self.offsets = np.searchsorted(frame_ids[self.rows], np.arange(nframes + 1))
+
+    @classmethod
+    def from_vibe_results(cls, vibe_results, nframes):
+        if len(vibe_results) == 0:
+            return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, 0, 3)), np.zeros((0, 4)),
+                       nframes)
+
+        person_ids = np.concatenate([
+            np.full(len(v['frame_ids']), k) for k, v in vibe_results.items()
+        ])
+        frame_ids = np.concatenate([np.asarray(v['frame_ids']) for v in vibe_results.values()])
+        verts = np.concatenate([v['verts'] for v in vibe_results.values()], axis=0)
+        cams = np.concatenate([v['orig_cam'] for v in vibe_results.values()], axis=0)
+        return cls(person_ids, frame_ids, verts, cams, nframes)
+
+    def __len__(self):
+        return self.nframes
+
+    def __getitem__(self, frame_id):
+        if isinstance(frame_id, slice):
+            start, end, _ = frame_id.indices(self.nframes)
+            rows = self.rows[self.offsets[start]:self.offsets[end]]
+            return FrameResultsTable(self.person_ids[rows], self.frame_ids[rows] - start, self.verts[rows],
+                                     self.cams[rows], end - start)
+
+        rows = self.rows[self.offsets[frame_id]:self.offsets[frame_id + 1]]
+        return OrderedDict(
+            (self.person_ids[r], {'verts': self.verts[r], 'cam': self.cams[r]}) for r in rows
         )
 
-    return frame_results
+    def __iter__(self):
+        for frame_id in range(self.nframes):
+            yield self[frame_id]
+
+
+def prepare_rendering_results(vibe_results, nframes):
+    return FrameResultsTable.from_vibe_results(vibe_results, nframes)
@@ -61,13 +61,9 @@ def compute_error_verts(pred_verts, target_verts=None, target_theta=None):
     """
 
     if target_verts is None:
-        from lib.models.smpl import SMPL_MODEL_DIR
-        from lib.models.smpl import SMPL
+        from lib.models.smpl import get_smpl
         device = 'cpu'
-        smpl = SMPL(
-            SMPL_MODEL_DIR,
-            batch_size=1, # target_theta.shape[0],
-        ).to(device)
+        smpl = get_smpl(device=device)
 
         betas = torch.from_numpy(target_theta[:,75:]).to(device)
         pose = torch.from_numpy(target_theta[:,3:75]).to(device)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+import os
+import cv2
+import json
+import queue
+import itertools
+import threading
+import subprocess
+import numpy as np
+import os.path as osp
+
+
+def get_rotation(stream):
+    # clockwise rotation of a ffprobe stream, from the rotate tag or the display matrix
+    if 'rotate' in stream.get('tags', {}):
+        return int(stream['tags']['rotate']) % 360
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            return int(round(-float(side_data['rotation']))) % 360
+    return 0
+
+
+def probe_rotation(vid_file):
+    """
+    Clockwise rotation in degrees that ffmpeg applies to the frames of a video, e.g.
+    90 for portrait phone videos, according to its rotate tag or display matrix.
+    """
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream_tags=rotate:stream_side_data=rotation',
+        '-of', 'json', vid_file,
+    ]
+    streams = json.loads(subprocess.check_output(command)).get('streams', [])
+    return get_rotation(streams[0]) if streams else 0
+
+
+def probe_fps(vid_file):
+    """Frame rate of a video, without counting its frames."""
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=r_frame_rate', '-of', 'json', vid_file,
+    ]
+    stream = json.loads(subprocess.check_output(command))['streams'][0]
+    num, den = stream['r_frame_rate'].split('/')
+    return float(num) / float(den) if float(den) > 0 else 0.
+
+
+def probe_video(vid_file):
+    """
+    Read the frame size, number of frames and frame rate of a video with ffprobe.
+    The frame size is the one of the decoded frames, which ffmpeg rotates according
+    to the rotation metadata of the video.
+
+    :param vid_file (str): input video path
+    :return: width, height, number of frames, fps
+    """
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+        '-show_entries', 'stream=width,height,nb_read_packets,r_frame_rate:stream_tags=rotate:stream_side_data=rotation',
+        '-of', 'json', vid_file,
+    ]
+    stream = json.loads(subprocess.check_output(command))['streams'][0]
+    num, den = stream['r_frame_rate'].split('/')
+    fps = float(num) / float(den) if float(den) > 0 else 0.
+    width, height = int(stream['width']), int(stream['height'])
+    if get_rotation(stream) in (90, 270):
+        width, height = height, width
+    return width, height, int(stream['nb_read_packets']), fps
+
+
+class FrameSource(object):
+    """
+    Base class of the frame sources. Iterating over a frame source decodes the
+    video from the beginning and yields its frames one by one as BGR uint8 arrays
+    of shape (height, width, 3), so frames never have to be written to disk.
+    """
+    def __init__(self, vid_file):
+        self.vid_file = vid_file
+        self.width, self.height, self.num_frames, self.fps = self.probe()
+
+    def probe(self):
+        return probe_video(self.vid_file)
+
+    @property
+    def img_shape(self):
+        return (self.height, self.width, 3)
+
+    def __len__(self):
+        return self.num_frames
+
+    def __iter__(self):
+        return self.frames()
+
+    def frames(self):
+        raise NotImplementedError
+
+    def frame_range(self, start, end):
+        """Yields the frames in [start, end)."""
+        return itertools.islice(self.frames(), start, end)
+
+
+class FFmpegFrameSource(FrameSource):
+    """
+    Decodes frames by reading raw bgr24 video from an ffmpeg pipe. ffmpeg rotates the
+    frames according to the rotation metadata, `probe_video` reports the rotated size.
+    """
+
+    def frames(self, filters=(), input_args=()):
+        command = [
+            'ffmpeg', *input_args, '-i', self.vid_file, *filters,
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-v', 'error', '-',
+        ]
+        frame_size = self.width * self.height * 3
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, bufsize=frame_size)
+        try:
+            while True:
+                buffer = proc.stdout.read(frame_size)
+                if len(buffer) < frame_size:
+                    break
+                # copied, np.frombuffer returns read-only arrays
+                yield np.frombuffer(buffer, dtype=np.uint8).reshape(self.height, self.width, 3).copy()
+        finally:
+            proc.stdout.close()
+            proc.kill()
+            proc.wait()
+
+    def frame_range(self, start, end):
+        if start == 0 or self.fps <= 0:
+            # no seeking, frames before start are decoded by ffmpeg but not piped
+            select = ['-vf', f'select=between(n\\,{start}\\,{end - 1})', '-vsync', '0']
+            return itertools.islice(self.frames(filters=select), end - start)
+
+        # input seeking jumps to the keyframe before start and only decodes from there on, so
+        # shards do not all decode the video from its beginning. ffmpeg drops the frames before
+        # the seek time, which is half a frame early so rounded timestamps do not skip `start`.
+        seek = ['-ss', f'{(start - 0.5) / self.fps:.6f}']
+        return itertools.islice(self.frames(filters=['-vsync', '0'], input_args=seek), end - start)
+
+
+class PyAVFrameSource(FrameSource):
+    """Decodes frames in-process with PyAV (`pip install av`)."""
+
+    def probe(self):
+        import av
+        with av.open(self.vid_file) as container:
+            stream = container.streams.video[0]
+            fps = float(stream.average_rate) if stream.average_rate else 0.
+            num_frames = stream.frames
+            if num_frames == 0:
+                num_frames = sum(1 for packet in container.demux(stream) if packet.size > 0)
+            width, height = stream.codec_context.width, stream.codec_context.height
+
+        # PyAV does not apply the rotation metadata, frames are rotated like ffmpeg does
+        self.rotation = probe_rotation(self.vid_file)
+        if self.rotation in (90, 270):
+            width, height = height, width
+        return width, height, num_frames, fps
+
+    def frames(self):
+        import av
+        with av.open(self.vid_file) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = 'AUTO'
+            for frame in container.decode(stream):
+                frame = frame.to_ndarray(format='bgr24')
+                if self.rotation:
+                    frame = np.ascontiguousarray(np.rot90(frame, k=-self.rotation // 90))
+                yield frame
+
+
+class OpenCVFrameSource(FrameSource):
+    """Decodes frames with cv2.VideoCapture."""
+
+    def probe(self):
+        cap = cv2.VideoCapture(self.vid_file)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        num_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        # recent versions rotate the frames but may report the stored size
+        ret, frame = cap.read()
+        if ret:
+            height, width = frame.shape[:2]
+        cap.release()
+        return width, height, num_frames, fps
+
+    def frames(self):
+        cap = cv2.VideoCapture(self.vid_file)
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                yield frame
+        finally:
+            cap.release()
+
+
+class CameraFrameSource(OpenCVFrameSource):
+    """Reads a live camera with cv2.VideoCapture, `vid_file` is the camera index."""
+
+    def __init__(self, vid_file):
+        super(CameraFrameSource, self).__init__(int(vid_file))
+
+    def probe(self):
+        width, height, _, fps = super(CameraFrameSource, self).probe()
+        return width, height, 0, fps
+
+
+class ImageFolderSource(FrameSource):
+    """
+    Reads the frames of a video that has already been extracted to an image folder.
+    The frame rate is unknown unless given, e.g. with `probe_fps` of the video.
+    """
+    def __init__(self, vid_file, fps=0.):
+        super(ImageFolderSource, self).__init__(vid_file)
+        self.fps = fps
+
+    def probe(self):
+        self.image_file_names = sorted([
+            osp.join(self.vid_file, x)
+            for x in os.listdir(self.vid_file)
+            if x.endswith('.png') or x.endswith('.jpg')
+        ])
+        height, width = cv2.imread(self.image_file_names[0]).shape[:2]
+        return width, height, len(self.image_file_names), 0.
+
+    def frames(self):
+        return self.frame_range(0, len(self.image_file_names))
+
+    def frame_range(self, start, end):
+        for img_fname in self.image_file_names[start:end]:
+            yield cv2.imread(img_fname)
+
+
+FRAME_SOURCES = {
+    'ffmpeg': FFmpegFrameSource,
+    'pyav': PyAVFrameSource,
+    'opencv': OpenCVFrameSource,
+    'camera': CameraFrameSource,
+    'images': ImageFolderSource,
+}
+
+
+def get_frame_source(vid_file, backend='ffmpeg'):
+    if backend not in FRAME_SOURCES:
+        raise ValueError(f'Unknown frame source backend \"{backend}\", '
+                         f'available options are {list(FRAME_SOURCES.keys())}')
+    return FRAME_SOURCES[backend](vid_file)
+
+
+class FrameBuffer(object):
+    """
+    Bounded ring buffer in front of a frame source. A background thread decodes
+    up to `maxlen` frames ahead of the consumer, so decoding overlaps with
+    tracking, cropping or rendering while memory stays bounded by `maxlen` frames.
+    Every iteration starts a new decoding pass over the source.
+    """
+    def __init__(self, source, maxlen=32):
+        self.source = source
+        self.maxlen = maxlen
+
+    def __len__(self):
+        return len(self.source)
+
+    @property
+    def img_shape(self):
+        return self.source.img_shape
+
+    def __iter__(self):
+        buffer = queue.Queue(maxsize=self.maxlen)
+        stop = threading.Event()
+        end = object()
+
+        def _put(item):
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _decode():
+            try:
+                for frame in self.source:
+                    if not _put(frame):
+                        return
+                _put(end)
+            except Exception as e:
+                _put(e)
+
+        thread = threading.Thread(target=_decode, daemon=True)
+        thread.start()
+
+        try:
+            while True:
+                frame = buffer.get()
+                if frame is end:
+                    break
+                if isinstance(frame, Exception):
+                    raise frame
+                yield frame
+        finally:
+            stop.set()
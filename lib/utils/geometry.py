@@ -87,14 +87,14 @@ def rotation_matrix_to_angle_axis(rotation_matrix):
     """
     if rotation_matrix.shape[1:] == (3,3):
         rot_mat = rotation_matrix.reshape(-1, 3, 3)
-        hom = torch.tensor([0, 0, 1], dtype=torch.float32,
-                           device=rotation_matrix.device).reshape(1, 3, 1).expand(rot_mat.shape[0], -1, -1)
+        # built on the device without host copies or masked assignments, so that it can run in a cuda graph
+        hom = torch.zeros(rot_mat.shape[0], 3, 1, dtype=torch.float32, device=rotation_matrix.device)
+        hom[:, 2] = 1.
         rotation_matrix = torch.cat([rot_mat, hom], dim=-1)
 
     quaternion = rotation_matrix_to_quaternion(rotation_matrix)
     aa = quaternion_to_angle_axis(quaternion)
-    aa[torch.isnan(aa)] = 0.0
-    return aa
+    return torch.where(torch.isnan(aa), torch.zeros_like(aa), aa)
 
 
 def quaternion_to_angle_axis(quaternion: torch.Tensor) -> torch.Tensor:
@@ -44,3 +44,31 @@ class OneEuroFilter:
         self.t_prev = t
 
         return x_hat
+
+
+def one_euro_filter_sequence(x, min_cutoff=1.0, beta=0.0, d_cutoff=1.0):
+    """
+    Runs the one euro filter over a whole sequence, sampled at unit time steps and
+    initialized with the first frame like `OneEuroFilter`. The recurrence is scanned
+    over time once, vectorised over all the other dimensions, e.g. tracks and joints.
+
+    :param x (np.ndarray): T x ... signal
+    :return: filtered signal of the same shape
+    """
+    x = np.asarray(x)
+    x_hat = np.empty_like(x)
+    x_hat[0] = x[0]
+
+    # t_e is always 1, so the derivative smoothing factor is a constant
+    a_d = smoothing_factor(1.0, d_cutoff)
+    x_prev = x[0]
+    dx_prev = np.zeros_like(x[0])
+    for idx in range(1, x.shape[0]):
+        dx_hat = exponential_smoothing(a_d, x[idx] - x_prev, dx_prev)
+
+        r = 2 * math.pi * (min_cutoff + beta * np.abs(dx_hat))
+        a = r / (r + 1)
+        x_prev = x_hat[idx] = exponential_smoothing(a, x[idx], x_prev)
+        dx_prev = dx_hat
+
+    return x_hat
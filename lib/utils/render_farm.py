@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+import os
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+import os.path as osp
+import multiprocessing
+
+from lib.utils.video_writer import FFmpegVideoWriter
+
+
+def render_frame(renderer, img, frame_data, mesh_color, frame_idx=0, sideview=False, batched=False,
+                 mesh_folder=None):
+    """
+    Renders the people of one frame of `prepare_rendering_results` onto the image.
+
+    :param renderer (Renderer): renderer with the resolution of the image
+    :param frame_data (dict): person_id -> verts and cam, in drawing order
+    :param mesh_color (dict): person_id -> rgb color
+    :param batched (bool): render all people in a single draw with `Renderer.render_multi`
+    :param mesh_folder (str): if given, meshes are saved to mesh_folder/person_id/frame_idx.obj
+    """
+    if sideview:
+        side_img = np.zeros_like(img)
+
+    if mesh_folder is not None:
+        for person_id, person_data in frame_data.items():
+            os.makedirs(osp.join(mesh_folder, f'{person_id:04d}'), exist_ok=True)
+            renderer.save_mesh(person_data['verts'], osp.join(mesh_folder, f'{person_id:04d}', f'{frame_idx:06d}.obj'))
+
+    if batched:
+        frame_verts = [v['verts'] for v in frame_data.values()]
+        frame_cams = [v['cam'] for v in frame_data.values()]
+        frame_colors = [mesh_color[k] for k in frame_data.keys()]
+
+        img = renderer.render_multi(img, frame_verts, frame_cams, frame_colors)
+
+        if sideview:
+            side_img = renderer.render_multi(side_img, frame_verts, frame_cams, frame_colors,
+                                             angle=270, axis=[0,1,0])
+    else:
+        for person_id, person_data in frame_data.items():
+            img = renderer.render(
+                img,
+                person_data['verts'],
+                cam=person_data['cam'],
+                color=mesh_color[person_id],
+            )
+
+            if sideview:
+                side_img = renderer.render(
+                    side_img,
+                    person_data['verts'],
+                    cam=person_data['cam'],
+                    color=mesh_color[person_id],
+                    angle=270,
+                    axis=[0,1,0],
+                )
+
+    if sideview:
+        img = np.concatenate([img, side_img], axis=1)
+
+    return img
+
+
+def _render_segment(shard):
+    # runs in a worker process with its own EGL context
+    from lib.utils.renderer import Renderer
+
+    frame_source, start, end, frame_results, output_file, render_kwargs, mesh_color, fps = shard
+    renderer = Renderer(resolution=(frame_source.width, frame_source.height), orig_img=True,
+                        wireframe=render_kwargs.pop('wireframe', False))
+
+    with FFmpegVideoWriter(output_file, fps=fps) as writer:
+        for offset, img in enumerate(frame_source.frame_range(start, end)):
+            img = render_frame(renderer, img, frame_results[offset], mesh_color, frame_idx=start + offset,
+                               **render_kwargs)
+            writer.write(img)
+    return writer.num_frames
+
+
+def concat_videos(video_files, output_file):
+    list_file = osp.join(osp.dirname(video_files[0]), 'segments.txt')
+    with open(list_file, 'w') as f:
+        for video_file in video_files:
+            f.write(f'file \'{osp.abspath(video_file)}\'\n')
+
+    command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_file, '-c', 'copy', '-v', 'error', output_file]
+    subprocess.check_call(command)
+
+
+def render_video_sharded(frame_source, frame_results, output_file, mesh_color, num_workers=4, fps=None,
+                         wireframe=False, sideview=False, batched=False, mesh_folder=None):
+    """
+    Splits the frames into `num_workers` contiguous ranges, renders and encodes
+    every range in its own process, each with its own EGL context and Renderer,
+    and stitches the encoded segments back in order without re-encoding.
+
+    :param frame_source (FrameSource): frames of the input video
+    :param frame_results (FrameResultsTable): output of `prepare_rendering_results`
+    :param output_file (str): output video path
+    :param fps (float): frame rate of the output video, defaults to the one of the frame source or 25
+    :return: number of rendered frames
+    """
+    if fps is None:
+        fps = frame_source.fps if frame_source.fps > 0 else 25
+
+    num_frames = len(frame_results)
+    bounds = np.linspace(0, num_frames, num_workers + 1).astype(int)
+    render_kwargs = dict(wireframe=wireframe, sideview=sideview, batched=batched, mesh_folder=mesh_folder)
+
+    segment_folder = tempfile.mkdtemp()
+    shards = []
+    for idx, (start, end) in enumerate(zip(bounds[:-1], bounds[1:])):
+        if end > start:
+            segment_file = osp.join(segment_folder, f'{idx:04d}.mp4')
+            shards.append((frame_source, int(start), int(end), frame_results[start:end], segment_file,
+                           dict(render_kwargs), mesh_color, fps))
+
+    # spawn, so workers do not inherit the GL or CUDA state of the parent
+    with multiprocessing.get_context('spawn').Pool(len(shards)) as pool:
+        rendered_frames = sum(pool.map(_render_segment, shards))
+
+    concat_videos([shard[4] for shard in shards], output_file)
+    shutil.rmtree(segment_folder)
+    return rendered_frames
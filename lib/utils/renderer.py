@@ -18,9 +18,30 @@ import math
 import trimesh
 import pyrender
 import numpy as np
-from pyrender.constants import RenderFlags
+import os.path as osp
+import scipy.sparse as sp
+from pyrender.constants import RenderFlags, GLTF
+from pyrender.shader_program import ShaderProgramCache
 from lib.models.smpl import get_smpl_faces
 
+MULTI_PERSON_VERT = osp.join(osp.dirname(osp.abspath(__file__)), 'shaders', 'multi_person.vert')
+
+# render_multi swaps the shader cache of pyrender's renderer and rewrites vertex buffers in
+# place, which relies on private attributes and on the buffer layout of the version pinned in
+# requirements.txt. With other versions it renders the people one by one with `render`.
+SINGLE_DRAW_PYRENDER_VERSION = '0.1.36'
+
+
+class MultiPersonShaderCache(ShaderProgramCache):
+    # pyrender's shaders, except for the primitive of render_multi, the only one with a
+    # texcoord_1, which passes its clip coordinates to the vertex shader
+    def get_program(self, vertex_shader, fragment_shader, geometry_shader=None, defines=None):
+        if vertex_shader == 'mesh.vert' and defines is not None and 'TEXCOORD_1_LOC' in defines:
+            vertex_shader = MULTI_PERSON_VERT
+        return super(MultiPersonShaderCache, self).get_program(
+            vertex_shader, fragment_shader, geometry_shader=geometry_shader, defines=defines
+        )
+
 
 class WeakPerspectiveCamera(pyrender.Camera):
     def __init__(self,
@@ -75,6 +96,19 @@ class Renderer:
         light_pose[:3, 3] = [1, 1, 2]
         self.scene.add(light, pose=light_pose)
 
+        # render_multi draws all people with a single primitive, which is uploaded once per
+        # capacity and then only gets its vertex buffer rewritten for every frame
+        self.faces_idx = np.asarray(self.faces, dtype=np.int64)
+        num_verts = self.faces_idx.max() + 1
+        self.vertex_corners = sp.csr_matrix(
+            (np.ones(self.faces_idx.size), (self.faces_idx.reshape(-1), np.arange(self.faces_idx.size))),
+            shape=(num_verts, self.faces_idx.size),
+        )
+        self.multi_node = None
+        self.multi_capacity = 0
+        self.multi_colors = None
+        self.multi_camera = WeakPerspectiveCamera(scale=[1., 1.], translation=[0., 0.], zfar=1000.)
+
     def render(self, img, verts, cam, angle=None, axis=None, mesh_filename=None, color=[1.0, 1.0, 0.9]):
 
         mesh = trimesh.Trimesh(vertices=verts, faces=self.faces, process=False)
@@ -124,3 +158,189 @@ class Renderer:
         self.scene.remove_node(cam_node)
 
         return image
+
+    def save_mesh(self, verts, mesh_filename):
+        mesh = trimesh.Trimesh(vertices=verts, faces=self.faces, process=False)
+        mesh.apply_transform(trimesh.transformations.rotation_matrix(math.radians(180), [1, 0, 0]))
+        mesh.export(mesh_filename)
+
+    def vertex_normals(self, verts):
+        """
+        Vertex normals of Nx6890x3 vertices as trimesh computes them for `render`,
+        the sum of the adjacent face normals weighted by their corner angles.
+        """
+        num_people, num_verts = verts.shape[:2]
+        tri = verts[:, self.faces_idx].astype(np.float64)
+
+        def unitize(x):
+            norm = np.linalg.norm(x, axis=-1, keepdims=True)
+            return np.divide(x, norm, out=np.zeros_like(x), where=norm > 0)
+
+        face_normals = unitize(np.cross(tri[:, :, 1] - tri[:, :, 0], tri[:, :, 2] - tri[:, :, 0]))
+
+        u = unitize(tri[:, :, 1] - tri[:, :, 0])
+        v = unitize(tri[:, :, 2] - tri[:, :, 0])
+        w = unitize(tri[:, :, 2] - tri[:, :, 1])
+        angles = np.empty(tri.shape[:3])
+        angles[..., 0] = np.arccos(np.clip((u * v).sum(-1), -1, 1))
+        angles[..., 1] = np.arccos(np.clip((-u * w).sum(-1), -1, 1))
+        angles[..., 2] = np.pi - angles[..., 0] - angles[..., 1]
+
+        # NxFx3 corners -> 3F x (N*3)
+        corners = angles[..., None] * face_normals[:, :, None, :]
+        corners = corners.reshape(num_people, -1, 3).transpose(1, 0, 2).reshape(-1, num_people * 3)
+        normals = self.vertex_corners.dot(corners).reshape(num_verts, num_people, 3).transpose(1, 0, 2)
+        return unitize(normals)
+
+    def install_multi_person_shaders(self):
+        # only done once render_multi is used, `render` keeps pyrender's own cache until then
+        renderer = self.renderer._renderer
+        if not isinstance(renderer._program_cache, MultiPersonShaderCache):
+            self.renderer._platform.make_current()
+            renderer._program_cache.clear()
+            renderer._program_cache = MultiPersonShaderCache()
+
+    def get_multi_mesh(self, num_people):
+        # mesh of render_multi with room for at least num_people, hidden when not rendering
+        if self.multi_capacity < num_people:
+            if self.multi_node is not None:
+                self.scene.remove_node(self.multi_node)
+
+            capacity = max(num_people, 2 * self.multi_capacity)
+            num_verts = self.vertex_corners.shape[0]
+            indices = self.faces_idx[None] + num_verts * np.arange(capacity)[:, None, None]
+            primitive = pyrender.Primitive(
+                positions=np.zeros((capacity * num_verts, 3), dtype=np.float32),
+                normals=np.zeros((capacity * num_verts, 3), dtype=np.float32),
+                texcoord_0=np.zeros((capacity * num_verts, 2), dtype=np.float32),
+                texcoord_1=np.zeros((capacity * num_verts, 2), dtype=np.float32),
+                indices=indices.reshape(-1, 3),
+                material=pyrender.MetallicRoughnessMaterial(metallicFactor=0.0, alphaMode='OPAQUE'),
+                mode=GLTF.TRIANGLES,
+            )
+            self.multi_node = self.scene.add(pyrender.Mesh(primitives=[primitive], is_visible=False), 'mesh')
+            self.multi_capacity = capacity
+            self.multi_colors = None
+        return self.multi_node.mesh
+
+    def set_multi_colors(self, primitive, colors):
+        """
+        Colors of the people of render_multi as a capacity x 1 base color texture, which the
+        fragment shader multiplies with the base color factor before lighting, like the
+        material colors of `render`. The texture is decoded from sRGB, so it stores the
+        encoded colors. Only replaced when the colors change.
+        """
+        palette = np.ones((self.multi_capacity, 3))
+        palette[:len(colors)] = np.asarray(colors, dtype=np.float64)[:, :3]
+        if self.multi_colors is not None and np.array_equal(self.multi_colors, palette):
+            return
+        self.multi_colors = palette
+
+        texture = pyrender.Texture(
+            source=np.round(255. * np.clip(palette, 0., 1.) ** (1. / 2.2)).astype(np.uint8)[None],
+            source_channels='RGB',
+            sampler=pyrender.Sampler(magFilter=GLTF.NEAREST, minFilter=GLTF.NEAREST),
+        )
+        primitive.material = pyrender.MetallicRoughnessMaterial(
+            metallicFactor=0.0,
+            alphaMode='OPAQUE',
+            baseColorFactor=(1.0, 1.0, 1.0, 1.0),
+            baseColorTexture=texture,
+        )
+
+    def update_vertex_buffer(self, primitive):
+        # same interleaved layout as Primitive._add_to_context of SINGLE_DRAW_PYRENDER_VERSION,
+        # a primitive that is not uploaded yet gets its data when the renderer adds it to its context
+        if primitive._vaid is None:
+            return
+
+        from OpenGL.GL import glBindBuffer, glBufferSubData, GL_ARRAY_BUFFER
+
+        vertex_data = np.ascontiguousarray(np.hstack([
+            primitive.positions, primitive.normals, primitive.texcoord_0, primitive.texcoord_1
+        ]).astype(np.float32).reshape(-1))
+
+        self.renderer._platform.make_current()
+        glBindBuffer(GL_ARRAY_BUFFER, primitive._buffers[0])
+        glBufferSubData(GL_ARRAY_BUFFER, 0, vertex_data.nbytes, vertex_data)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def render_multi(self, img, verts, cams, colors, angle=None, axis=None):
+        """
+        Renders all people of a frame with a single draw call and composites once. Every
+        person keeps the world position, normals, material color, lights and camera pose of
+        `render`, only its weak perspective projection is applied on the cpu. People are
+        layered in depth in the given order, later ones in front, which gives the same
+        occlusions as calling `render` for each of them in that order.
+
+        :param verts (np.ndarray): Nx6890x3 vertices
+        :param cams (np.ndarray): Nx4 weak perspective cameras, sx, sy, tx, ty
+        :param colors (list): rgb color of every person
+        """
+        num_people = len(verts)
+        if num_people == 0:
+            return img
+
+        if pyrender.__version__ != SINGLE_DRAW_PYRENDER_VERSION:
+            for person_verts, cam, color in zip(verts, cams, colors):
+                img = self.render(img, person_verts, cam, angle=angle, axis=axis, color=color)
+            return img
+
+        self.install_multi_person_shaders()
+
+        R = trimesh.transformations.rotation_matrix(math.radians(180), [1, 0, 0])
+        if angle and axis:
+            R = trimesh.transformations.rotation_matrix(math.radians(angle), axis) @ R
+        R = R[:3, :3]
+
+        verts = np.asarray(verts, dtype=np.float64) @ R.T
+        normals = self.vertex_normals(verts)
+
+        mesh = self.get_multi_mesh(num_people)
+        primitive = mesh.primitives[0]
+        capacity, num_verts = self.multi_capacity, verts.shape[1]
+
+        # clip coordinates of WeakPerspectiveCamera.get_projection_matrix, with every person
+        # in its own slice of the depth range, later people are nearer. The unused slots of
+        # the primitive are beyond the far plane and clipped.
+        cams = np.asarray(cams, dtype=np.float64)
+        sx, sy, tx, ty = [cams[:, None, i] for i in range(4)]
+        z_scale = 0.99 / (num_people * (np.abs(verts[..., 2]).max() + 1e-6))
+        z_offset = -1. + (2. * np.arange(num_people)[:, None] + 1.) / num_people
+
+        positions = np.zeros((capacity, num_verts, 3))
+        vertex_normals = np.zeros((capacity, num_verts, 3))
+        clip_xy = np.zeros((capacity, num_verts, 2))
+        clip_z = np.zeros((capacity, num_verts, 2))
+        positions[:num_people] = verts
+        vertex_normals[:num_people] = normals
+        clip_xy[:num_people] = np.stack([sx * verts[..., 0] + sx * tx, sy * verts[..., 1] - sy * ty], axis=-1)
+        clip_z[:, :, 0] = 2.
+        clip_z[:num_people, :, 0] = -(z_scale * verts[..., 2] + z_offset)
+        # texture coordinate of the color of each person
+        clip_z[:, :, 1] = (np.arange(capacity)[:, None] + 0.5) / capacity
+
+        self.set_multi_colors(primitive, colors)
+        primitive.positions = positions.reshape(-1, 3)
+        primitive.normals = vertex_normals.reshape(-1, 3)
+        primitive.texcoord_0 = clip_xy.reshape(-1, 2)
+        primitive.texcoord_1 = clip_z.reshape(-1, 2)
+        self.update_vertex_buffer(primitive)
+        mesh.is_visible = True
+
+        cam_node = self.scene.add(self.multi_camera, pose=np.eye(4))
+
+        if self.wireframe:
+            render_flags = RenderFlags.RGBA | RenderFlags.ALL_WIREFRAME
+        else:
+            render_flags = RenderFlags.RGBA
+
+        rgb, _ = self.renderer.render(self.scene, flags=render_flags)
+        valid_mask = (rgb[:, :, -1] > 0)[:, :, np.newaxis]
+        output_img = rgb[:, :, :-1] * valid_mask + (1 - valid_mask) * img
+        image = output_img.astype(np.uint8)
+
+        self.scene.remove_node(cam_node)
+        mesh.is_visible = False
+
+        return image
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+
+import json
+import torch
+import numpy as np
+
+# only torch (and onnxruntime for .onnx files) is imported here, this module must not import lib.models
+
+
+class ExportedVIBE(object):
+    """
+    Runs a `VIBE_Demo` exported by export.py without the model code, smplx or any
+    checkpoint. TorchScript files are loaded with `torch.jit.load`, ONNX files with
+    onnxruntime. Exported models accept any batch size and sequence length.
+
+    :param path (str): exported .pt or .onnx file
+    :param device (str): device of the TorchScript module, ONNX runs on the cpu
+    """
+    def __init__(self, path, device='cpu'):
+        self.device = device
+        self.module = self.session = None
+
+        if path.endswith('.onnx'):
+            import onnxruntime
+            self.session = onnxruntime.InferenceSession(path)
+            self.output_names = [o.name for o in self.session.get_outputs()]
+        else:
+            extra_files = {'metadata.json': ''}
+            self.module = torch.jit.load(path, map_location=device, _extra_files=extra_files)
+            metadata = json.loads(extra_files['metadata.json'])
+            self.output_names = metadata['outputs']
+
+    @torch.no_grad()
+    def __call__(self, images):
+        """
+        :param images (torch.Tensor): NxTx3x224x224 normalized crops of N sequences of T frames
+        :return: dict of the exported outputs, e.g. theta, verts, kp_2d and kp_3d of shape NxTx...
+        """
+        if self.session is not None:
+            outputs = self.session.run(None, {'images': images.cpu().numpy().astype(np.float32)})
+            return {k: torch.from_numpy(v) for k, v in zip(self.output_names, outputs)}
+
+        outputs = self.module(images.to(self.device))
+        return dict(zip(self.output_names, outputs))
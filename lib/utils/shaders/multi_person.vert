@@ -0,0 +1,36 @@
+#version 330 core
+
+// pyrender's mesh.vert for Renderer.render_multi, which draws all people with one primitive.
+// Every person has its own weak perspective camera, so the clip coordinates of a vertex are
+// computed on the cpu and passed in texcoord_0 (x, y) and texcoord_1.x (z). texcoord_1.y is
+// the coordinate of the person's color in the base color texture. The world position, and
+// thus the lighting, is the same as with Renderer.render.
+
+layout(location = 0) in vec3 position;
+layout(location = NORMAL_LOC) in vec3 normal;
+layout(location = TEXCOORD_0_LOC) in vec2 texcoord_0;
+layout(location = TEXCOORD_1_LOC) in vec2 texcoord_1;
+layout(location = INST_M_LOC) in mat4 inst_m;
+
+// Uniforms
+uniform mat4 M;
+uniform mat4 V;
+uniform mat4 P;
+
+// Outputs
+out vec3 frag_position;
+out vec3 frag_normal;
+out vec2 uv_0;
+out vec2 uv_1;
+
+void main()
+{
+    gl_Position = vec4(texcoord_0, texcoord_1.x, 1.0);
+    frag_position = vec3(M * inst_m * vec4(position, 1.0));
+
+    mat4 N = transpose(inverse(M * inst_m));
+    frag_normal = normalize(vec3(N * vec4(normal, 0.0)));
+
+    uv_0 = vec2(texcoord_1.y, 0.5);
+    uv_1 = texcoord_1;
+}
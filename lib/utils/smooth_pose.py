@@ -17,52 +17,68 @@
 import torch
 import numpy as np
 
-from lib.models.smpl import SMPL, SMPL_MODEL_DIR
-from lib.utils.one_euro_filter import OneEuroFilter
+from lib.models.smpl import get_smpl
+from lib.utils.one_euro_filter import one_euro_filter_sequence
 
 
-def smooth_pose(pred_pose, pred_betas, min_cutoff=0.004, beta=0.7):
-    # min_cutoff: Decreasing the minimum cutoff frequency decreases slow speed jitter
-    # beta: Increasing the speed coefficient(beta) decreases speed lag.
+@torch.no_grad()
+def run_smpl(pred_pose, pred_betas, batch_size=1024, device='cpu'):
+    """
+    :param pred_pose (np.ndarray): Nx72 axis angle poses
+    :param pred_betas (np.ndarray): Nx10 shape parameters
+    :return: Nx6890x3 vertices and Nx49x3 joints
+    """
+    smpl = get_smpl(device=device)
 
-    one_euro_filter = OneEuroFilter(
-        np.zeros_like(pred_pose[0]),
-        pred_pose[0],
-        min_cutoff=min_cutoff,
-        beta=beta,
-    )
+    pred_verts, pred_joints3d = [], []
+    for i in range(0, pred_pose.shape[0], batch_size):
+        pose = torch.from_numpy(pred_pose[i:i + batch_size]).float().to(device)
+        betas = torch.from_numpy(pred_betas[i:i + batch_size]).float().to(device)
 
-    smpl = SMPL(model_path=SMPL_MODEL_DIR)
+        smpl_output = smpl(
+            betas=betas,
+            body_pose=pose[:, 3:],
+            global_orient=pose[:, :3],
+        )
+        pred_verts.append(smpl_output.vertices.cpu().numpy())
+        pred_joints3d.append(smpl_output.joints.cpu().numpy())
 
-    pred_pose_hat = np.zeros_like(pred_pose)
+    return np.concatenate(pred_verts, axis=0), np.concatenate(pred_joints3d, axis=0)
 
-    # initialize
-    pred_pose_hat[0] = pred_pose[0]
 
-    pred_verts_hat = []
-    pred_joints3d_hat = []
+def smooth_poses(pred_poses, pred_betas, min_cutoff=0.004, beta=0.7, batch_size=1024, device='cpu'):
+    """
+    Smooths the poses of several tracks at once. The one euro filter runs once over
+    all tracks padded to the same length, and SMPL runs on the frames of all tracks
+    together in batches of `batch_size`.
 
-    smpl_output = smpl(
-        betas=torch.from_numpy(pred_betas[0]).unsqueeze(0),
-        body_pose=torch.from_numpy(pred_pose[0, 1:]).unsqueeze(0),
-        global_orient=torch.from_numpy(pred_pose[0, 0:1]).unsqueeze(0),
-    )
-    pred_verts_hat.append(smpl_output.vertices.detach().cpu().numpy())
-    pred_joints3d_hat.append(smpl_output.joints.detach().cpu().numpy())
+    :param pred_poses (list): Tx72 poses of every track
+    :param pred_betas (list): Tx10 shape parameters of every track
+    :return: list of (verts, pose, joints3d) per track
+    """
+    lengths = [p.shape[0] for p in pred_poses]
+    max_len = max(lengths)
 
-    for idx, pose in enumerate(pred_pose[1:]):
-        idx += 1
+    # the filter is causal, so repeating the last frame does not change the valid ones
+    padded = np.stack([np.pad(p, ((0, max_len - p.shape[0]), (0, 0)), mode='edge') for p in pred_poses], axis=1)
+    padded_hat = one_euro_filter_sequence(padded, min_cutoff=min_cutoff, beta=beta)
+    pred_poses_hat = [padded_hat[:l, idx] for idx, l in enumerate(lengths)]
 
-        t = np.ones_like(pose) * idx
-        pose = one_euro_filter(t, pose)
-        pred_pose_hat[idx] = pose
+    pred_verts_hat, pred_joints3d_hat = run_smpl(
+        np.concatenate(pred_poses_hat, axis=0),
+        np.concatenate(pred_betas, axis=0),
+        batch_size=batch_size,
+        device=device,
+    )
+
+    offsets = np.cumsum([0] + lengths)
+    return [
+        (pred_verts_hat[offsets[i]:offsets[i + 1]], pred_poses_hat[i], pred_joints3d_hat[offsets[i]:offsets[i + 1]])
+        for i in range(len(pred_poses))
+    ]
 
-        smpl_output = smpl(
-            betas=torch.from_numpy(pred_betas[idx]).unsqueeze(0),
-            body_pose=torch.from_numpy(pred_pose_hat[idx, 1:]).unsqueeze(0),
-            global_orient=torch.from_numpy(pred_pose_hat[idx, 0:1]).unsqueeze(0),
-        )
-        pred_verts_hat.append(smpl_output.vertices.detach().cpu().numpy())
-        pred_joints3d_hat.append(smpl_output.joints.detach().cpu().numpy())
 
-    return np.vstack(pred_verts_hat), pred_pose_hat, np.vstack(pred_joints3d_hat)
\ No newline at end of file
+def smooth_pose(pred_pose, pred_betas, min_cutoff=0.004, beta=0.7):
+    # min_cutoff: Decreasing the minimum cutoff frequency decreases slow speed jitter
+    # beta: Increasing the speed coefficient(beta) decreases speed lag.
+    return smooth_poses([pred_pose], [pred_betas], min_cutoff=min_cutoff, beta=beta)[0]
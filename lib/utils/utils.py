@@ -24,6 +24,8 @@ import operator
 from tqdm import tqdm
 from os import path as osp
 from functools import reduce
+from contextlib import contextmanager
+from collections import OrderedDict
 from typing import List, Union
 
 
@@ -164,6 +166,49 @@ class AverageMeter(object):
         self.avg = self.sum / self.count
 
 
+class StageTimer(object):
+    """
+    Accumulates the wall time of named stages, `with timer('stage'): ...`.
+    A disabled timer only runs the stages.
+
+    :param enabled (bool): measure the stages
+    :param start (float): reference time of the report, defaults to now
+    """
+    def __init__(self, enabled=True, start=None):
+        self.enabled = enabled
+        self.start = time.time() if start is None else start
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def __call__(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.time()
+        try:
+            yield
+        finally:
+            # wait for queued cuda work, e.g. copies of .to(device), to be counted in its stage
+            if torch.cuda.is_available() and torch.cuda.is_initialized():
+                torch.cuda.synchronize()
+            self.add(name, time.time() - start)
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.stages[name] = self.stages.get(name, 0.) + seconds
+
+    def report(self, title='Startup profile'):
+        if not self.enabled:
+            return
+        total = time.time() - self.start
+        print(f'========= {title} =========')
+        for name, seconds in self.stages.items():
+            print(f'{name:<24s}{seconds:8.2f} s {100 * seconds / max(total, 1e-9):5.1f}%')
+        print(f'{"other":<24s}{total - sum(self.stages.values()):8.2f} s')
+        print(f'{"total":<24s}{total:8.2f} s')
+
+
 def prepare_output_dir(cfg, cfg_file):
 
     # ==== create logdir
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+# Max-Planck-Gesellschaft zur Förderung der Wissenschaften e.V. (MPG) is
+# holder of all proprietary rights on this computer program.
+# You can only use this computer program if you have closed
+# a license agreement with MPG or you get the right to use the computer
+# program from someone who is authorized to grant you that right.
+# Any use of the computer program without a valid license is prohibited and
+# liable to prosecution.
+#
+# Copyright©2019 Max-Planck-Gesellschaft zur Förderung
+# der Wissenschaften e.V. (MPG). acting on behalf of its Max Planck Institute
+# for Intelligent Systems. All rights reserved.
+#
+# Contact: ps-license@tuebingen.mpg.de
+
+import queue
+import threading
+import subprocess
+import numpy as np
+
+
+class FFmpegVideoWriter(object):
+    """
+    Encodes BGR uint8 frames to a video by piping raw frames into the stdin of
+    ffmpeg, so no image folder is written. Frames are handed to a background
+    thread through a queue of at most `maxlen` frames, which lets encoding run
+    in parallel with decoding and rendering. ffmpeg is started on the first
+    frame, with the size of that frame.
+    """
+    def __init__(self, output_file, fps=25, maxlen=32):
+        self.output_file = output_file
+        self.fps = fps
+        self.maxlen = maxlen
+        self.num_frames = 0
+
+        self._queue = queue.Queue(maxsize=maxlen)
+        self._thread = None
+        self._proc = None
+        self._error = None
+
+    def _open(self, img):
+        height, width = img.shape[:2]
+        command = [
+            'ffmpeg', '-y', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}',
+            '-r', str(self.fps), '-i', '-', '-threads', '16', '-profile:v', 'baseline', '-level', '3.0',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-an', '-v', 'error', self.output_file,
+        ]
+        self._proc = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self._thread = threading.Thread(target=self._encode, daemon=True)
+        self._thread.start()
+
+    def _encode(self):
+        try:
+            while True:
+                img = self._queue.get()
+                if img is None:
+                    break
+                self._proc.stdin.write(img.tobytes())
+        except Exception as e:
+            self._error = e
+            # keep consuming so that write() never blocks on a dead encoder
+            while self._queue.get() is not None:
+                pass
+
+    def write(self, img):
+        if self._error is not None:
+            raise self._error
+        if self._proc is None:
+            self._open(img)
+        self._queue.put(np.ascontiguousarray(img))
+        self.num_frames += 1
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._proc.stdin.close()
+        self._proc.wait()
+        self._proc = None
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
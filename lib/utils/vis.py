@@ -24,7 +24,7 @@ import numpy as np
 from matplotlib import pyplot as plt
 
 from lib.data_utils import kp_utils
-from lib.models.smpl import SMPL, SMPL_MODEL_DIR, get_smpl_faces
+from lib.models.smpl import get_smpl, get_smpl_faces
 from lib.data_utils.img_utils import torch2numpy, torch_vid2numpy, normalize_2d_kp
 
 
@@ -444,7 +444,7 @@ def get_regressor_output(features):
 
     model = Regressor().to(device)
 
-    smpl = SMPL(SMPL_MODEL_DIR).to(device)
+    smpl = get_smpl(device=device)
     pretrained = torch.load('models/model_best.pth.tar')['gen_state_dict']
 
     new_pretrained_dict = {}
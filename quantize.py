@@ -0,0 +1,114 @@
+import os
+import torch
+import argparse
+import numpy as np
+from multi_person_tracker import MPT
+from torch.utils.data import ConcatDataset, DataLoader
+
+from lib.models.spin import hmr
+from lib.core.config import VIBE_DATA_DIR
+from lib.models.quantization import quantize_backbone
+from lib.dataset.inference import Inference, fill_crops
+from lib.utils.demo_utils import run_tracker_on_frames
+from lib.utils.frame_source import get_frame_source, FrameBuffer
+
+MIN_NUM_FRAMES = 25
+
+
+def get_tracklets(video_file, device, args):
+    # same tracklets as demo.py
+    mot = MPT(
+        device=device,
+        batch_size=args.tracker_batch_size,
+        display=False,
+        detector_type=args.detector,
+        output_format='dict',
+        yolo_img_size=args.yolo_img_size,
+    )
+    tracking_results = run_tracker_on_frames(mot, FrameBuffer(get_frame_source(video_file)),
+                                             batch_size=args.tracker_batch_size)
+    return [tracklet for tracklet in tracking_results.values() if tracklet['frames'].shape[0] >= MIN_NUM_FRAMES]
+
+
+def get_calibration_datasets(video_files, device, args):
+    """
+    Crops of `args.num_crops` frames drawn uniformly from all tracklets of all videos.
+    The frames are drawn before cropping, so only the crops used for calibration are
+    kept in memory, however long the videos are.
+    """
+    tracklets = [get_tracklets(video_file, device, args) for video_file in video_files]
+
+    lengths = [tracklet['frames'].shape[0] for video_tracklets in tracklets for tracklet in video_tracklets]
+    if len(lengths) == 0:
+        raise ValueError(f'No tracklet of at least {MIN_NUM_FRAMES} frames found in {video_files}')
+    num_crops = min(args.num_crops, sum(lengths))
+    selected = np.zeros(sum(lengths), dtype=bool)
+    selected[np.random.RandomState(0).choice(sum(lengths), num_crops, replace=False)] = True
+    selected = np.split(selected, np.cumsum(lengths)[:-1])
+
+    datasets = []
+    for video_file, video_tracklets in zip(video_files, tracklets):
+        video_datasets = {}
+        for tracklet in video_tracklets:
+            mask = selected.pop(0)
+            if mask.any():
+                video_datasets[len(video_datasets)] = Inference(
+                    image_folder=None, frames=tracklet['frames'][mask], bboxes=tracklet['bbox'][mask], scale=1.1
+                )
+
+        if len(video_datasets) > 0:
+            fill_crops(FrameBuffer(get_frame_source(video_file)), video_datasets)
+        datasets += video_datasets.values()
+    return datasets
+
+
+def main(args):
+    device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
+
+    datasets = get_calibration_datasets(args.vid_file, device, args)
+    print(f'Calibrating on {sum(len(d) for d in datasets)} crops of {len(datasets)} tracklets')
+
+    calibration_batches = DataLoader(ConcatDataset(datasets), batch_size=args.batch_size, shuffle=True)
+
+    hmr_model = hmr(pretrained=False)
+    checkpoint = torch.load(os.path.join(VIBE_DATA_DIR, 'spin_model_checkpoint.pth.tar'), map_location='cpu')
+    hmr_model.load_state_dict(checkpoint['model'], strict=False)
+
+    model = quantize_backbone(hmr_model, calibration_batches, backend=args.backend)
+
+    os.makedirs(os.path.dirname(args.output_file) or '.', exist_ok=True)
+    torch.save(model.state_dict(), args.output_file)
+    print(f'Saved int8 backbone to {args.output_file}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--vid_file', type=str, nargs='+', required=True,
+                        help='input videos, crops of their tracklets are used for calibration')
+
+    parser.add_argument('--output_file', type=str, default='data/vibe_data/hmr_backbone_int8.pt',
+                        help='output path of the quantized backbone')
+
+    parser.add_argument('--num_crops', type=int, default=1024,
+                        help='number of crops used to calibrate the activation ranges, '
+                             'drawn uniformly from the frames of all tracklets')
+
+    parser.add_argument('--batch_size', type=int, default=32,
+                        help='batch size of the calibration')
+
+    parser.add_argument('--backend', type=str, default='fbgemm', choices=['fbgemm', 'qnnpack'],
+                        help='quantized engine, fbgemm for x86 and qnnpack for arm cpus')
+
+    parser.add_argument('--detector', type=str, default='yolo', choices=['yolo', 'maskrcnn'],
+                        help='object detector to be used for bbox tracking')
+
+    parser.add_argument('--yolo_img_size', type=int, default=416,
+                        help='input image size for yolo detector')
+
+    parser.add_argument('--tracker_batch_size', type=int, default=12,
+                        help='batch size of object detector used for bbox tracking')
+
+    args = parser.parse_args()
+
+    main(args)
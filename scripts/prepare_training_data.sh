@@ -21,3 +21,6 @@ python lib/data_utils/posetrack_utils.py --dir ./data/posetrack
 
 # PennAction
 python lib/data_utils/penn_action_utils.py --dir ./data/penn_action
+
+# Columnar copies of the *_db.pt files, memory mapped by the training datasets
+python lib/data_utils/db_utils.py --db_dir ./data/vibe_db
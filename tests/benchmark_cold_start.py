@@ -0,0 +1,59 @@
+import sys
+sys.path.append('.')
+
+import time
+import argparse
+import subprocess
+
+# every run is a fresh interpreter, imports and model loading are part of the measured time
+EAGER = '''
+import time
+start = time.time()
+import torch
+from lib.models.vibe import VIBE_Demo
+from lib.utils.demo_utils import download_ckpt
+model = VIBE_Demo(seqlen=16, n_layers=2, hidden_size=1024, add_linear=True, use_residual=True).to('{device}')
+ckpt = torch.load(download_ckpt(use_3dpw=False), map_location='{device}')
+model.load_state_dict(ckpt['gen_state_dict'], strict=False)
+model.eval()
+loaded = time.time()
+with torch.no_grad():
+    model(torch.randn({batch_size}, {seqlen}, 3, 224, 224, device='{device}'))[-1]['theta'].cpu()
+print(loaded - start, time.time() - start)
+'''
+
+EXPORTED = '''
+import time
+start = time.time()
+import torch
+from lib.utils.runtime import ExportedVIBE
+model = ExportedVIBE('{model_file}', device='{device}')
+loaded = time.time()
+model(torch.randn({batch_size}, {seqlen}, 3, 224, 224, device='{device}'))['theta'].cpu()
+print(loaded - start, time.time() - start)
+'''
+
+
+def run(code, num_runs):
+    loads, totals = [], []
+    for _ in range(num_runs):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd='.').decode().split()
+        loads.append(float(out[-2]))
+        totals.append(float(out[-1]))
+    return min(loads), min(totals)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_file', type=str, default='data/vibe_data/vibe_demo.pt',
+                        help='model exported by export.py with the same batch size and sequence length')
+    parser.add_argument('--device', type=str, default='cpu')
+    parser.add_argument('--batch_size', type=int, default=2)
+    parser.add_argument('--seqlen', type=int, default=16)
+    parser.add_argument('--num_runs', type=int, default=3)
+    args = parser.parse_args()
+
+    kwargs = dict(device=args.device, batch_size=args.batch_size, seqlen=args.seqlen, model_file=args.model_file)
+    for name, code in [('VIBE_Demo + checkpoints', EAGER), ('exported model', EXPORTED)]:
+        load, total = run(code.format(**kwargs), args.num_runs)
+        print(f'{name}: {load:.2f} s to load, {total:.2f} s to the first result')
@@ -0,0 +1,47 @@
+import sys
+sys.path.append('.')
+
+import time
+import argparse
+import numpy as np
+
+from lib.data_utils import kp_utils
+from lib.data_utils.kp_utils import convert_kps
+
+
+def convert_kps_loop(joints2d, src, dst):
+    # previous implementation, resolves the joint names and fills one joint at a time
+    src_names = eval(f'kp_utils.get_{src}_joint_names')()
+    dst_names = eval(f'kp_utils.get_{dst}_joint_names')()
+
+    out_joints2d = np.zeros((joints2d.shape[0], len(dst_names), 3))
+    for idx, jn in enumerate(dst_names):
+        if jn in src_names:
+            out_joints2d[:, idx] = joints2d[:, src_names.index(jn)]
+    return out_joints2d
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--src', type=str, default='common')
+    parser.add_argument('--dst', type=str, default='spin')
+    parser.add_argument('--seqlen', type=int, default=16)
+    parser.add_argument('--num_iters', type=int, default=10000)
+    args = parser.parse_args()
+
+    num_src_joints = len(eval(f'kp_utils.get_{args.src}_joint_names')())
+    joints2d = np.random.rand(args.seqlen, num_src_joints, 3)
+
+    assert np.array_equal(convert_kps_loop(joints2d, args.src, args.dst), convert_kps(joints2d, args.src, args.dst))
+
+    out = np.empty_like(convert_kps(joints2d, args.src, args.dst, dtype=np.float32))
+    for name, fn in [
+        ('per joint loop', lambda: convert_kps_loop(joints2d, args.src, args.dst)),
+        ('index table', lambda: convert_kps(joints2d, args.src, args.dst)),
+        ('index table, float32 into buffer', lambda: convert_kps(joints2d, args.src, args.dst, out=out)),
+    ]:
+        start = time.time()
+        for _ in range(args.num_iters):
+            fn()
+        elapsed = (time.time() - start) / args.num_iters
+        print(f'{name}: {elapsed * 1e6:.1f} us per sequence of {args.seqlen} frames')
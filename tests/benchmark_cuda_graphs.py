@@ -0,0 +1,69 @@
+import sys
+sys.path.append('.')
+
+import time
+import torch
+import argparse
+import numpy as np
+
+from lib.models.vibe import VIBE, VIBE_Demo
+from lib.models.cuda_graphs import CUDAGraphRunner
+
+
+def latency(fn, input, num_iters):
+    times = []
+    for _ in range(num_iters):
+        torch.cuda.synchronize()
+        start = time.time()
+        fn(input)
+        torch.cuda.synchronize()
+        times.append(time.time() - start)
+    return np.percentile(times, 50) * 1000, np.percentile(times, 99) * 1000
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', type=str, default='vibe_demo', choices=['vibe_demo', 'vibe'],
+                        help='vibe_demo runs on image crops, vibe on precomputed features')
+    parser.add_argument('--batch_size', type=int, default=1)
+    parser.add_argument('--seqlen', type=int, default=16)
+    parser.add_argument('--output', type=str, default='mesh', choices=['theta', 'joints', 'mesh'])
+    parser.add_argument('--precision', type=str, default='fp32', choices=['fp32', 'fp16', 'bf16'])
+    parser.add_argument('--num_iters', type=int, default=100)
+    args = parser.parse_args()
+
+    assert torch.cuda.is_available(), 'this benchmark needs a cuda device'
+    device = torch.device('cuda')
+
+    # weights do not matter for latency, the models use the demo configuration
+    if args.model == 'vibe_demo':
+        model = VIBE_Demo(seqlen=args.seqlen, n_layers=2, hidden_size=1024, add_linear=True, use_residual=True)
+        input_shape = (3, 224, 224)
+    else:
+        model = VIBE(seqlen=args.seqlen, n_layers=2, hidden_size=1024, add_linear=True, use_residual=True)
+        input_shape = (2048,)
+    model = model.to(device).eval()
+    model.set_precision(args.precision)
+
+    input = torch.randn(args.batch_size, args.seqlen, *input_shape, device=device)
+    runner = CUDAGraphRunner(model, shapes=[(args.batch_size, args.seqlen)], output=args.output)
+
+    def eager(x):
+        with torch.no_grad():
+            return model(x, output=args.output)
+
+    expected = eager(input)[-1]
+    graphed = runner(input)[-1]
+    for k, v in expected.items():
+        print(f'{k}: max difference {(graphed[k] - v).abs().max().item():.2e}')
+
+    # a ragged last batch is not captured and runs eagerly
+    if args.batch_size > 1:
+        ragged = runner(input[:-1])[-1]
+        print(f'ragged batch of {args.batch_size - 1}: graphed={runner.is_graphed(input[:-1])}, '
+              f'theta {tuple(ragged["theta"].shape)}')
+
+    for name, fn in [('eager', eager), ('cuda graph', runner)]:
+        fn(input)
+        p50, p99 = latency(fn, input, args.num_iters)
+        print(f'{name}: {p50:.2f} ms median, {p99:.2f} ms p99 per batch of {args.batch_size}x{args.seqlen}')
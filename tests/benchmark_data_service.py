@@ -0,0 +1,69 @@
+import sys
+sys.path.append('.')
+
+import os
+import cv2
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+from torch.utils.data import DataLoader
+
+from lib.dataset.inference import Inference, InferenceDataService
+
+
+def make_image_folder(num_frames, img_size):
+    image_folder = tempfile.mkdtemp()
+    for idx in range(num_frames):
+        img = np.random.randint(0, 255, size=(img_size[1], img_size[0], 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(image_folder, f'{idx + 1:06d}.png'), img)
+    return image_folder
+
+
+def make_tracklets(image_folder, num_frames, num_tracklets, tracklet_len, img_size):
+    datasets = []
+    for _ in range(num_tracklets):
+        start = np.random.randint(0, num_frames - tracklet_len)
+        frames = np.arange(start, start + tracklet_len)
+        bboxes = np.tile(np.array([[img_size[0] / 2, img_size[1] / 2, 200., 200.]]), (tracklet_len, 1))
+        datasets.append(Inference(image_folder=image_folder, frames=frames, bboxes=bboxes, scale=1.1))
+    return datasets
+
+
+def run_dataloader_per_tracklet(datasets, batch_size, num_workers):
+    for dataset in datasets:
+        for batch in DataLoader(dataset, batch_size=batch_size, num_workers=num_workers):
+            pass
+
+
+def run_data_service(datasets, batch_size, num_workers):
+    service = InferenceDataService(batch_size=batch_size, num_workers=num_workers)
+    for dataset in datasets:
+        for batch in service(dataset):
+            pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_frames', type=int, default=100)
+    parser.add_argument('--num_tracklets', type=int, default=30)
+    parser.add_argument('--tracklet_len', type=int, default=30)
+    parser.add_argument('--batch_size', type=int, default=450)
+    parser.add_argument('--num_workers', type=int, default=16)
+    args = parser.parse_args()
+
+    img_size = (640, 480)
+    image_folder = make_image_folder(args.num_frames, img_size)
+    datasets = make_tracklets(image_folder, args.num_frames, args.num_tracklets, args.tracklet_len, img_size)
+
+    for name, fn in [
+        ('DataLoader per tracklet', run_dataloader_per_tracklet),
+        ('InferenceDataService', run_data_service),
+    ]:
+        start = time.time()
+        fn(datasets, args.batch_size, args.num_workers)
+        elapsed = time.time() - start
+        print(f'{name}: {elapsed:.2f}s total, {elapsed / args.num_tracklets * 1000:.1f} ms/tracklet')
+
+    shutil.rmtree(image_folder)
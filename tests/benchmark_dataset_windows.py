@@ -0,0 +1,37 @@
+import sys
+sys.path.append('.')
+
+import time
+import argparse
+import numpy as np
+
+from lib.dataset import *
+
+
+def run(db, num_samples):
+    indices = np.random.randint(0, len(db), size=num_samples)
+    start = time.time()
+    for index in indices:
+        db[index]
+    return num_samples / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', type=str, default='MPII3D')
+    parser.add_argument('--set', type=str, default='train')
+    parser.add_argument('--seqlen', type=int, default=16)
+    parser.add_argument('--num_samples', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.dataset in ('PennAction', 'PoseTrack'):
+        db = eval(args.dataset)(seqlen=args.seqlen)
+    else:
+        db = eval(args.dataset)(set=args.set, seqlen=args.seqlen)
+
+    print(f'on the fly: {run(db, args.num_samples):.1f} samples/s')
+
+    start = time.time()
+    db.precompute_targets()
+    print(f'precomputing targets: {time.time() - start:.2f} s')
+    print(f'precomputed: {run(db, args.num_samples):.1f} samples/s')
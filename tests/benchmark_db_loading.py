@@ -0,0 +1,60 @@
+import sys
+sys.path.append('.')
+
+import time
+import joblib
+import argparse
+import numpy as np
+import os.path as osp
+import multiprocessing
+
+from lib.core.config import VIBE_DB_DIR
+from lib.data_utils.db_utils import load_db, convert_db, get_columnar_dir
+
+
+def memory_usage():
+    # Pss splits shared pages between the processes mapping them, Rss counts them in every process
+    usage = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key = line.split(':')[0]
+            if key in ('Rss', 'Pss'):
+                usage[key] = int(line.split()[1]) / 1024.
+    return usage
+
+
+def worker(args):
+    db_file, mmap = args
+    start = time.time()
+    db = joblib.load(db_file) if not mmap else load_db(db_file)
+    load_time = time.time() - start
+
+    # touch every feature once, as an epoch over the dataset does
+    total = 0.
+    for i in range(0, len(db['features']), 1024):
+        total += float(np.asarray(db['features'][i:i + 1024]).sum())
+
+    return load_time, memory_usage()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db_file', type=str, default=osp.join(VIBE_DB_DIR, '3dpw_test_db.pt'))
+    parser.add_argument('--num_workers', type=int, default=8)
+    args = parser.parse_args()
+
+    if not osp.isdir(get_columnar_dir(args.db_file)):
+        convert_db(args.db_file)
+
+    for name, mmap in [('joblib', False), ('memory mapped', True)]:
+        start = time.time()
+        # fork, as the DataLoader workers
+        with multiprocessing.get_context('fork').Pool(args.num_workers) as pool:
+            results = pool.map(worker, [(args.db_file, mmap)] * args.num_workers)
+        total_time = time.time() - start
+
+        load_time = max(r[0] for r in results)
+        rss = sum(r[1]['Rss'] for r in results)
+        pss = sum(r[1]['Pss'] for r in results)
+        print(f'{name}: {args.num_workers} workers, load {load_time:.2f} s, epoch {total_time:.2f} s, '
+              f'rss {rss:.0f} MB, pss {pss:.0f} MB')
@@ -0,0 +1,59 @@
+import sys
+sys.path.append('.')
+
+import time
+import torch
+import argparse
+import numpy as np
+
+from lib.data_utils.img_utils import get_image_crops_demo, get_image_crops_torch, convert_cvimgs_to_tensor
+
+
+def crop_cv2(frames, bboxes, device):
+    crops = []
+    for img, frame_bboxes in zip(frames, bboxes):
+        c, _ = get_image_crops_demo(img, frame_bboxes, scale=1.1)
+        crops.append(c[..., ::-1])
+    return convert_cvimgs_to_tensor(np.concatenate(crops), device)
+
+
+def crop_torch(frames, bboxes, device):
+    images = torch.from_numpy(np.stack(frames)).to(device)
+    frame_idx = np.repeat(np.arange(len(frames)), [len(b) for b in bboxes])
+    return get_image_crops_torch(images, frame_idx, np.concatenate(bboxes), scale=1.1)
+
+
+def synchronize(device):
+    if str(device).startswith('cuda'):
+        torch.cuda.synchronize()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_frames', type=int, default=32)
+    parser.add_argument('--num_people', type=int, default=4)
+    parser.add_argument('--num_iters', type=int, default=10)
+    args = parser.parse_args()
+
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    height, width = 1080, 1920
+    frames = [np.random.randint(0, 255, size=(height, width, 3), dtype=np.uint8) for _ in range(args.num_frames)]
+    bboxes = [
+        np.concatenate([np.random.rand(args.num_people, 2) * [width, height],
+                        np.random.rand(args.num_people, 2) * 300 + 100], axis=1)
+        for _ in range(args.num_frames)
+    ]
+
+    error = (crop_cv2(frames, bboxes, device) - crop_torch(frames, bboxes, device)).abs()
+    # differences come from the fixed point interpolation and uint8 rounding of cv2
+    print(f'max difference: {error.max().item():.3f}, mean difference: {error.mean().item():.4f}')
+
+    num_crops = args.num_frames * args.num_people
+    for name, fn in [('cv2 + convert', crop_cv2), (f'grid_sample on {device}', crop_torch)]:
+        synchronize(device)
+        start = time.time()
+        for _ in range(args.num_iters):
+            fn(frames, bboxes, device)
+        synchronize(device)
+        elapsed = (time.time() - start) / args.num_iters
+        print(f'{name}: {num_crops / elapsed:.1f} crops/s')
@@ -0,0 +1,64 @@
+import sys
+sys.path.append('.')
+
+import time
+import h5py
+import torch
+import argparse
+import numpy as np
+from torch.utils.data import DataLoader, BatchSampler, RandomSampler
+
+from lib.dataset.insta import Insta
+from lib.data_utils.kp_utils import convert_kps
+from lib.data_utils.img_utils import normalize_2d_kp
+
+
+class InstaReopen(Insta):
+    # previous implementation, opens the file for every sample
+    def get_single_item(self, index):
+        start_index, end_index = self.vid_indices[index]
+
+        with h5py.File(self.h5_file, 'r') as db:
+            kp_2d = db['joints2D'][start_index:end_index + 1]
+            kp_2d = convert_kps(kp_2d, src='insta', dst='spin')
+            input = torch.from_numpy(db['features'][start_index:end_index + 1]).float()
+
+        kp_2d_tensor = np.ones((self.seqlen, 49, 3), dtype=np.float16)
+        for idx in range(self.seqlen):
+            kp_2d[idx, :, :2] = normalize_2d_kp(kp_2d[idx, :, :2], 224)
+            kp_2d_tensor[idx] = kp_2d[idx]
+
+        return {'features': input, 'kp_2d': torch.from_numpy(kp_2d_tensor).float()}
+
+
+def run(loader, num_batches):
+    start = time.time()
+    num_samples = 0
+    for idx, batch in enumerate(loader):
+        num_samples += len(batch['features'])
+        if idx + 1 == num_batches:
+            break
+    return num_samples / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seqlen', type=int, default=16)
+    parser.add_argument('--batch_size', type=int, default=16)
+    parser.add_argument('--num_workers', type=int, default=8)
+    parser.add_argument('--num_batches', type=int, default=200)
+    args = parser.parse_args()
+
+    for name, db_cls, batched in [
+        ('open per sample', InstaReopen, False),
+        ('persistent handle', Insta, False),
+        ('persistent handle, batched reads', Insta, True),
+    ]:
+        db = db_cls(seqlen=args.seqlen)
+        if batched:
+            loader = DataLoader(db, batch_size=None, num_workers=args.num_workers,
+                                sampler=BatchSampler(RandomSampler(db), args.batch_size, drop_last=False))
+        else:
+            loader = DataLoader(db, batch_size=args.batch_size, shuffle=True, num_workers=args.num_workers)
+
+        print(f'{name}: {run(loader, args.num_batches):.1f} samples/s')
@@ -0,0 +1,61 @@
+import sys
+sys.path.append('.')
+
+import cv2
+import time
+import argparse
+import numpy as np
+
+from lib.data_utils.img_utils import rotate_2d, trans_point2d, transfrom_keypoints_batch
+
+
+def gen_trans_from_patch_cv_old(c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot):
+    # previous implementation, solves for the affine matrix with cv2 for every frame
+    src_w, src_h = src_width * scale, src_height * scale
+    src_center = np.array([c_x, c_y], dtype=np.float32)
+    rot_rad = np.pi * rot / 180
+    src_downdir = rotate_2d(np.array([0, src_h * 0.5], dtype=np.float32), rot_rad)
+    src_rightdir = rotate_2d(np.array([src_w * 0.5, 0], dtype=np.float32), rot_rad)
+
+    dst_center = np.array([dst_width * 0.5, dst_height * 0.5], dtype=np.float32)
+    dst_downdir = np.array([0, dst_height * 0.5], dtype=np.float32)
+    dst_rightdir = np.array([dst_width * 0.5, 0], dtype=np.float32)
+
+    src = np.stack([src_center, src_center + src_downdir, src_center + src_rightdir]).astype(np.float32)
+    dst = np.stack([dst_center, dst_center + dst_downdir, dst_center + dst_rightdir]).astype(np.float32)
+    return cv2.getAffineTransform(src, dst)
+
+
+def transform_loop(kp_2d, bbox):
+    kp_2d = kp_2d.copy()
+    for idx in range(kp_2d.shape[0]):
+        trans = gen_trans_from_patch_cv_old(bbox[idx, 0], bbox[idx, 1], bbox[idx, 2], bbox[idx, 3], 224, 224, 1.2, 0)
+        for n_jt in range(kp_2d.shape[1]):
+            kp_2d[idx, n_jt] = trans_point2d(kp_2d[idx, n_jt], trans)
+    return kp_2d
+
+
+def transform_batch(kp_2d, bbox):
+    kp_2d, _ = transfrom_keypoints_batch(kp_2d, bbox[:, 0], bbox[:, 1], bbox[:, 2], bbox[:, 3], 224, 224, False)
+    return kp_2d
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seqlen', type=int, default=16)
+    parser.add_argument('--num_joints', type=int, default=49)
+    parser.add_argument('--num_iters', type=int, default=1000)
+    args = parser.parse_args()
+
+    kp_2d = np.random.rand(args.seqlen, args.num_joints, 2).astype(np.float32) * 1000
+    bbox = np.concatenate([np.random.rand(args.seqlen, 2) * 1000, np.full((args.seqlen, 2), 300.)], axis=1)
+
+    error = np.abs(transform_loop(kp_2d, bbox) - transform_batch(kp_2d, bbox)).max()
+    print(f'max difference: {error:.2e} px')
+
+    for name, fn in [('per frame loop', transform_loop), ('batched', transform_batch)]:
+        start = time.time()
+        for _ in range(args.num_iters):
+            fn(kp_2d, bbox)
+        elapsed = (time.time() - start) / args.num_iters
+        print(f'{name}: {elapsed * 1e6:.1f} us per sequence of {args.seqlen} frames')
@@ -0,0 +1,54 @@
+import sys
+sys.path.append('.')
+
+import os
+import time
+import torch
+from torch.utils.data import DataLoader
+
+from lib.models import VIBE
+from lib.dataset import ThreeDPW
+from lib.core.evaluate import Evaluator
+from lib.core.config import parse_args
+
+
+if __name__ == '__main__':
+    # same config and checkpoint as eval.py, e.g. --cfg configs/config.yaml
+    cfg, cfg_file = parse_args()
+
+    model = VIBE(
+        n_layers=cfg.MODEL.TGRU.NUM_LAYERS,
+        batch_size=cfg.TRAIN.BATCH_SIZE,
+        seqlen=cfg.DATASET.SEQLEN,
+        hidden_size=cfg.MODEL.TGRU.HIDDEN_SIZE,
+        pretrained=cfg.TRAIN.PRETRAINED_REGRESSOR,
+        add_linear=cfg.MODEL.TGRU.ADD_LINEAR,
+        bidirectional=cfg.MODEL.TGRU.BIDIRECTIONAL,
+        use_residual=cfg.MODEL.TGRU.RESIDUAL,
+    ).to(cfg.DEVICE)
+
+    assert os.path.isfile(cfg.TRAIN.PRETRAINED), f'{cfg.TRAIN.PRETRAINED} is not a pretrained model'
+    model.load_state_dict(torch.load(cfg.TRAIN.PRETRAINED)['gen_state_dict'])
+
+    test_db = ThreeDPW(set='test', seqlen=cfg.DATASET.SEQLEN, debug=cfg.DEBUG)
+    test_loader = DataLoader(test_db, batch_size=cfg.TRAIN.BATCH_SIZE, shuffle=False, num_workers=cfg.NUM_WORKERS)
+
+    report = []
+    for precision in ['fp32', 'fp16', 'bf16']:
+        model.set_precision(precision)
+        if model.precision != precision:
+            continue
+
+        evaluator = Evaluator(model=model, device=cfg.DEVICE, test_loader=test_loader)
+        start = time.time()
+        evaluator.validate()
+        if str(cfg.DEVICE).startswith('cuda'):
+            torch.cuda.synchronize()
+        elapsed = time.time() - start
+
+        report.append((precision, elapsed, evaluator.evaluate()))
+
+    print()
+    for precision, elapsed, eval_dict in report:
+        errors = ' '.join([f'{k.upper()}: {v:.2f}' for k, v in eval_dict.items()])
+        print(f'{precision}: {len(test_db) / elapsed:.1f} sequences/s, {errors}')
@@ -0,0 +1,89 @@
+import sys
+sys.path.append('.')
+
+import os
+import time
+import torch
+import argparse
+from torch.utils.data import Dataset, DataLoader, Subset
+
+from lib.models import VIBE
+from lib.models.spin import hmr
+from lib.dataset import ThreeDPW
+from lib.core.evaluate import Evaluator
+from lib.core.config import update_cfg, get_cfg_defaults, VIBE_DATA_DIR
+from lib.models.quantization import load_quantized_backbone
+
+
+class BackboneFeatures(Dataset):
+    # replaces the stored 3dpw features by the features `backbone` computes from the 3dpw crops
+    def __init__(self, db, backbone):
+        self.db = db
+        self.backbone = backbone
+
+    def __len__(self):
+        return len(self.db)
+
+    def __getitem__(self, index):
+        target = self.db[index]
+        with torch.no_grad():
+            target['features'] = self.backbone(target.pop('video'))
+        return target
+
+
+def crops_per_second(backbone, batch_size, num_iters=10):
+    images = torch.randn(batch_size, 3, 224, 224)
+    with torch.no_grad():
+        backbone(images)
+        start = time.time()
+        for _ in range(num_iters):
+            backbone(images)
+    return batch_size * num_iters / (time.time() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cfg', type=str, help='cfg file path, as for eval.py')
+    parser.add_argument('--quantized_backbone', type=str, required=True, help='int8 backbone saved by quantize.py')
+    parser.add_argument('--num_sequences', type=int, default=200, help='number of 3dpw test sequences to evaluate')
+    parser.add_argument('--batch_size', type=int, default=32)
+    args = parser.parse_args()
+
+    cfg = update_cfg(args.cfg) if args.cfg is not None else get_cfg_defaults()
+    torch.set_grad_enabled(False)
+
+    model = VIBE(
+        n_layers=cfg.MODEL.TGRU.NUM_LAYERS,
+        batch_size=cfg.TRAIN.BATCH_SIZE,
+        seqlen=cfg.DATASET.SEQLEN,
+        hidden_size=cfg.MODEL.TGRU.HIDDEN_SIZE,
+        pretrained=cfg.TRAIN.PRETRAINED_REGRESSOR,
+        add_linear=cfg.MODEL.TGRU.ADD_LINEAR,
+        bidirectional=cfg.MODEL.TGRU.BIDIRECTIONAL,
+        use_residual=cfg.MODEL.TGRU.RESIDUAL,
+    )
+    assert os.path.isfile(cfg.TRAIN.PRETRAINED), f'{cfg.TRAIN.PRETRAINED} is not a pretrained model'
+    model.load_state_dict(torch.load(cfg.TRAIN.PRETRAINED, map_location='cpu')['gen_state_dict'])
+
+    fp32_backbone = hmr(pretrained=False)
+    checkpoint = torch.load(os.path.join(VIBE_DATA_DIR, 'spin_model_checkpoint.pth.tar'), map_location='cpu')
+    fp32_backbone.load_state_dict(checkpoint['model'], strict=False)
+    fp32_backbone.eval()
+
+    backbones = {
+        'fp32': fp32_backbone.feature_extractor,
+        'int8': load_quantized_backbone(args.quantized_backbone),
+    }
+
+    # debug mode returns the crops of every sequence
+    test_db = ThreeDPW(set='test', seqlen=cfg.DATASET.SEQLEN, debug=True)
+    test_db = Subset(test_db, list(range(min(args.num_sequences, len(test_db)))))
+
+    for name, backbone in backbones.items():
+        test_loader = DataLoader(BackboneFeatures(test_db, backbone), batch_size=args.batch_size, shuffle=False)
+        evaluator = Evaluator(model=model, device='cpu', test_loader=test_loader)
+        evaluator.validate()
+        eval_dict = evaluator.evaluate()
+
+        print(f'{name}: {crops_per_second(backbone, args.batch_size):.1f} crops/s, '
+              f'MPJPE: {eval_dict["mpjpe"]:.2f}, PA-MPJPE: {eval_dict["pa-mpjpe"]:.2f}')
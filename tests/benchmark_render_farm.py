@@ -0,0 +1,94 @@
+import os
+os.environ['PYOPENGL_PLATFORM'] = 'egl'
+
+import sys
+sys.path.append('.')
+
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+import numpy as np
+from collections import OrderedDict
+
+from lib.models.smpl import get_smpl
+from lib.utils.renderer import Renderer
+from lib.utils.video_writer import FFmpegVideoWriter
+from lib.utils.frame_source import get_frame_source
+from lib.utils.render_farm import render_frame, render_video_sharded
+
+
+def make_video(video_file, num_frames, img_size, gop=25):
+    # a keyframe every second, like typical camera footage, so shards can seek to their range
+    subprocess.check_call([
+        'ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc2=size={img_size[0]}x{img_size[1]}:rate=25',
+        '-frames:v', str(num_frames), '-c:v', 'libx264', '-g', str(gop), '-pix_fmt', 'yuv420p', video_file,
+    ])
+
+
+def decode_shards(frame_source, num_frames, num_workers):
+    # total decoding work of all shards, the part of a worker that does not shrink with more
+    # workers if every shard has to decode the video from its beginning
+    bounds = np.linspace(0, num_frames, num_workers + 1).astype(int)
+    start_time = time.time()
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        for _ in frame_source.frame_range(int(start), int(end)):
+            pass
+    return time.time() - start_time
+
+
+def make_frame_results(num_frames, num_people):
+    verts = get_smpl().v_template.numpy()
+    frame_results = []
+    for _ in range(num_frames):
+        frame_results.append(OrderedDict(
+            (person_id, {'verts': verts, 'cam': np.array([0.5, 0.5, (person_id - num_people / 2) * 0.5, 0.])})
+            for person_id in range(num_people)
+        ))
+    return frame_results
+
+
+def render_single_process(frame_source, frame_results, output_file, mesh_color):
+    renderer = Renderer(resolution=(frame_source.width, frame_source.height), orig_img=True)
+    with FFmpegVideoWriter(output_file) as writer:
+        for frame_idx, img in enumerate(frame_source):
+            writer.write(render_frame(renderer, img, frame_results[frame_idx], mesh_color))
+    return writer.num_frames
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_frames', type=int, default=240)
+    parser.add_argument('--num_people', type=int, default=3)
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    args = parser.parse_args()
+
+    img_size = (1280, 720)
+    folder = tempfile.mkdtemp()
+    video_file = os.path.join(folder, 'input.mp4')
+    make_video(video_file, args.num_frames, img_size)
+
+    frame_source = get_frame_source(video_file)
+    frame_results = make_frame_results(len(frame_source), args.num_people)
+    mesh_color = {k: (1.0, 1.0, 0.9) for k in range(args.num_people)}
+
+    decode_time = decode_shards(frame_source, len(frame_source), 1)
+    for num_workers in args.workers:
+        shards_time = decode_shards(frame_source, len(frame_source), num_workers)
+        print(f'decoding {num_workers} shards: {shards_time:.2f} s in total, '
+              f'{shards_time / decode_time:.2f}x the work of decoding the video once')
+
+    start = time.time()
+    num_frames = render_single_process(frame_source, frame_results, os.path.join(folder, 'single.mp4'), mesh_color)
+    base_fps = num_frames / (time.time() - start)
+    print(f'1 process: {base_fps:.2f} fps')
+
+    for num_workers in args.workers:
+        start = time.time()
+        num_frames = render_video_sharded(frame_source, frame_results, os.path.join(folder, f'{num_workers}.mp4'),
+                                          mesh_color, num_workers=num_workers)
+        fps = num_frames / (time.time() - start)
+        print(f'{num_workers} processes: {fps:.2f} fps, {fps / base_fps:.2f}x')
+
+    shutil.rmtree(folder)
@@ -0,0 +1,69 @@
+import sys
+sys.path.append('.')
+
+import time
+import argparse
+import numpy as np
+from collections import OrderedDict
+
+from lib.utils.demo_utils import prepare_rendering_results
+
+
+def prepare_rendering_results_dicts(vibe_results, nframes):
+    # previous implementation, a list of per frame dicts
+    frame_results = [{} for _ in range(nframes)]
+    for person_id, person_data in vibe_results.items():
+        for idx, frame_id in enumerate(person_data['frame_ids']):
+            frame_results[frame_id][person_id] = {
+                'verts': person_data['verts'][idx],
+                'cam': person_data['orig_cam'][idx],
+            }
+
+    for frame_id, frame_data in enumerate(frame_results):
+        sort_idx = np.argsort([v['cam'][1] for k,v in frame_data.items()])
+        frame_results[frame_id] = OrderedDict(
+            {list(frame_data.keys())[i]:frame_data[list(frame_data.keys())[i]] for i in sort_idx}
+        )
+
+    return frame_results
+
+
+def make_vibe_results(num_frames, num_people, num_verts):
+    vibe_results = {}
+    for person_id in range(num_people):
+        start = np.random.randint(0, num_frames // 2)
+        frame_ids = np.arange(start, np.random.randint(start + 1, num_frames + 1))
+        vibe_results[person_id] = {
+            'frame_ids': frame_ids,
+            'verts': np.zeros((len(frame_ids), num_verts, 3), dtype=np.float32),
+            'orig_cam': np.random.rand(len(frame_ids), 4).astype(np.float32),
+        }
+    return vibe_results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--num_frames', type=int, default=10000)
+    parser.add_argument('--num_people', type=int, default=100)
+    # vertices do not matter for the index, keep the benchmark light on memory
+    parser.add_argument('--num_verts', type=int, default=1)
+    args = parser.parse_args()
+
+    vibe_results = make_vibe_results(args.num_frames, args.num_people, args.num_verts)
+    num_rows = sum(len(v['frame_ids']) for v in vibe_results.values())
+
+    for name, fn in [
+        ('list of dicts', prepare_rendering_results_dicts),
+        ('frame results table', prepare_rendering_results),
+    ]:
+        start = time.time()
+        frame_results = fn(vibe_results, args.num_frames)
+        build_time = time.time() - start
+
+        start = time.time()
+        for frame_id in range(args.num_frames):
+            frame_results[frame_id]
+        lookup_time = time.time() - start
+
+        print(f'{name}: {num_rows} rows, build {build_time * 1000:.1f} ms, '
+              f'lookup {lookup_time / args.num_frames * 1e6:.1f} us/frame')
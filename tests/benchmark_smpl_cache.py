@@ -0,0 +1,25 @@
+import sys
+sys.path.append('.')
+
+import time
+
+start = time.time()
+from lib.models.smpl import SMPL, SMPL_MODEL_DIR, get_smpl, get_smpl_faces
+import_time = time.time() - start
+
+
+def timeit(name, fn, num_iters=1):
+    start = time.time()
+    for _ in range(num_iters):
+        fn()
+    print(f'{name}: {(time.time() - start) / num_iters * 1000:.2f} ms')
+
+
+if __name__ == '__main__':
+    print(f'import lib.models.smpl: {import_time * 1000:.2f} ms')
+
+    timeit('first SMPL(), parses the model file', lambda: SMPL(SMPL_MODEL_DIR, batch_size=64, create_transl=False))
+    timeit('SMPL() with cached model file', lambda: SMPL(SMPL_MODEL_DIR, batch_size=64, create_transl=False), 10)
+    timeit('first get_smpl()', lambda: get_smpl())
+    timeit('get_smpl()', lambda: get_smpl(), 1000)
+    timeit('get_smpl_faces()', lambda: get_smpl_faces(), 1000)
@@ -0,0 +1,69 @@
+import sys
+sys.path.append('.')
+
+import time
+import torch
+import argparse
+import numpy as np
+import os.path as osp
+
+from lib.core.config import VIBE_DATA_DIR
+from lib.models.smpl import SMPL, SMPL_MODEL_DIR
+
+
+def timeit(fn, device, num_iters):
+    fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    start = time.time()
+    for _ in range(num_iters):
+        fn()
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+    return (time.time() - start) / num_iters * 1000
+
+
+def full_joints(smpl, pose, betas, J_regressor=None):
+    output = smpl(betas=betas, body_pose=pose[:, 3:], global_orient=pose[:, :3], pose2rot=True)
+    if J_regressor is None:
+        return output.joints
+    return torch.matmul(J_regressor[None], output.vertices)
+
+
+def sparse_joints(smpl, pose, betas, J_regressor=None):
+    return smpl.forward_joints(betas=betas, body_pose=pose[:, 3:], global_orient=pose[:, :3],
+                               pose2rot=True, J_regressor=J_regressor).joints
+
+
+@torch.no_grad()
+def run(device, batch_size, num_iters):
+    smpl = SMPL(SMPL_MODEL_DIR, batch_size=batch_size, create_transl=False).to(device)
+    J_regressor_h36m = torch.from_numpy(np.load(osp.join(VIBE_DATA_DIR, 'J_regressor_h36m.npy'))).float().to(device)
+
+    pose = (torch.rand(batch_size, 72, device=device) - 0.5) * 0.5
+    betas = torch.randn(batch_size, 10, device=device)
+
+    for name, J_regressor in [('49 joints', None), ('H36M joints', J_regressor_h36m)]:
+        num_verts = smpl.get_joint_support(J_regressor)['vertex_ids'].shape[0]
+        error = (full_joints(smpl, pose, betas, J_regressor) - sparse_joints(smpl, pose, betas, J_regressor)).abs().max()
+
+        full_time = timeit(lambda: full_joints(smpl, pose, betas, J_regressor), device, num_iters)
+        sparse_time = timeit(lambda: sparse_joints(smpl, pose, betas, J_regressor), device, num_iters)
+
+        print(f'{device.type} | {name} | batch {batch_size} | skinned verts {num_verts}/6890 | '
+              f'full {full_time:.2f} ms | joints only {sparse_time:.2f} ms | '
+              f'speedup {full_time / sparse_time:.1f}x | max error {error:.2e}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, default=256)
+    parser.add_argument('--num_iters', type=int, default=20)
+    args = parser.parse_args()
+
+    devices = [torch.device('cpu')]
+    if torch.cuda.is_available():
+        devices.append(torch.device('cuda'))
+
+    for device in devices:
+        run(device, args.batch_size, args.num_iters)
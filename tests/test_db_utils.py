@@ -0,0 +1,26 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import numpy as np
+
+h5py = pytest.importorskip('h5py')
+
+from lib.data_utils.db_utils import read_hdf5_rows
+
+
+@pytest.mark.parametrize('rows', [
+    [0],
+    [3, 4, 5, 6],
+    [0, 1, 2, 10, 11, 30, 99],
+    list(range(0, 100, 2)),
+])
+def test_read_hdf5_rows_matches_point_selection(tmp_path, rows):
+    data = np.random.rand(100, 4, 3).astype(np.float32)
+    with h5py.File(str(tmp_path / 'db.h5'), 'w') as f:
+        f.create_dataset('features', data=data, chunks=(16, 4, 3))
+
+    with h5py.File(str(tmp_path / 'db.h5'), 'r') as f:
+        rows = np.array(rows)
+        np.testing.assert_array_equal(read_hdf5_rows(f['features'], rows), f['features'][rows])
+        np.testing.assert_array_equal(read_hdf5_rows(f['features'], rows), data[rows])
@@ -0,0 +1,81 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import numpy as np
+from collections import OrderedDict
+
+pytest.importorskip('torch')
+pytest.importorskip('cv2')
+
+from lib.utils.demo_utils import prepare_rendering_results
+
+
+def prepare_rendering_results_dicts(vibe_results, nframes):
+    # previous implementation, a list of per frame dicts
+    frame_results = [{} for _ in range(nframes)]
+    for person_id, person_data in vibe_results.items():
+        for idx, frame_id in enumerate(person_data['frame_ids']):
+            frame_results[frame_id][person_id] = {
+                'verts': person_data['verts'][idx],
+                'cam': person_data['orig_cam'][idx],
+            }
+
+    for frame_id, frame_data in enumerate(frame_results):
+        sort_idx = np.argsort([v['cam'][1] for k,v in frame_data.items()])
+        frame_results[frame_id] = OrderedDict(
+            {list(frame_data.keys())[i]:frame_data[list(frame_data.keys())[i]] for i in sort_idx}
+        )
+
+    return frame_results
+
+
+def make_vibe_results(num_frames, num_people, seed=0):
+    rng = np.random.RandomState(seed)
+    vibe_results = {}
+    for person_id in range(1, num_people + 1):
+        start = rng.randint(0, num_frames // 2)
+        frame_ids = np.arange(start, rng.randint(start + 1, num_frames + 1))
+        vibe_results[person_id] = {
+            'frame_ids': frame_ids,
+            'verts': rng.rand(len(frame_ids), 5, 3).astype(np.float32),
+            'orig_cam': rng.rand(len(frame_ids), 4).astype(np.float32),
+        }
+    return vibe_results
+
+
+def assert_same_frame(frame, expected):
+    assert list(frame.keys()) == list(expected.keys())
+    for person_id, data in expected.items():
+        np.testing.assert_array_equal(frame[person_id]['verts'], data['verts'])
+        np.testing.assert_array_equal(frame[person_id]['cam'], data['cam'])
+
+
+@pytest.mark.parametrize('num_frames, num_people', [(1, 1), (20, 1), (50, 6)])
+def test_frame_results_table_matches_dicts(num_frames, num_people):
+    vibe_results = make_vibe_results(num_frames, num_people)
+    expected = prepare_rendering_results_dicts(vibe_results, num_frames)
+    table = prepare_rendering_results(vibe_results, num_frames)
+
+    assert len(table) == num_frames
+    for frame_id in range(num_frames):
+        assert_same_frame(table[frame_id], expected[frame_id])
+    for frame, expected_frame in zip(table, expected):
+        assert_same_frame(frame, expected_frame)
+
+
+def test_frame_results_table_slice():
+    vibe_results = make_vibe_results(50, 6, seed=1)
+    expected = prepare_rendering_results_dicts(vibe_results, 50)
+    table = prepare_rendering_results(vibe_results, 50)
+
+    part = table[10:30]
+    assert len(part) == 20
+    for frame_id in range(20):
+        assert_same_frame(part[frame_id], expected[10 + frame_id])
+
+
+def test_frame_results_table_empty():
+    table = prepare_rendering_results({}, 3)
+    assert len(table) == 3
+    assert [len(frame) for frame in table] == [0, 0, 0]
@@ -0,0 +1,113 @@
+import sys
+sys.path.append('.')
+
+import shutil
+import pytest
+import subprocess
+import numpy as np
+
+cv2 = pytest.importorskip('cv2')
+
+from lib.utils.frame_source import get_frame_source, probe_rotation
+
+if shutil.which('ffmpeg') is None or shutil.which('ffprobe') is None:
+    pytest.skip('ffmpeg is not installed', allow_module_level=True)
+
+NUM_FRAMES = 20
+WIDTH, HEIGHT = 160, 120
+BACKENDS = ['ffmpeg', 'pyav', 'opencv']
+
+
+def make_clip(path, *options):
+    subprocess.check_call([
+        'ffmpeg', '-y', '-v', 'error', *options, '-f', 'lavfi',
+        '-i', f'testsrc=size={WIDTH}x{HEIGHT}:rate=25', '-frames:v', str(NUM_FRAMES),
+        '-c:v', 'mpeg4', '-q:v', '2', '-pix_fmt', 'yuv420p', str(path),
+    ])
+    return str(path)
+
+
+def read_opencv(vid_file):
+    cap = cv2.VideoCapture(vid_file)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def check_backend(vid_file, backend):
+    if backend == 'pyav':
+        pytest.importorskip('av')
+
+    expected = read_opencv(vid_file)
+    source = get_frame_source(vid_file, backend=backend)
+    frames = list(source)
+
+    assert len(source) == len(frames) == len(expected)
+    assert source.img_shape == expected[0].shape
+    for frame, expected_frame in zip(frames, expected):
+        assert frame.shape == expected_frame.shape
+        assert frame.dtype == np.uint8
+        assert frame.flags.writeable
+        # decoders may convert yuv to bgr with slightly different rounding
+        assert np.abs(frame.astype(np.int32) - expected_frame.astype(np.int32)).mean() < 2.
+
+    # frames can be drawn on in place, e.g. by the --display overlays
+    cv2.rectangle(frames[0], (0, 0), (10, 10), (0, 255, 0), 2)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_frame_sources_match_opencv(tmp_path, backend):
+    check_backend(make_clip(tmp_path / 'clip.mp4'), backend)
+
+
+@pytest.fixture
+def rotated_clip(tmp_path):
+    clip = make_clip(tmp_path / 'clip.mp4')
+    rotated = str(tmp_path / 'rotated.mp4')
+    # rotate tag of ffmpeg < 6, display matrix option of newer versions
+    for command in [
+        ['ffmpeg', '-y', '-v', 'error', '-i', clip, '-c', 'copy', '-metadata:s:v:0', 'rotate=90', rotated],
+        ['ffmpeg', '-y', '-v', 'error', '-display_rotation', '-90', '-i', clip, '-c', 'copy', rotated],
+    ]:
+        if subprocess.call(command) == 0 and probe_rotation(rotated) == 90:
+            return rotated
+    pytest.skip('ffmpeg can not write rotation metadata')
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_rotated_frame_sources(rotated_clip, backend):
+    if backend == 'pyav':
+        pytest.importorskip('av')
+
+    source = get_frame_source(rotated_clip, backend=backend)
+    frames = list(source)
+    assert len(frames) == NUM_FRAMES
+    assert source.img_shape == (WIDTH, HEIGHT, 3)
+    assert all(frame.shape == (WIDTH, HEIGHT, 3) for frame in frames)
+
+    if read_opencv(rotated_clip)[0].shape == (WIDTH, HEIGHT, 3):
+        # this opencv version applies the rotation as well
+        check_backend(rotated_clip, backend)
+
+
+@pytest.mark.parametrize('start, end', [(0, 5), (1, 2), (7, 13), (12, NUM_FRAMES)])
+def test_ffmpeg_frame_range_seeks_to_the_exact_frame(tmp_path, start, end):
+    # keyframes every 5 frames, so most ranges start between two keyframes
+    clip = str(tmp_path / 'clip.mp4')
+    subprocess.check_call([
+        'ffmpeg', '-y', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc=size={WIDTH}x{HEIGHT}:rate=25',
+        '-frames:v', str(NUM_FRAMES), '-c:v', 'mpeg4', '-q:v', '2', '-g', '5', '-pix_fmt', 'yuv420p', clip,
+    ])
+
+    source = get_frame_source(clip, backend='ffmpeg')
+    expected = list(source)[start:end]
+    frames = list(source.frame_range(start, end))
+
+    assert len(frames) == len(expected)
+    for frame, expected_frame in zip(frames, expected):
+        np.testing.assert_array_equal(frame, expected_frame)
@@ -0,0 +1,116 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import numpy as np
+
+cv2 = pytest.importorskip('cv2')
+pytest.importorskip('torchvision')
+pytest.importorskip('skimage')
+
+from lib.data_utils.img_utils import (
+    rotate_2d, trans_point2d, gen_trans_from_patch_cv, gen_trans_from_patch_batch, transfrom_keypoints,
+    transfrom_keypoints_batch,
+)
+
+
+def gen_trans_from_patch_cv_ref(c_x, c_y, src_width, src_height, dst_width, dst_height, scale, rot, inv=False):
+    # previous implementation, solves for the affine matrix with cv2
+    src_w, src_h = src_width * scale, src_height * scale
+    src_center = np.array([c_x, c_y], dtype=np.float32)
+    rot_rad = np.pi * rot / 180
+    src_downdir = rotate_2d(np.array([0, src_h * 0.5], dtype=np.float32), rot_rad)
+    src_rightdir = rotate_2d(np.array([src_w * 0.5, 0], dtype=np.float32), rot_rad)
+
+    dst_center = np.array([dst_width * 0.5, dst_height * 0.5], dtype=np.float32)
+    dst_downdir = np.array([0, dst_height * 0.5], dtype=np.float32)
+    dst_rightdir = np.array([dst_width * 0.5, 0], dtype=np.float32)
+
+    src = np.stack([src_center, src_center + src_downdir, src_center + src_rightdir]).astype(np.float32)
+    dst = np.stack([dst_center, dst_center + dst_downdir, dst_center + dst_rightdir]).astype(np.float32)
+
+    if inv:
+        return cv2.getAffineTransform(dst, src)
+    return cv2.getAffineTransform(src, dst)
+
+
+def random_patches(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return (
+        rng.rand(n) * 1000, rng.rand(n) * 1000,
+        rng.rand(n) * 400 + 50, rng.rand(n) * 400 + 50,
+        np.full(n, 224.), np.full(n, 224.),
+        rng.rand(n) * 0.3 + 1.1, rng.rand(n) * 60 - 30,
+    )
+
+
+@pytest.mark.parametrize('inv', [False, True])
+def test_gen_trans_from_patch_batch_matches_cv2(inv):
+    patches = random_patches(64)
+    trans = gen_trans_from_patch_batch(*patches, inv=inv)
+    assert trans.shape == (64, 2, 3)
+
+    for idx in range(64):
+        expected = gen_trans_from_patch_cv_ref(*[p[idx] for p in patches], inv=inv)
+        # the cv2 reference solves in float32
+        np.testing.assert_allclose(trans[idx], expected, rtol=1e-4, atol=1e-3)
+        np.testing.assert_array_equal(gen_trans_from_patch_cv(*[p[idx] for p in patches], inv=inv), trans[idx])
+
+
+def test_gen_trans_from_patch_batch_broadcasts_scalars():
+    c_x, c_y = np.array([10., 500., 900.]), np.array([30., 20., 700.])
+    trans = gen_trans_from_patch_batch(c_x, c_y, 300, 300, 224, 224, 1.2, 0)
+    assert trans.shape == (3, 2, 3)
+    for idx in range(3):
+        expected = gen_trans_from_patch_cv_ref(c_x[idx], c_y[idx], 300, 300, 224, 224, 1.2, 0)
+        np.testing.assert_allclose(trans[idx], expected, rtol=1e-4, atol=1e-3)
+
+
+def test_transfrom_keypoints_batch_matches_per_frame_loop():
+    rng = np.random.RandomState(0)
+    kp_2d = rng.rand(16, 49, 2) * 1000
+    bbox = np.concatenate([rng.rand(16, 2) * 1000, rng.rand(16, 2) * 300 + 100], axis=1)
+
+    out, trans = transfrom_keypoints_batch(kp_2d.copy(), bbox[:, 0], bbox[:, 1], bbox[:, 2], bbox[:, 3],
+                                           224, 224, False)
+    assert out.shape == (16, 49, 2)
+
+    for idx in range(16):
+        expected_trans = gen_trans_from_patch_cv_ref(bbox[idx, 0], bbox[idx, 1], bbox[idx, 2], bbox[idx, 3],
+                                                     224, 224, 1.2, 0)
+        expected = np.stack([trans_point2d(kp, expected_trans) for kp in kp_2d[idx]])
+        np.testing.assert_allclose(out[idx], expected, rtol=1e-4, atol=1e-2)
+
+        single, _ = transfrom_keypoints(kp_2d[idx].copy(), bbox[idx, 0], bbox[idx, 1], bbox[idx, 2], bbox[idx, 3],
+                                        224, 224, False)
+        np.testing.assert_allclose(out[idx], single, atol=1e-9)
+
+
+def test_get_image_crops_torch_matches_cv2():
+    torch = pytest.importorskip('torch')
+    from lib.data_utils.img_utils import get_image_crops_demo, get_image_crops_torch, convert_cvimgs_to_tensor
+
+    # smooth frames, so the fixed point interpolation of cv2 stays within uint8 rounding
+    height, width = 240, 320
+    ys, xs = np.mgrid[0:height, 0:width]
+    frames = [
+        np.stack([xs * 0.7 + i * 10, ys * 0.9, (xs + ys) * 0.4], axis=-1).clip(0, 255).astype(np.uint8)
+        for i in range(3)
+    ]
+    bboxes = [np.array([[160., 120., 100., 120.], [80., 90., 60., 80.]]), np.zeros((0, 4)),
+              np.array([[200., 100., 90., 90.]])]
+
+    expected = []
+    for img, frame_bboxes in zip(frames, bboxes):
+        crops, _ = get_image_crops_demo(img, frame_bboxes, scale=1.1)
+        expected.append(crops[..., ::-1])
+    expected = convert_cvimgs_to_tensor(np.concatenate(expected))
+
+    frame_idx = np.repeat(np.arange(len(frames)), [len(b) for b in bboxes])
+    crops = get_image_crops_torch(torch.from_numpy(np.stack(frames)), frame_idx, np.concatenate(bboxes), scale=1.1)
+
+    assert crops.shape == expected.shape == (3, 3, 224, 224)
+    error = (crops - expected).abs()
+    # one uint8 step is 1 / 255 / 0.225 ~ 0.017 after normalization
+    assert error.mean().item() < 0.01
+    assert error.max().item() < 0.05
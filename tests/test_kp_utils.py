@@ -0,0 +1,66 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import numpy as np
+
+from lib.data_utils import kp_utils
+from lib.data_utils.kp_utils import convert_kps, get_perm_idxs
+
+FORMATS = ['spin', 'common', 'insta', 'staf', 'h36m', 'posetrack', 'pennaction', 'coco', 'mpii', 'mpii3d',
+           'mpii3d_test', '3dpw', 'smplcoco', 'smpl', 'aich']
+
+
+def get_joint_names(fmt):
+    return getattr(kp_utils, f'get_{fmt}_joint_names')()
+
+
+def convert_kps_ref(joints2d, src, dst):
+    # previous implementation, one copy per dst joint
+    src_names = get_joint_names(src)
+    dst_names = get_joint_names(dst)
+
+    out_joints2d = np.zeros((joints2d.shape[0], len(dst_names), 3))
+
+    for idx, jn in enumerate(dst_names):
+        if jn in src_names:
+            out_joints2d[:, idx] = joints2d[:, src_names.index(jn)]
+
+    return out_joints2d
+
+
+@pytest.mark.parametrize('src', FORMATS)
+@pytest.mark.parametrize('dst', ['spin', 'common', 'smpl'])
+def test_convert_kps_matches_loop(src, dst):
+    joints2d = np.random.rand(7, len(get_joint_names(src)), 3)
+    expected = convert_kps_ref(joints2d, src, dst)
+
+    out = convert_kps(joints2d, src, dst)
+    assert out.dtype == np.float64
+    np.testing.assert_array_equal(out, expected)
+
+    # cached index tables give the same result on the next call
+    np.testing.assert_array_equal(convert_kps(joints2d, src, dst), expected)
+
+
+@pytest.mark.parametrize('src, dst', [('insta', 'spin'), ('spin', 'common'), ('staf', 'spin')])
+def test_convert_kps_dtype_and_out(src, dst):
+    joints2d = np.random.rand(5, len(get_joint_names(src)), 3).astype(np.float32)
+    expected = convert_kps_ref(joints2d, src, dst)
+
+    out = convert_kps(joints2d, src, dst, dtype=np.float32)
+    assert out.dtype == np.float32
+    np.testing.assert_array_equal(out, expected.astype(np.float32))
+
+    # a reused buffer holding stale values is overwritten, missing joints are zeroed
+    buffer = np.full((5, len(get_joint_names(dst)), 3), 7., dtype=np.float32)
+    result = convert_kps(joints2d, src, dst, out=buffer)
+    assert result is buffer
+    np.testing.assert_array_equal(buffer, expected.astype(np.float32))
+
+
+def test_get_perm_idxs_matches_names():
+    for src in FORMATS:
+        src_names, dst_names = get_joint_names(src), get_joint_names('spin')
+        expected = [src_names.index(h) for h in dst_names if h in src_names]
+        assert get_perm_idxs(src, 'spin') == expected
@@ -0,0 +1,83 @@
+import os
+import sys
+sys.path.append('.')
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+
+import pytest
+import numpy as np
+import os.path as osp
+
+pytest.importorskip('pyrender')
+pytest.importorskip('torch')
+
+from lib.models.smpl import SMPL_MODEL_DIR, get_smpl
+
+if not osp.isfile(osp.join(SMPL_MODEL_DIR, 'SMPL_NEUTRAL.pkl')):
+    pytest.skip('SMPL model files are not available', allow_module_level=True)
+
+RESOLUTION = (640, 480)
+COLORS = [(0.9, 0.6, 0.3), (0.3, 0.7, 0.9), (1.0, 1.0, 0.9)]
+
+
+@pytest.fixture(scope='module')
+def renderer():
+    from lib.utils.renderer import Renderer
+    try:
+        return Renderer(resolution=RESOLUTION, orig_img=True)
+    except Exception as e:
+        pytest.skip(f'no offscreen OpenGL context: {e}')
+
+
+@pytest.fixture(scope='module')
+def verts():
+    return get_smpl().v_template.numpy()
+
+
+def render_per_person(renderer, img, verts, cams, colors, **kwargs):
+    for v, cam, color in zip(verts, cams, colors):
+        img = renderer.render(img, v, cam=cam, color=color, **kwargs)
+    return img
+
+
+def assert_images_match(expected, actual):
+    diff = np.abs(expected.astype(np.int32) - actual.astype(np.int32)).max(-1)
+    # only antialiased silhouette pixels may differ by rounding of the projection
+    assert (diff > 8).mean() < 1e-3
+    assert diff.mean() < 0.5
+
+
+@pytest.mark.parametrize('num_people', [1, 2])
+@pytest.mark.parametrize('sideview', [False, True])
+def test_render_multi_matches_render(renderer, verts, num_people, sideview):
+    img = np.full((RESOLUTION[1], RESOLUTION[0], 3), 64, dtype=np.uint8)
+    cams = np.array([[0.4, 0.5, -1.2, 0.1], [0.35, 0.45, 1.3, -0.05]])[:num_people]
+    people = np.stack([verts] * num_people)
+    colors = COLORS[:num_people]
+    kwargs = dict(angle=270, axis=[0, 1, 0]) if sideview else {}
+
+    expected = render_per_person(renderer, img, people, cams, colors, **kwargs)
+    actual = renderer.render_multi(img, people, cams, colors, **kwargs)
+    assert (expected != img).any()
+    assert_images_match(expected, actual)
+
+    # the persistent meshes are reused with new vertices on the next frame
+    people = people + np.array([0., 0.05, 0.])
+    expected = render_per_person(renderer, img, people, cams, colors, **kwargs)
+    actual = renderer.render_multi(img, people, cams, colors, **kwargs)
+    assert_images_match(expected, actual)
+
+
+def test_render_multi_fewer_people_than_capacity(renderer, verts):
+    img = np.full((RESOLUTION[1], RESOLUTION[0], 3), 64, dtype=np.uint8)
+    cams = np.array([[0.4, 0.5, -1.2, 0.1], [0.35, 0.45, 1.3, -0.05], [0.3, 0.3, 0., 0.5]])
+    people = np.stack([verts] * 3)
+
+    # grows the primitive to three people, then draws one with the other two slots clipped
+    renderer.render_multi(img, people, cams, COLORS)
+    expected = render_per_person(renderer, img, people[2:], cams[2:], COLORS[2:])
+    actual = renderer.render_multi(img, people[2:], cams[2:], COLORS[2:])
+    assert_images_match(expected, actual)
+
+    # the hidden mesh of render_multi does not show up in render
+    expected = renderer.render(img, verts, cam=cams[0], color=COLORS[0])
+    assert_images_match(expected, renderer.render_multi(img, people[:1], cams[:1], COLORS[:1]))
@@ -0,0 +1,81 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import numpy as np
+import os.path as osp
+
+from lib.utils.one_euro_filter import OneEuroFilter, one_euro_filter_sequence
+
+
+def one_euro_filter_loop(x, min_cutoff=0.004, beta=0.7):
+    # previous implementation of smooth_pose, one filter call per frame
+    one_euro_filter = OneEuroFilter(np.zeros_like(x[0]), x[0], min_cutoff=min_cutoff, beta=beta)
+
+    x_hat = np.zeros_like(x)
+    x_hat[0] = x[0]
+    for idx in range(1, x.shape[0]):
+        t = np.ones_like(x[idx]) * idx
+        x_hat[idx] = one_euro_filter(t, x[idx])
+    return x_hat
+
+
+def random_poses(length, seed=0):
+    rng = np.random.RandomState(seed)
+    # slowly drifting poses with jitter, like per frame VIBE predictions
+    return (np.cumsum(rng.randn(length, 72) * 0.02, axis=0) + rng.randn(length, 72) * 0.05).astype(np.float32)
+
+
+@pytest.mark.parametrize('length', [1, 2, 17, 200])
+@pytest.mark.parametrize('min_cutoff, beta', [(0.004, 0.7), (0.004, 1.5), (1.0, 0.0)])
+def test_one_euro_filter_sequence_matches_loop(length, min_cutoff, beta):
+    x = random_poses(length)
+    expected = one_euro_filter_loop(x, min_cutoff=min_cutoff, beta=beta)
+    x_hat = one_euro_filter_sequence(x, min_cutoff=min_cutoff, beta=beta)
+    assert x_hat.shape == x.shape and x_hat.dtype == x.dtype
+    np.testing.assert_allclose(x_hat, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_one_euro_filter_sequence_filters_tracks_independently():
+    tracks = [random_poses(length, seed=seed) for seed, length in enumerate([30, 5, 12])]
+    max_len = max(len(t) for t in tracks)
+
+    # same padding as smooth_poses, the filter is causal
+    padded = np.stack([np.pad(t, ((0, max_len - len(t)), (0, 0)), mode='edge') for t in tracks], axis=1)
+    padded_hat = one_euro_filter_sequence(padded)
+
+    for idx, track in enumerate(tracks):
+        np.testing.assert_allclose(padded_hat[:len(track), idx], one_euro_filter_loop(track), rtol=1e-5, atol=1e-6)
+
+
+def test_smooth_poses_matches_per_frame_smpl():
+    torch = pytest.importorskip('torch')
+    pytest.importorskip('smplx')
+
+    from lib.models.smpl import SMPL_MODEL_DIR, get_smpl
+    from lib.utils.smooth_pose import smooth_pose, smooth_poses
+
+    if not osp.isfile(osp.join(SMPL_MODEL_DIR, 'SMPL_NEUTRAL.pkl')):
+        pytest.skip('SMPL model files are not available')
+
+    poses = [random_poses(length, seed=seed) for seed, length in enumerate([9, 4])]
+    betas = [np.random.RandomState(seed).randn(len(p), 10).astype(np.float32) * 0.5 for seed, p in enumerate(poses)]
+
+    smpl = get_smpl()
+    smoothed = smooth_poses(poses, betas, batch_size=3)
+    for (verts, pose, joints3d), pred_pose, pred_betas in zip(smoothed, poses, betas):
+        np.testing.assert_allclose(pose, one_euro_filter_loop(pred_pose), rtol=1e-5, atol=1e-6)
+
+        with torch.no_grad():
+            for idx in range(len(pred_pose)):
+                output = smpl(
+                    betas=torch.from_numpy(pred_betas[idx:idx + 1]),
+                    body_pose=torch.from_numpy(pose[idx:idx + 1, 3:]),
+                    global_orient=torch.from_numpy(pose[idx:idx + 1, :3]),
+                )
+                np.testing.assert_allclose(verts[idx], output.vertices[0].numpy(), atol=1e-5)
+                np.testing.assert_allclose(joints3d[idx], output.joints[0].numpy(), atol=1e-5)
+
+    verts, pose, joints3d = smooth_pose(poses[0], betas[0])
+    np.testing.assert_allclose(verts, smoothed[0][0], atol=1e-6)
+    np.testing.assert_allclose(pose, smoothed[0][1], atol=1e-6)
@@ -0,0 +1,128 @@
+import sys
+sys.path.append('.')
+
+import pytest
+import numpy as np
+import os.path as osp
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('smplx')
+
+from lib.core.config import VIBE_DATA_DIR
+from lib.models.smpl import SMPL, SMPL_MODEL_DIR
+from smplx.lbs import vertices2joints, batch_rodrigues
+
+if not osp.isfile(osp.join(SMPL_MODEL_DIR, 'SMPL_NEUTRAL.pkl')):
+    pytest.skip('SMPL model files are not available', allow_module_level=True)
+
+
+@pytest.fixture(scope='module')
+def smpl():
+    return SMPL(SMPL_MODEL_DIR, create_transl=False).eval()
+
+
+def random_params(batch_size, seed=0):
+    rng = np.random.RandomState(seed)
+    return {
+        'betas': torch.from_numpy(rng.randn(batch_size, 10).astype(np.float32)),
+        'body_pose': torch.from_numpy(rng.randn(batch_size, 69).astype(np.float32) * 0.3),
+        'global_orient': torch.from_numpy(rng.randn(batch_size, 3).astype(np.float32)),
+    }
+
+
+@pytest.mark.parametrize('batch_size', [1, 5])
+def test_forward_joints_matches_forward(smpl, batch_size):
+    params = random_params(batch_size)
+    with torch.no_grad():
+        expected = smpl(**params).joints
+        output = smpl.forward_joints(**params)
+
+    assert output.vertices is None
+    assert output.joints.shape == expected.shape == (batch_size, 49, 3)
+    assert torch.allclose(output.joints, expected, atol=1e-5)
+
+
+def test_forward_joints_rotation_matrices(smpl):
+    params = random_params(3, seed=1)
+    rot_mats = batch_rodrigues(params['body_pose'].view(-1, 3)).view(3, 23, 3, 3)
+    global_rot = batch_rodrigues(params['global_orient']).view(3, 1, 3, 3)
+    with torch.no_grad():
+        expected = smpl(**params).joints
+        output = smpl.forward_joints(betas=params['betas'], body_pose=rot_mats, global_orient=global_rot,
+                                     pose2rot=False)
+    assert torch.allclose(output.joints, expected, atol=1e-5)
+
+
+def test_forward_joints_regressor_matches_forward(smpl):
+    regressor_file = osp.join(VIBE_DATA_DIR, 'J_regressor_h36m.npy')
+    if not osp.isfile(regressor_file):
+        pytest.skip('J_regressor_h36m.npy is not available')
+    J_regressor = torch.from_numpy(np.load(regressor_file)).float()
+
+    params = random_params(4, seed=2)
+    with torch.no_grad():
+        expected = vertices2joints(J_regressor, smpl(**params).vertices)
+        output = smpl.forward_joints(J_regressor=J_regressor, **params)
+        # second call goes through the cached support
+        cached = smpl.forward_joints(J_regressor=J_regressor, **params)
+
+    assert output.joints.shape == expected.shape == (4, 17, 3)
+    assert torch.allclose(output.joints, expected, atol=1e-5)
+    assert torch.equal(cached.joints, output.joints)
+
+
+def test_shared_smpl_matches_fresh_model():
+    from lib.models.smpl import load_smpl_data, get_smpl
+
+    assert load_smpl_data() is load_smpl_data(SMPL_MODEL_DIR, 'neutral')
+    assert get_smpl() is get_smpl(device='cpu')
+
+    # the shared model is built from the cached pickle, compare it with smplx loading the file itself
+    import smplx
+    fresh = smplx.SMPL(SMPL_MODEL_DIR, create_transl=False).eval()
+    params = random_params(2, seed=3)
+    with torch.no_grad():
+        expected = fresh(**params)
+        output = get_smpl()(**params)
+    assert torch.allclose(output.vertices, expected.vertices, atol=1e-6)
+
+
+def test_forward_rotmat_matches_forward(smpl):
+    params = random_params(3, seed=4)
+    rot_mats = batch_rodrigues(torch.cat([params['global_orient'], params['body_pose']], dim=1).view(-1, 3))
+    rot_mats = rot_mats.view(3, 24, 3, 3)
+    with torch.no_grad():
+        expected = smpl(**params)
+        output = smpl.forward_rotmat(params['betas'], rot_mats)
+        joints_only = smpl.forward_rotmat(params['betas'], rot_mats, return_verts=False)
+
+    assert torch.allclose(output.vertices, expected.vertices, atol=1e-5)
+    assert torch.allclose(output.joints, expected.joints, atol=1e-5)
+    assert joints_only.vertices is None
+    assert torch.allclose(joints_only.joints, expected.joints, atol=1e-5)
+
+
+class RotmatSMPL(torch.nn.Module):
+    def __init__(self, smpl):
+        super(RotmatSMPL, self).__init__()
+        self.smpl = smpl
+
+    def forward(self, betas, rot_mats):
+        output = self.smpl.forward_rotmat(betas, rot_mats)
+        return output.vertices, output.joints
+
+
+def test_traced_forward_rotmat_any_batch_size(smpl):
+    def inputs(batch_size, seed):
+        params = random_params(batch_size, seed=seed)
+        pose = torch.cat([params['global_orient'], params['body_pose']], dim=1)
+        return params['betas'], batch_rodrigues(pose.view(-1, 3)).view(batch_size, 24, 3, 3)
+
+    module = RotmatSMPL(smpl).eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(module, inputs(2, seed=5))
+        for batch_size in [1, 5]:
+            example = inputs(batch_size, seed=6)
+            for value, expected in zip(traced(*example), module(*example)):
+                assert value.shape[0] == batch_size
+                assert torch.allclose(value, expected, atol=1e-5)
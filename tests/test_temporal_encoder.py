@@ -0,0 +1,41 @@
+import sys
+sys.path.append('.')
+
+import torch
+import pytest
+
+from lib.models.vibe import TemporalEncoder
+
+WINDOW = 16
+OVERLAP = 8
+
+
+@pytest.fixture(scope='module')
+def encoder():
+    torch.manual_seed(0)
+    return TemporalEncoder(n_layers=2, hidden_size=64, add_linear=True, use_residual=True).eval()
+
+
+@pytest.mark.parametrize('t', [1, OVERLAP, WINDOW - 1, WINDOW, WINDOW + 1, 3 * WINDOW + 5])
+def test_forward_windowed_shape(encoder, t):
+    x = torch.randn(2, t, 2048)
+    with torch.no_grad():
+        y = encoder.forward_windowed(x, window=WINDOW, overlap=OVERLAP)
+    assert y.shape == (2, t, 2048)
+    assert torch.isfinite(y).all()
+
+
+@pytest.mark.parametrize('t', [1, OVERLAP, WINDOW - 1, WINDOW, WINDOW + 1, 3 * WINDOW + 5])
+def test_forward_windowed_carry_hidden(encoder, t):
+    x = torch.randn(2, t, 2048)
+    with torch.no_grad():
+        y = encoder.forward_windowed(x, window=WINDOW, overlap=OVERLAP, carry_hidden=True)
+        expected = encoder(x)
+    assert y.shape == (2, t, 2048)
+    assert torch.allclose(y, expected, atol=1e-5)
+
+
+def test_forward_windowed_short_sequence_is_single_window(encoder):
+    x = torch.randn(2, WINDOW - 1, 2048)
+    with torch.no_grad():
+        assert torch.allclose(encoder.forward_windowed(x, window=WINDOW, overlap=OVERLAP), encoder(x))